@@ -0,0 +1,354 @@
+# api.py
+"""
+HTTP 接口（与 app.py 并列的独立入口）：供 MES 等系统在工单下达时自动触发首件核对。
+
+    python api.py [--host 127.0.0.1] [--port 8502] [--processes 2]
+
+    POST   /api/compare                 multipart/form-data：station（站位表文件，必填）、bom（BOM 文件，
+                                        缺省时按机种编号取 BOM 库）、model（机种编号，缺省取站位表文件名）、
+                                        ignore_nc（1/0，默认 1）。返回 202 {"id": 任务 ID, ...}
+    GET    /api/jobs/<id>               任务状态；完成后附比对摘要（total / error_count / digest / run_id ...）
+    GET    /api/jobs/<id>/result        结果：?format=json（默认）/ csv / jsonl / parquet（带签名，同页面导出）
+                                        / xlsx（核对报告，可带 wo_number / wo_qty / inspector）
+    DELETE /api/jobs/<id>               取消进行中的任务；已结束的任务立即删除并释放结果
+    GET    /api/health                  服务状态与任务统计
+    GET    /metrics                     运行指标（Prometheus 文本格式，含工作进程中的解析 / 比对指标）
+
+- 比对在有界进程池（API_PROCESSES 个工作进程）中执行，与页面共用同一套解析 / 映射 / 比对逻辑；
+  工作进程内按内容摘要缓存解析结果，BOM 库经内存映射在各进程间共享
+- 任务排队、取消与本机级并发槽位沿用 src.jobs：与同机的 Streamlit 实例合计不超过 JOB_HOST_SLOTS 个任务
+- 每次比对写入核对记录（mode=api）并归档异常结论，分析页可直接统计
+- 设置了 SMT_API_TOKEN 时须带请求头 Authorization: Bearer <token>
+"""
+import argparse
+import email.parser
+import email.policy
+import hmac
+import json
+import logging
+import os
+import re
+import shutil
+import signal
+import tempfile
+import time
+from concurrent.futures import TimeoutError as FutureTimeout
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlsplit
+
+from config.settings import (API_HOST, API_MAX_UPLOAD_MB, API_PORT, API_PROCESSES, API_TOKEN,
+                             JOB_HOST_SLOTS, JOB_SLOT_DIR)
+from src import archive, exports, metrics, service
+from src.jobs import JobQueue
+from src.result_store import STORE
+from src.user_manager import record_run
+from src.utils import open_temporary
+
+logger = logging.getLogger("smt.api")
+
+FUTURE_POLL_SECONDS = 0.2
+CONTENT_TYPES = {
+    'json': "application/json; charset=utf-8",
+    'csv': "text/csv; charset=utf-8",
+    'jsonl': "application/x-ndjson; charset=utf-8",
+    'parquet': "application/vnd.apache.parquet",
+    'xlsx': "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+JOB_PATH = re.compile(r"^/api/jobs/([0-9a-f]+)(/result)?$")
+
+_executor = None
+_processes = 0
+_jobs = None
+_upload_dir = None     # 已完成任务的原始上传文件（生成 xlsx 报告时再读），服务停止时整个目录删除
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _await(job, fut):
+    """等待工作进程结果；期间检查取消（已开始执行的进程任务无法中断，结果被丢弃）"""
+    while True:
+        try:
+            return fut.result(timeout=FUTURE_POLL_SECONDS)
+        except FutureTimeout:
+            if job.cancelled:
+                fut.cancel()
+            job.check()
+
+
+def _merged(returned):
+    """工作进程返回的 (结果, 指标)：指标并入本进程，返回结果"""
+    result, values = returned
+    metrics.merge(values)
+    return result
+
+
+def _compare_job(job, station, bom, model, ignore_nc):
+    """API 比对任务（工作线程）：进程池中比对，结果存入结果存储，写核对记录并归档"""
+    job.progress(0.1, "比对中")
+    fut = _executor.submit(metrics.run_in_worker, service.compare_files, station[0], station[1], bom[0], bom[1],
+                           model, ignore_nc)
+    out = _merged(_await(job, fut))
+    job.progress(0.9, "整理结果")
+
+    results = out.pop('results')
+    started_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    out['handle'] = STORE.put(results)
+    out['run_id'] = record_run(
+        model=out['model'], mode="api", bom_file=out['bom_file'], station_file=out['station_file'],
+        total=out['total'], error_count=out['error_count'], result_count=len(results),
+        duration_ms=out['duration_ms'], digest=out['digest'], started_at=started_at)
+    out['started_at'] = started_at
+    try:
+        archive.archive_findings(out['run_id'], out['model'], started_at, results, "api")
+    except Exception as e:
+        logging.getLogger("smt.archive").warning("archive failed: %s", e)
+    # 原始文件暂存到磁盘（不对外返回、不占内存），生成 xlsx 报告时重新读取；BOM 取自库时按机种编号重新取
+    out['_files'] = (_spool_upload(station), bom if bom[1] is None else _spool_upload(bom))
+    return out
+
+
+def _spool_upload(upload):
+    """(文件名, bytes) -> (文件名, 暂存路径)"""
+    name, data = upload
+    fd, path = tempfile.mkstemp(dir=_upload_dir, suffix=os.path.splitext(name)[1])
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    return name, path
+
+
+def _read_upload(upload):
+    name, path = upload
+    if path is None:
+        return name, None
+    with open(path, "rb") as f:
+        return name, f.read()
+
+
+def _release(job):
+    """任务过期或被删除：释放结果存储中的结果集与暂存的上传文件"""
+    out = job.result
+    if not isinstance(out, dict):
+        return
+    if out.get('handle'):
+        STORE.drop(out['handle'])
+    for _, path in out.get('_files', ()):
+        if path is not None and os.path.exists(path):
+            os.remove(path)
+
+
+def _report_file(job, out, results, meta):
+    """工作进程把核对报告写入本机临时文件（跨进程只传路径），返回其只读文件对象"""
+    (station_name, station_data), (bom_name, bom_data) = map(_read_upload, out['_files'])
+    fd, path = tempfile.mkstemp(prefix="smt_", suffix=".xlsx")
+    os.close(fd)
+    try:
+        _merged(_await(job, _executor.submit(
+            metrics.run_in_worker, service.build_report, station_name, station_data, bom_name, bom_data,
+            out['model'], results, meta, path)))
+        return open_temporary(path)
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+
+
+def _summary(out):
+    return {k: v for k, v in out.items() if not k.startswith('_') and k != 'handle'}
+
+
+def _parse_multipart(content_type, body):
+    """multipart/form-data -> ({字段: 文本}, {字段: (文件名, bytes)})"""
+    msg = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode("latin-1") + body)
+    if not msg.is_multipart():
+        raise ApiError(400, "请求须为 multipart/form-data")
+    fields, files = {}, {}
+    for part in msg.iter_parts():
+        name = part.get_param("name", header="content-disposition")
+        if not name:
+            continue
+        filename = part.get_filename()
+        data = part.get_payload(decode=True) or b""
+        if filename is None:
+            fields[name] = data.decode("utf-8", "replace").strip()
+        else:
+            # 未按 RFC 2231 编码的 UTF-8 文件名被解析为代理转义字符，还原为原文
+            filename = filename.encode("utf-8", "surrogateescape").decode("utf-8", "replace")
+            files[name] = (filename.replace("\\", "/").rsplit("/", 1)[-1], data)
+    return fields, files
+
+
+class Handler(BaseHTTPRequestHandler):
+    server_version = "SMTCheckAPI/1.0"
+
+    def log_message(self, fmt, *args):
+        logger.info("%s - %s", self.client_address[0], fmt % args)
+
+    def _send(self, status, body, content_type=CONTENT_TYPES['json'], filename=None):
+        if not isinstance(body, bytes):
+            body = json.dumps(body, ensure_ascii=False, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if filename:
+            self.send_header("Content-Disposition", f"attachment; filename*=UTF-8''{quote(filename)}")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_file(self, fh, content_type, filename):
+        """分块发送磁盘临时文件（报告 / 导出文件不整体读入内存），发送后关闭（文件随之删除）"""
+        with fh:
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(os.fstat(fh.fileno()).st_size))
+            self.send_header("Content-Disposition", f"attachment; filename*=UTF-8''{quote(filename)}")
+            self.end_headers()
+            shutil.copyfileobj(fh, self.wfile)
+
+    def _dispatch(self, handler):
+        try:
+            if API_TOKEN:
+                auth = self.headers.get("Authorization", "")
+                if not hmac.compare_digest(auth.encode(), f"Bearer {API_TOKEN}".encode()):
+                    raise ApiError(401, "未授权")
+            handler(urlsplit(self.path))
+        except ApiError as e:
+            self._send(e.status, {"error": str(e)})
+        except Exception as e:
+            logger.exception("request failed: %s %s", self.command, self.path)
+            self._send(500, {"error": str(e)})
+
+    def do_GET(self):
+        self._dispatch(self._get)
+
+    def do_POST(self):
+        self._dispatch(self._post)
+
+    def do_DELETE(self):
+        self._dispatch(self._delete)
+
+    def _job(self, job_id):
+        job = _jobs.get(job_id)
+        if job is None:
+            raise ApiError(404, f"任务不存在或已过期: {job_id}")
+        return job
+
+    def _get(self, url):
+        if url.path == "/metrics":
+            return self._send(200, metrics.render().encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8")
+        if url.path == "/api/health":
+            return self._send(200, {"status": "ok", "processes": _processes, "jobs": _jobs.stats()})
+        m = JOB_PATH.match(url.path)
+        if not m:
+            raise ApiError(404, "未知路径")
+        job = self._job(m.group(1))
+        if not m.group(2):
+            body = job.snapshot()
+            if job.state == "done":
+                body["result"] = _summary(job.result)
+            return self._send(200, body)
+        if job.state != "done":
+            raise ApiError(409, f"任务未完成: {job.state}")
+        self._result(job, {k: v[-1] for k, v in parse_qs(url.query).items()})
+
+    def _result(self, job, query):
+        out = job.result
+        fmt = query.get("format", "json")
+        if fmt not in CONTENT_TYPES:
+            raise ApiError(400, f"不支持的格式: {fmt}")
+        results = STORE.records(out['handle'])
+        if results is None:
+            raise ApiError(404, f"任务结果已释放: {job.id}")
+        if fmt == "json":
+            return self._send(200, dict(_summary(out), results=results))
+        meta = {'model': out['model'], 'wo_number': query.get("wo_number", ""),
+                'wo_qty': query.get("wo_qty", ""), 'inspector': query.get("inspector", ""),
+                'check_time': out['started_at']}
+        name = f"{out['model']}_{job.id}.{fmt}"
+        if fmt == "xlsx":
+            return self._send_file(_jobs.run("export", lambda j: _report_file(j, out, results, meta)),
+                                   CONTENT_TYPES[fmt], name)
+        missing = exports.missing_backend(fmt)
+        if missing is not None:
+            raise ApiError(501, str(missing))
+        fh, _ = _jobs.run("export", lambda j: exports.export_file(fmt, results, meta))
+        self._send_file(fh, CONTENT_TYPES[fmt], name)
+
+    def _post(self, url):
+        if url.path != "/api/compare":
+            raise ApiError(404, "未知路径")
+        length = int(self.headers.get("Content-Length") or 0)
+        if length <= 0:
+            raise ApiError(411, "缺少请求内容")
+        if length > API_MAX_UPLOAD_MB * 1024 * 1024:
+            raise ApiError(413, f"上传内容超过 {API_MAX_UPLOAD_MB} MB")
+        fields, files = _parse_multipart(self.headers.get("Content-Type", ""), self.rfile.read(length))
+        if "station" not in files:
+            raise ApiError(400, "缺少站位表文件（字段 station）")
+        station, bom = files["station"], files.get("bom", (None, None))
+        try:
+            model = service.check_pair(station[0], bom[0], fields.get("model") or None)
+        except service.ServiceError as e:
+            raise ApiError(400, str(e))
+        ignore_nc = fields.get("ignore_nc", "1").lower() not in ("0", "false", "no")
+        job_id = _jobs.submit("compare", _compare_job, station, bom, model, ignore_nc,
+                              owner=self.client_address[0])
+        self._send(202, dict(_jobs.get(job_id).snapshot(), model=model))
+
+    def _delete(self, url):
+        m = JOB_PATH.match(url.path)
+        if not m or m.group(2):
+            raise ApiError(404, "未知路径")
+        job = self._job(m.group(1))
+        cancelled = _jobs.cancel(job.id)
+        # 已结束的任务立即删除并释放结果；运行中的任务取消后随过期清除释放
+        deleted = not cancelled and _jobs.discard(job.id)
+        self._send(200, dict(job.snapshot(), cancelled=cancelled, deleted=deleted))
+
+
+def start(host=API_HOST, port=API_PORT, processes=API_PROCESSES):
+    """初始化工作进程池与任务队列，返回已绑定端口、尚未开始服务的 HTTP 服务器（port=0 时由系统分配）"""
+    global _executor, _processes, _jobs, _upload_dir
+    _processes = processes
+    _upload_dir = tempfile.mkdtemp(prefix="smt_api_")
+    _executor = service.process_pool(processes)
+    _jobs = JobQueue(processes, JOB_HOST_SLOTS, JOB_SLOT_DIR, on_purge=_release)
+    metrics.sample("smt_jobs", _jobs.stats)
+    return ThreadingHTTPServer((host, port), Handler)
+
+
+def stop(httpd):
+    """关闭服务器与工作进程池，删除暂存的上传文件"""
+    httpd.server_close()
+    _executor.shutdown(wait=False, cancel_futures=True)
+    shutil.rmtree(_upload_dir, ignore_errors=True)
+
+
+def serve(host=API_HOST, port=API_PORT, processes=API_PROCESSES):
+    """启动服务（阻塞直到 Ctrl+C）"""
+    httpd = start(host, port, processes)
+    logger.info("SMT API listening on http://%s:%d (%d processes)", host, httpd.server_port, processes)
+    t0 = time.time()
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop(httpd)
+        logger.info("SMT API stopped after %.0fs", time.time() - t0)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="SMT 首件核对 HTTP 接口")
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    parser.add_argument("--processes", type=int, default=API_PROCESSES)
+    args = parser.parse_args()
+    signal.signal(signal.SIGTERM, signal.default_int_handler)   # kill / 服务管理器停止时同 Ctrl+C，关闭工作进程
+    serve(args.host, args.port, args.processes)
@@ -5,6 +5,8 @@ from config.settings import PAGE_CONFIG
 from config.styles import CUSTOM_CSS
 from ui.sidebar import render_sidebar
 from ui.main_content import render_main_area
+from ui.analytics import render_analytics
+from src import perf, bom_library, metrics
 
 # 1. 初始化
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -22,7 +24,18 @@ def main():
 
     # 渲染右侧主工作区 (传入容器 c_right)
     with c_right:
-        render_main_area(bom_file, station_file, ignore_nc)
+        if st.session_state.get("analytics_mode"):
+            with perf.run("analytics"):
+                render_analytics()
+        else:
+            with perf.run("main_area"):
+                render_main_area(bom_file, station_file, ignore_nc)
+
+    # 首页渲染完成后再在后台预加载 BOM 库，不占用首次渲染时间
+    bom_library.start_preload()
+    # 运行指标：/metrics 服务在后台线程，每个进程只启动一次
+    metrics.sample("smt_active_sessions", metrics.streamlit_sessions)
+    metrics.start_server()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
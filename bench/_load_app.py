@@ -0,0 +1,41 @@
+# bench/_load_app.py
+"""load_test.py 使用的页面脚本：用本地文件代替侧边栏上传，其余与 app.py 主区域一致。"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import streamlit as st
+from streamlit.delta_generator import DeltaGenerator
+from streamlit.runtime.uploaded_file_manager import UploadedFile, UploadedFileRec
+from ui.main_content import render_main_area
+from src import perf
+
+
+def _uploaded(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    return UploadedFile(UploadedFileRec(path, os.path.basename(path), "application/octet-stream", data), None)
+
+
+# 记录延迟生成的下载回调，供压测在“点击下载”步骤直接调用（AppTest 无法触发浏览器下载）
+if not getattr(DeltaGenerator.download_button, "_bench_spy", False):
+    _download_button = DeltaGenerator.download_button
+
+    def _spy_download_button(self, label, data, *args, **kwargs):
+        if callable(data):
+            st.session_state.setdefault("_bench_downloads", {})[label] = data
+        return _download_button(self, label, data, *args, **kwargs)
+
+    _spy_download_button._bench_spy = True
+    DeltaGenerator.download_button = _spy_download_button
+    st.download_button = _spy_download_button.__get__(st._main)   # st.download_button 是导入时绑定的方法
+
+if "_bench_files" not in st.session_state:
+    st.session_state["_bench_files"] = (_uploaded(st.session_state["_bench_bom"]),
+                                        _uploaded(st.session_state["_bench_station"]))
+bom_file, station_file = st.session_state["_bench_files"]
+with perf.run("main_area"):
+    render_main_area(bom_file, station_file, True)
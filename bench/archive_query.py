@@ -0,0 +1,121 @@
+# bench/archive_query.py
+"""
+结果归档查询基准：在临时目录生成一年的模拟归档（逐次比对写入，含分区合并），再计时各维度的 Top-N 统计。
+
+模拟数据：--models 个机种，每天 --runs-per-day 次比对，每次 --findings 条异常结论；
+异常料号 / 位号按幂律分布抽取，接近实际的帕累托形态。
+
+结果 JSON 与 run_bench.py 格式相同，可直接对比：
+    python bench/archive_query.py --out bench/results/archive_latest.json
+    python bench/run_bench.py compare bench/results/archive_old.json bench/results/archive_new.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src import archive, user_manager
+
+STATUSES = ["缺料", "位号不符", "错料/多余", "规格预警", "数量不符"]
+
+
+def _finding(rng, model_idx):
+    pn = f"PN{model_idx:02d}{int(rng.paretovariate(1.2)) % 400:04d}"
+    refs = [f"{rng.choice('RCLUD')}{int(rng.paretovariate(1.1)) % 300}" for _ in range(rng.randint(1, 3))]
+    slot = f"{rng.randint(1, 3)}-{rng.randint(1, 2)}-{rng.randint(1, 60)}"
+    status = rng.choices(STATUSES, weights=[5, 8, 2, 3, 1])[0]
+    return {"级别": "🔴 严重" if status in ("缺料", "错料/多余") else "🟠 警告", "核对结果": status,
+            "BOM料号": pn, "差异说明": f"❌ 非法物料: {pn}" if status == "错料/多余" else "",
+            "站位号": slot, "BOM位号明细": ",".join(refs), "实装位号明细": ",".join(refs[1:])}
+
+
+def build(days, models, runs_per_day, findings):
+    rng = random.Random(42)
+    start = datetime.now().replace(hour=8, minute=0, second=0, microsecond=0) - timedelta(days=days)
+    t0 = time.perf_counter()
+    runs = rows = 0
+    for d in range(days):
+        for i in range(runs_per_day):
+            model_idx = rng.randrange(models)
+            started_at = (start + timedelta(days=d, minutes=i * 20)).strftime(archive.TIME_FORMAT)
+            results = [_finding(rng, model_idx) for _ in range(rng.randint(findings // 2, findings * 3 // 2))]
+            run_id = user_manager.record_run(model=f"M{model_idx:03d}", started_at=started_at)
+            rows += archive.archive_findings(run_id, f"M{model_idx:03d}", started_at, results, "full")
+            runs += 1
+    return runs, rows, time.perf_counter() - t0
+
+
+def run(repeat, days, models, runs_per_day, findings, limit):
+    workdir = tempfile.mkdtemp(prefix="smt_archive_bench_")
+    archive.ARCHIVE_DIR = os.path.join(workdir, "archive")
+    user_manager.DB_FILE = os.path.join(workdir, "smt_data.db")
+    try:
+        runs, rows, seconds = build(days, models, runs_per_day, findings)
+        files = len(user_manager.list_archive_files())
+        size = sum(os.path.getsize(os.path.join(dp, f)) for dp, _, fs in os.walk(archive.ARCHIVE_DIR) for f in fs)
+        print(f"归档: {runs} 次比对, {rows} 条结论, {files} 个文件, {size / 1024 / 1024:.1f} MB, 写入 {seconds:.1f}s "
+              f"({seconds / runs * 1000:.1f} ms/次)")
+
+        until = datetime.now().strftime(archive.TIME_FORMAT)
+        since = (datetime.now() - timedelta(days=days + 1)).strftime(archive.TIME_FORMAT)
+        out = [{"lines": rows, "stage": "archive_write_per_run", "seconds": round(seconds / runs, 6)}]
+        for dimension in archive.DIMENSIONS:
+            times = []
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                archive.query_top(dimension, since, until, limit=limit)
+                times.append(time.perf_counter() - t0)
+            out.append({"lines": rows, "stage": f"top_{archive.DIMENSIONS[dimension]}_year",
+                        "seconds": round(statistics.median(times), 4), "min": round(min(times), 4)})
+        # 单机种 + 单一核对结果（按位号看某机种的位号不符）
+        times = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            archive.query_top("位号", since, until, models=["M000"], statuses=["位号不符"], limit=limit)
+            times.append(time.perf_counter() - t0)
+        out.append({"lines": rows, "stage": "top_refs_one_model_year",
+                    "seconds": round(statistics.median(times), 4), "min": round(min(times), 4)})
+        for r in out:
+            print(f"{r['stage']:<28} {r['seconds']:>9.4f}s")
+        return out, {"runs": runs, "files": files, "bytes": size}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _meta():
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        commit = ""
+    return {"timestamp": datetime.now().isoformat(timespec="seconds"), "commit": commit,
+            "python": platform.python_version(), "platform": platform.platform()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SMT 结果归档查询基准")
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--models", type=int, default=30)
+    parser.add_argument("--runs-per-day", type=int, default=20)
+    parser.add_argument("--findings", type=int, default=40, help="每次比对的平均异常结论数")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--out", default=os.path.join(os.path.dirname(__file__), "results",
+                                                     f"archive_{datetime.now():%Y%m%d_%H%M%S}.json"))
+    args = parser.parse_args()
+
+    rows, info = run(args.repeat, args.days, args.models, args.runs_per_day, args.findings, args.limit)
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump({"meta": dict(_meta(), **info), "results": rows}, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已写入 {args.out}")
@@ -0,0 +1,138 @@
+# bench/generate.py
+"""
+确定性合成数据生成器：按指定行数生成 BOM 与站位表工作簿，用于性能基准。
+
+包含现场常见特征：替代料、T/B 面分列位号、站位表内嵌重复表头/版本行、
+科学计数法料号、NC（无位号）行、多机台分段站位，以及少量漏上料/漏贴位号。
+
+用法:
+    python bench/generate.py --lines 1000 10000 --out bench/data
+"""
+import argparse
+import os
+import random
+
+import xlsxwriter
+
+REF_PREFIX = ["C", "R", "L", "D", "U", "Q", "LED", "F"]
+PKG = ["0201", "0402", "0603", "0805", "1206"]
+VOLT = ["10V", "16V", "25V", "50V", "100V"]
+SLOTS_PER_MACHINE = 120
+
+BOM_HEADER = ["*行号", "编号", "名称", "物料描述", "*数量", "替代状况",
+              "位置号1", "位置号数量1", "位置号2", "位置号数量2"]
+STATION_HEADER = ["安装号码", "元件名", "备注", "图样名", "图样名", "总数"]
+
+
+def _pn(rng, used):
+    while True:
+        pn = f"3008{rng.randint(0, 9999999999):010d}"
+        if pn not in used:
+            used.add(pn)
+            return pn
+
+
+def _sci(pn):
+    """Excel 把长数字料号导出成科学计数法时的样子: 3.0080305000061E+13"""
+    return f"{int(pn):.13E}"
+
+
+def generate_lines(n_lines, seed=20250101):
+    """生成 n_lines 个 BOM 料号及其站位信息（纯数据，不写文件）"""
+    rng = random.Random(seed)
+    used = set()
+    ref_counters = {p: 0 for p in REF_PREFIX}
+    lines = []
+    for i in range(n_lines):
+        pn = _pn(rng, used)
+        prefix = rng.choice(REF_PREFIX)
+        pkg, volt = rng.choice(PKG), rng.choice(VOLT)
+        is_nc = rng.random() < 0.03
+        refs = []
+        if not is_nc:
+            for _ in range(rng.choice([1, 1, 1, 2, 2, 3, 4, 6, 8])):
+                ref_counters[prefix] += 1
+                refs.append(f"{prefix}{ref_counters[prefix]}")
+        split = rng.random() < 0.2 and len(refs) > 1
+        cut = len(refs) // 2 if split else len(refs)
+        alt = _pn(rng, used) if rng.random() < 0.1 else ""
+        lines.append({
+            "pn": pn,
+            "alt": alt,
+            "sci": rng.random() < 0.05,
+            "desc": f"{prefix}-{rng.randint(1, 999)}-{volt}-{pkg}",
+            "refs_t": refs[:cut],
+            "refs_b": refs[cut:],
+            # 站位表中 10% 的替代料行改用替代料上料
+            "use_alt": bool(alt) and rng.random() < 0.5,
+            "nc": is_nc,
+            # 少量现场典型错误：漏上料、漏贴位号
+            "st_missing": rng.random() < 0.005,
+            "st_drop_ref": rng.random() < 0.01,
+        })
+    return lines
+
+
+def write_bom(path, lines, model):
+    wb = xlsxwriter.Workbook(path, {"constant_memory": True})
+    ws = wb.add_worksheet()
+    ws.write_row(0, 0, BOM_HEADER)
+    ws.write_row(1, 0, ["", model, "主板SMT", "SMT 合成基准板", "", "", "", "", "", ""])
+    for i, line in enumerate(lines, start=2):
+        pn = _sci(line["pn"]) if line["sci"] else line["pn"]
+        ws.write_row(i, 0, [
+            str(i * 10), pn, "贴片物料", line["desc"],
+            str(len(line["refs_t"]) + len(line["refs_b"])), line["alt"],
+            ",".join(line["refs_t"]), str(len(line["refs_t"])) if line["refs_t"] else "",
+            ",".join(line["refs_b"]), str(len(line["refs_b"])) if line["refs_b"] else "",
+        ])
+    wb.close()
+
+
+def write_station(path, lines):
+    wb = xlsxwriter.Workbook(path, {"constant_memory": True})
+    ws = wb.add_worksheet()
+    ws.write_row(0, 0, ["Version", "1"])
+    row = 1
+    slot = 0
+    for line in lines:
+        if line["nc"] or line["st_missing"]:
+            continue
+        if slot % SLOTS_PER_MACHINE == 0:
+            # 每台机器一段：重复表头，站位号从 1 重新编号
+            ws.write_row(row, 0, STATION_HEADER)
+            row += 1
+            slot = 0
+        slot += 1
+        pn = line["alt"] if line["use_alt"] else line["pn"]
+        refs_t = line["refs_t"][:-1] if line["st_drop_ref"] and len(line["refs_t"]) > 1 else line["refs_t"]
+        ws.write_row(row, 0, [
+            str(slot), pn, line["desc"],
+            "/".join(refs_t), "/".join(line["refs_b"]),
+            str(len(line["refs_t"]) + len(line["refs_b"])),
+        ])
+        row += 1
+    wb.close()
+
+
+def generate(n_lines, out_dir, seed=20250101):
+    """生成一对 BOM / 站位表文件，返回 (bom_path, station_path)"""
+    os.makedirs(out_dir, exist_ok=True)
+    model = f"BENCH{n_lines}"
+    bom_path = os.path.join(out_dir, f"{model}_BOM.xlsx")
+    station_path = os.path.join(out_dir, f"{model}_站位表.xlsx")
+    if not (os.path.exists(bom_path) and os.path.exists(station_path)):
+        lines = generate_lines(n_lines, seed)
+        write_bom(bom_path, lines, model)
+        write_station(station_path, lines)
+    return bom_path, station_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="生成 SMT 基准测试数据")
+    parser.add_argument("--lines", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--out", default=os.path.join(os.path.dirname(__file__), "data"))
+    parser.add_argument("--seed", type=int, default=20250101)
+    args = parser.parse_args()
+    for n in args.lines:
+        print(*generate(n, args.out, args.seed))
@@ -0,0 +1,110 @@
+# bench/import_time.py
+"""
+冷启动基准：未上传文件时首页首次渲染的耗时与导入开销（kiosk 启动后的白屏时间）。
+
+每次在全新解释器中用 AppTest 运行一遍 app.py（Streamlit 框架本身预先导入、不计入），
+同时开启 -X importtime，统计脚本侧的导入耗时与最慢的模块，并列出首页渲染后已加载的重量级依赖
+（理想情况为空：pandas / xlsxwriter 等在上传文件后才加载，见 src/lazy.py）。
+
+结果 JSON 与 run_bench.py 格式相同，可直接对比：
+    python bench/import_time.py --repeat 5 --out bench/results/import_latest.json
+    python bench/run_bench.py compare bench/results/import_old.json bench/results/import_new.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ("pandas", "numpy", "pyarrow", "xlsxwriter", "openpyxl", "xlrd", "xlwings")
+MARKER = "--- first paint ---"
+
+CHILD = f"""
+import json, os, sys, time
+sys.path.insert(0, {ROOT!r}); os.chdir({ROOT!r})
+import logging; logging.disable(logging.WARNING)
+from streamlit.testing.v1 import AppTest
+sys.stderr.write({MARKER!r} + "\\n"); sys.stderr.flush()
+t0 = time.perf_counter()
+at = AppTest.from_file("app.py", default_timeout=120).run()
+seconds = time.perf_counter() - t0
+print(json.dumps({{"seconds": seconds, "exception": [str(e.value) for e in at.exception],
+                  "heavy": [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))
+"""
+
+
+def _parse_importtime(stderr):
+    """-X importtime 输出 -> [(模块, 深度, 累计秒)]，只取标记之后（首页渲染期间）的导入"""
+    rows, started = [], False
+    for line in stderr.splitlines():
+        if line.strip() == MARKER:
+            started = True
+            continue
+        if not started or not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        rows.append((name.strip(), depth, int(cumulative) / 1e6))
+    return rows
+
+
+def _once():
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", CHILD],
+                          capture_output=True, text=True, cwd=ROOT)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr[-2000:])
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    if result["exception"]:
+        raise RuntimeError(f"首页渲染异常: {result['exception']}")
+    imports = _parse_importtime(proc.stderr)
+    result["import_seconds"] = sum(c for _, d, c in imports if d == 0)
+    result["imports"] = imports
+    return result
+
+
+def run(repeat, top):
+    runs = [_once() for _ in range(repeat)]
+    paint = [r["seconds"] for r in runs]
+    imports = [r["import_seconds"] for r in runs]
+    rows = [
+        {"lines": 0, "stage": "first_paint", "seconds": round(statistics.median(paint), 4), "min": round(min(paint), 4)},
+        {"lines": 0, "stage": "script_imports", "seconds": round(statistics.median(imports), 4), "min": round(min(imports), 4)},
+    ]
+    for r in rows:
+        print(f"{r['stage']:<15} {r['seconds']:>8.4f}s  (min {r['min']:.4f}s)")
+
+    last = runs[-1]
+    print(f"\n首页渲染后已加载的重量级依赖: {', '.join(last['heavy']) or '无'}")
+    print(f"\n最慢的 {top} 个模块（累计耗时，最后一次运行）:")
+    for name, depth, cumulative in sorted(last["imports"], key=lambda x: -x[2])[:top]:
+        print(f"  {cumulative * 1000:>8.1f} ms  {'  ' * depth}{name}")
+    return rows, last["heavy"]
+
+
+def _meta():
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        commit = ""
+    return {"timestamp": datetime.now().isoformat(timespec="seconds"), "commit": commit,
+            "python": platform.python_version(), "platform": platform.platform()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SMT 首页冷启动 / 导入耗时基准")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="列出累计耗时最长的模块数")
+    parser.add_argument("--out", default=os.path.join(os.path.dirname(__file__), "results",
+                                                     f"import_{datetime.now():%Y%m%d_%H%M%S}.json"))
+    args = parser.parse_args()
+
+    rows, heavy = run(args.repeat, args.top)
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump({"meta": dict(_meta(), heavy_loaded=heavy), "results": rows}, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已写入 {args.out}")
@@ -0,0 +1,168 @@
+# bench/load_test.py
+"""
+多会话并发压测：模拟 N 个产线会话同时做首件核对，
+每个会话依次完成 上传解析 -> 比对 -> 填写工单 -> 点击导出报告。
+
+报告各步骤延迟分位数（p50/p90/p99）、吞吐（会话/秒）与内存 RSS 随 N 的变化，
+用于在部署前评估缓存与并发相关改动。
+
+说明：AppTest 使用进程级的全局 Runtime，不能在同一进程内多线程并发，
+因此每个会话是一个独立进程（各自一个 AppTest），导入完成后由屏障同时放行；
+RSS 取各会话进程峰值之和作为单服务器内存占用的上界。
+--rounds > 1 时同一会话重复整个流程，可观察 st.cache_data 命中后的延迟。
+
+用法:
+    python bench/load_test.py --sessions 1 2 4 8 --lines 1000
+    python bench/load_test.py --sessions 4 --lines 10000 --rounds 2 --out bench/results/load.json
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import statistics
+import sys
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench.generate import generate
+
+APP_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "_load_app.py")
+STEPS = ("load", "compare", "workorder", "export")
+
+
+def _rss_mb():
+    """当前进程 (RSS, 峰值 RSS)，单位 MB；非 Linux 平台只能取到 ru_maxrss 峰值"""
+    rss = peak = None
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    rss = round(int(line.split()[1]) / 1024, 1)
+                elif line.startswith("VmHWM:"):
+                    peak = round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        try:
+            import resource
+            maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            peak = round(maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+        except ImportError:
+            pass
+    return rss, peak
+
+
+def _flow(at):
+    """一次完整的首件核对：解析映射 -> 比对 -> 填写工单 -> 导出报告，返回各步耗时"""
+    timing = {}
+    t0 = time.perf_counter(); at.run()
+    timing["load"] = time.perf_counter() - t0
+
+    compare_btn = next(b for b in at.button if b.label.startswith("🚀"))
+    t0 = time.perf_counter(); compare_btn.click().run()
+    timing["compare"] = time.perf_counter() - t0
+
+    inspector = next(s for s in at.selectbox if s.label.startswith("检验人"))
+    if len(inspector.options) < 2:
+        raise RuntimeError("检验员列表为空，无法走到导出步骤")
+    inspector.set_value(inspector.options[1])
+    next(t for t in at.text_input if t.label.startswith("订单号")).input("LOADTEST")
+    qty = next(n for n in at.number_input if n.label.startswith("订单数量"))
+    t0 = time.perf_counter(); qty.set_value(100).run()
+    timing["workorder"] = time.perf_counter() - t0
+
+    # 报告在点击下载时才生成：直接调用页面登记的下载回调
+    download = at.session_state["_bench_downloads"]["📥 导出报告"]
+    t0 = time.perf_counter(); download()
+    timing["export"] = time.perf_counter() - t0
+
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    return timing
+
+
+def _session(bom_path, station_path, rounds, timeout, barrier, queue):
+    """会话进程入口：完成导入后在屏障处等待，所有会话同时开始"""
+    import logging
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    from streamlit.testing.v1 import AppTest
+    import ui.main_content  # noqa: F401  预先导入，避免把模块导入时间计入延迟
+
+    result = {"timings": [], "error": None}
+    barrier.wait()
+    t_start = time.perf_counter()
+    try:
+        for _ in range(rounds):
+            at = AppTest.from_file(APP_SCRIPT, default_timeout=timeout)
+            at.session_state["_bench_bom"] = bom_path
+            at.session_state["_bench_station"] = station_path
+            result["timings"].append(_flow(at))
+    except Exception as e:
+        result["error"] = repr(e)
+    result["elapsed"] = time.perf_counter() - t_start
+    result["rss_mb"], result["peak_rss_mb"] = _rss_mb()
+    queue.put(result)
+
+
+def _percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1)))))
+    return round(ordered[k], 3)
+
+
+def run_level(n_sessions, bom_path, station_path, rounds, timeout):
+    ctx = mp.get_context("spawn")
+    barrier = ctx.Barrier(n_sessions)
+    queue = ctx.Queue()
+    procs = [ctx.Process(target=_session, args=(bom_path, station_path, rounds, timeout, barrier, queue))
+             for _ in range(n_sessions)]
+    for p in procs: p.start()
+    results = [queue.get() for _ in procs]
+    for p in procs: p.join()
+
+    wall = max(r["elapsed"] for r in results)
+    done = sum(len(r["timings"]) for r in results)
+    row = {
+        "sessions": n_sessions, "rounds": rounds,
+        "wall_s": round(wall, 3), "throughput_sps": round(done / wall, 3) if wall else None,
+        "errors": [r["error"] for r in results if r["error"]],
+        "rss_mb": round(sum(r["rss_mb"] or 0 for r in results), 1),
+        "peak_rss_mb": round(sum(r["peak_rss_mb"] or 0 for r in results), 1),
+    }
+    for step in STEPS:
+        vals = [t[step] for r in results for t in r["timings"]]
+        row[step] = {"p50": _percentile(vals, 50), "p90": _percentile(vals, 90), "p99": _percentile(vals, 99),
+                     "mean": round(statistics.mean(vals), 3) if vals else None}
+    return row
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Streamlit 多会话并发压测")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--lines", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=1, help="每个会话重复完整流程的次数")
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--data", default=os.path.join(os.path.dirname(__file__), "data"))
+    parser.add_argument("--out", default=os.path.join(os.path.dirname(__file__), "results",
+                                                     f"load_{datetime.now():%Y%m%d_%H%M%S}.json"))
+    args = parser.parse_args()
+
+    bom_path, station_path = generate(args.lines, args.data)
+    rows = []
+    print(f"{'N':>4} {'wall(s)':>8} {'流程/s':>7} {'峰值RSS':>8}  " + "  ".join(f"{s + ' p50/p90/p99':>24}" for s in STEPS))
+    for n in args.sessions:
+        row = run_level(n, bom_path, station_path, args.rounds, args.timeout)
+        rows.append(row)
+        cols = "  ".join(f"{row[s]['p50']!s:>7}/{row[s]['p90']!s:>7}/{row[s]['p99']!s:>7}" for s in STEPS)
+        print(f"{n:>4} {row['wall_s']:>8} {row['throughput_sps']!s:>7} {row['peak_rss_mb']!s:>8}  {cols}", flush=True)
+        for err in row["errors"]:
+            print(f"     ❌ {err}")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump({"timestamp": datetime.now().isoformat(timespec="seconds"), "results": rows}, f,
+                  ensure_ascii=False, indent=2)
+    print(f"\n结果已写入 {args.out}")
@@ -0,0 +1,151 @@
+# bench/run_bench.py
+"""
+分阶段性能基准：加载 -> 聚合 -> 比对 -> 通用比对类 -> 报告导出。
+
+每个阶段单独计时（取多次运行的中位数），并可选用 tracemalloc 记录峰值内存；
+结果写入 JSON，便于不同版本之间对比。
+
+用法:
+    python bench/run_bench.py --lines 1000 10000 --repeat 3 --out bench/results/latest.json
+    python bench/run_bench.py compare bench/results/old.json bench/results/new.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import logging
+logging.getLogger("streamlit").setLevel(logging.ERROR)
+
+import pandas as pd
+from bench.generate import generate
+from src.data_loader import read_table
+from src.logic import run_smt_comparison, aggregate_station, aggregate_bom, SMTComparator
+from src.report import build_report_xlsx
+
+# 不经 st.cache_data，确保每次都真实解析
+_load = read_table
+
+CONFIG = {
+    'bom_pn': '编号', 'bom_ref': ['位置号1', '位置号2'], 'bom_sub': '替代状况', 'bom_desc': '物料描述',
+    'bom_qty': '*数量',
+    'st_pn': '元件名', 'st_ref': ['图样名', '图样名.1'], 'st_slot': '安装号码', 'st_desc': '备注',
+    'st_qty': '总数',
+}
+
+
+class _BenchFile:
+    """模拟 Streamlit UploadedFile（name + getvalue）"""
+    def __init__(self, path):
+        self.name = os.path.basename(path)
+        with open(path, "rb") as f:
+            self._data = f.read()
+
+    def getvalue(self):
+        return self._data
+
+
+def _to_comparator_input(df_bom, df_station):
+    bom_list = [{"main_part": r["编号"], "alt_part": r["替代状况"], "description": r["物料描述"],
+                 "refs": ",".join(x for x in (r["位置号1"], r["位置号2"]) if x)}
+                for r in df_bom.to_dict("records")]
+    station_list = [{"part_no": r["元件名"], "slot": r["安装号码"], "comment": r["备注"],
+                     "refs": "/".join(x for x in (r["图样名"], r["图样名.1"]) if x)}
+                    for r in df_station.to_dict("records")]
+    return bom_list, station_list
+
+
+def _measure(fn, repeat, memory):
+    times = []
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - t0)
+    peak_mb = None
+    if memory:
+        tracemalloc.start()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peak_mb = round(peak / 1024 / 1024, 2)
+    return result, {"seconds": round(statistics.median(times), 4), "min": round(min(times), 4), "peak_mb": peak_mb}
+
+
+def run(lines_list, repeat, memory, data_dir):
+    rows = []
+    for n in lines_list:
+        bom_path, station_path = generate(n, data_dir)
+        bom_file, station_file = _BenchFile(bom_path), _BenchFile(station_path)
+        stages = []
+
+        df_bom, m = _measure(lambda: _load(bom_file), repeat, memory); stages.append(("load_bom", m))
+        df_station, m = _measure(lambda: _load(station_file), repeat, memory); stages.append(("load_station", m))
+        _, m = _measure(lambda: (aggregate_station(df_station, CONFIG), aggregate_bom(df_bom, CONFIG)), repeat, memory)
+        stages.append(("aggregate", m))
+        (results, _, _), m = _measure(lambda: run_smt_comparison(df_bom, df_station, CONFIG, True), repeat, memory)
+        stages.append(("compare", m))
+        bom_list, station_list = _to_comparator_input(df_bom, df_station)
+        _, m = _measure(lambda: SMTComparator().compare(bom_list, station_list), repeat, memory)
+        stages.append(("comparator", m))
+        meta = {'wo_number': 'BENCH', 'wo_qty': 1, 'inspector': 'bench', 'check_time': '2025-01-01 00:00:00'}
+        report, m = _measure(lambda: build_report_xlsx(results, df_bom, df_station, meta), repeat, memory)
+        with report:
+            m["bytes"] = os.fstat(report.fileno()).st_size
+        stages.append(("export", m))
+
+        for stage, m in stages:
+            rows.append({"lines": n, "stage": stage, **m})
+            print(f"{n:>7} {stage:<13} {m['seconds']:>9.4f}s  peak {m['peak_mb']} MB", flush=True)
+    return rows
+
+
+def _meta():
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        commit = ""
+    return {"timestamp": datetime.now().isoformat(timespec="seconds"), "commit": commit,
+            "python": platform.python_version(), "pandas": pd.__version__, "platform": platform.platform()}
+
+
+def compare(old_path, new_path):
+    """对比两份结果 JSON，输出各阶段耗时比（new / old）"""
+    with open(old_path, encoding="utf-8") as f: old = json.load(f)
+    with open(new_path, encoding="utf-8") as f: new = json.load(f)
+    old_idx = {(r["lines"], r["stage"]): r for r in old["results"]}
+    print(f"{'lines':>7} {'stage':<13} {'old(s)':>9} {'new(s)':>9} {'ratio':>7}")
+    for r in new["results"]:
+        o = old_idx.get((r["lines"], r["stage"]))
+        if o is None: continue
+        ratio = r["seconds"] / o["seconds"] if o["seconds"] else float("nan")
+        print(f"{r['lines']:>7} {r['stage']:<13} {o['seconds']:>9.4f} {r['seconds']:>9.4f} {ratio:>7.2f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "compare":
+        compare(sys.argv[2], sys.argv[3])
+        sys.exit(0)
+    parser = argparse.ArgumentParser(description="SMT 比对分阶段性能基准")
+    parser.add_argument("--lines", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-memory", action="store_true", help="不统计峰值内存（tracemalloc 会额外跑一遍）")
+    parser.add_argument("--data", default=os.path.join(os.path.dirname(__file__), "data"))
+    parser.add_argument("--out", default=os.path.join(os.path.dirname(__file__), "results",
+                                                     f"bench_{datetime.now():%Y%m%d_%H%M%S}.json"))
+    args = parser.parse_args()
+
+    rows = run(args.lines, args.repeat, not args.no_memory, args.data)
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump({"meta": _meta(), "results": rows}, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已写入 {args.out}")
@@ -5,6 +5,7 @@ ALIAS_CONFIG = {
     'BOM_REF2': ["位置号2", "位号2", "Ref2", "Designator2", "Pos2", "B面位号"],
     'BOM_SUB': ["替代", "替料", "Sub", "Alt", "替代料"],
     'BOM_DESC': ["物料描述", "描述", "规格", "Desc", "Spec", "Value"],
+    'BOM_QTY': ["*数量", "用量", "Qty", "Quantity"],
     # 站位表：与BOM统一描述（物料编号、物料规格等）
     'ST_PN': ["编号", "元件", "料号", "Part", "Name", "元件名", "物料编号"],
     'ST_REF': ["位置号1", "图样", "位号", "Ref", "Designator", "图样名", "位置号"],
@@ -1,3 +1,6 @@
+import os
+import tempfile
+
 PAGE_CONFIG = {
     "page_title": "SMT防错比对系统",
     "page_icon": "🛡️",
@@ -5,8 +8,62 @@ PAGE_CONFIG = {
     "initial_sidebar_state": "collapsed"
 }
 SPLIT_PATTERN = r'[、,，/ ;；\n\t\-]+'
+# 与 SPLIT_PATTERN 互补：匹配单个位号 token，用于向量化统计位号数量
+REF_TOKEN_PATTERN = r'[^、,，/ ;；\n\t\-]+'
 SPEC_PATTERNS = {
     "PKG": r'\b(01005|0201|0402|0603|0805|1206|1210|2010|2512)\b',
     "VOLT": r'\b(\d+(?:\.\d+)?V)\b'
 }
-CACHE_TTL = 3600
\ No newline at end of file
+# 站位号结构解析：按顺序尝试，命名分组 machine / table / lane / sub 均为可选
+SLOT_PATTERNS = [
+    r'^(?P<lane>\d+)$',                                                          # 6
+    r'^(?P<machine>[A-Z]*\d+)[-_](?P<table>[A-Z]?\d+)[-_](?P<lane>\d+)(?:[-_](?P<sub>[A-Z0-9]+))?$',  # 1-2-15-L / M1-T2-15
+    r'^(?P<table>[A-Z]{1,2})[-_]?(?P<lane>\d+)(?:[-_]?(?P<sub>[LR]))?$',          # F15 / R-08L
+]
+CACHE_TTL = 3600
+# 性能埋点：关闭后阶段计时为空操作；tracemalloc 会明显拖慢运行，仅排查内存时开启
+PERF_ENABLED = True
+PERF_TRACEMALLOC = False
+# 运行指标（Prometheus 文本格式，GET /metrics）：关闭后记录为空操作；页面进程的监听地址与端口（0 为不启动），
+# 同机多个 Streamlit 实例时只有第一个占到端口；HTTP 接口在自身端口提供 /metrics，目录监视使用 WATCH_METRICS_PORT
+METRICS_ENABLED = True
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = int(os.environ.get("SMT_METRICS_PORT", "9108"))
+# 导出文件签名密钥：设置后签名为 HMAC-SHA256（防篡改），未设置时为普通 SHA-256 摘要（仅防损坏）
+EXPORT_SIGNING_KEY = os.environ.get("SMT_EXPORT_KEY", "")
+# 结果存储：所有会话共享的内存预算，超出后按 LRU 落盘；落盘结果超过 TTL（秒）未访问即删除
+RESULT_STORE_BUDGET_MB = 512
+RESULT_STORE_DIR = "result_cache"
+RESULT_STORE_TTL = 24 * 3600
+# 推测执行：上传即后台解析、映射确定即预聚合的线程池大小，以及进程内保留的任务结果数（LRU）
+SPECULATIVE_WORKERS = 2
+SPECULATIVE_MAX_ENTRIES = 32
+# 结果归档（Parquet，按 月份/机种 分区）：分区内文件数达到该值时合并为一个文件
+ARCHIVE_DIR = "archive"
+ARCHIVE_COMPACT_FILES = 16
+ARCHIVE_COMPRESSION = "zstd"
+# 共享 BOM 库：已审核 BOM 所在目录（文件名以机种编号开头），审核通过时是否自动把本次上传的 BOM 入库
+BOM_LIBRARY_DIR = "bom_library"
+BOM_LIBRARY_AUTO_ADD = True
+# 后台任务：进程内工作线程数；本机所有进程合计同时执行的任务数（锁文件槽位，位于系统临时目录）；
+# 完成任务的保留时间（秒）；点击比对后脚本先等待的秒数（小任务当场出结果，超时后转为后台轮询）
+JOB_WORKERS = 2
+JOB_HOST_SLOTS = max(1, (os.cpu_count() or 2) // 2)
+JOB_SLOT_DIR = os.path.join(tempfile.gettempdir(), "smt_job_slots")
+JOB_RESULT_TTL = 3600
+JOB_INLINE_WAIT = 2.0
+JOB_POLL_INTERVAL = 0.5
+# HTTP 接口（api.py，供 MES 等系统调用）：监听地址与端口；比对工作进程数；单次上传上限；
+# 访问令牌（环境变量 SMT_API_TOKEN，为空时不校验，仅建议在只监听本机时留空）
+API_HOST = "127.0.0.1"
+API_PORT = 8502
+API_PROCESSES = 2
+API_MAX_UPLOAD_MB = 50
+API_TOKEN = os.environ.get("SMT_API_TOKEN", "")
+# 目录监视（watch.py）：文件大小 / 修改时间持续不变多少秒视为写完；无文件事件时的扫描间隔；
+# 有文件事件时的兜底全量扫描间隔（网络共享上其他主机写入的文件往往没有事件）；比对工作进程数
+WATCH_SETTLE_SECONDS = 2.0
+WATCH_POLL_INTERVAL = 1.0
+WATCH_SWEEP_INTERVAL = 30.0
+WATCH_PROCESSES = 2
+WATCH_METRICS_PORT = 9109
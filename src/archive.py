@@ -0,0 +1,272 @@
+# src/archive.py
+"""
+结果归档：每次比对的异常结论（不含 🟢 正常 / ⚪ 忽略）追加写入 Parquet（zstd 压缩），按 月份 / 机种 分区，
+文件清单登记在数据库 archive_files 表（见 user_manager）。缺陷分析页按时间范围统计 Top 料号 / 位号 / 站位，
+由索引挑出时间与机种有交集的文件，只读取需要的列，不需要翻原始报告。
+
+    archive/month=2026-10/model=20130101300816/run-00000123.parquet
+
+- 每次比对写一个文件；当月分区内文件数达到 ARCHIVE_COMPACT_FILES 时合并为一个，
+  进入新的月份后，此前各月的分区各合并为一个文件：查询一年只需打开约 12 × 机种数 个文件
+- 每行一条结论；refs 为该条结论涉及的位号（位号不符为漏贴 + 多贴，其余为全部位号），按位号统计时展开
+- pyarrow 为可选依赖：未安装时不归档（记录日志），分析页提示安装
+"""
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from config.settings import ARCHIVE_COMPACT_FILES, ARCHIVE_COMPRESSION, ARCHIVE_DIR
+from src.lazy import MissingDependency, available, lazy_import
+from src.result_view import slot_group
+from src.user_manager import add_archive_file, archive_partitions, list_archive_files, replace_archive_files
+from src.utils import normalize_ref_designator, parse_slot
+
+pa = lazy_import("pyarrow")
+pc = lazy_import("pyarrow.compute")
+pd = lazy_import("pandas")
+pq = lazy_import("pyarrow.parquet")
+pa_ds = lazy_import("pyarrow.dataset")
+
+logger = logging.getLogger("smt.archive")
+
+# 不归档的级别（正常 / NC 跳过），只保留需要分析的结论
+SKIP_LEVELS = {"🟢 正常", "⚪ 忽略"}
+# 结论中的占位料号（站位冲突 / 数据错误等行），归档为空，不计入料号统计
+PLACEHOLDER_PNS = {"N/A", "MISSING", "UNKNOWN", ""}
+
+# 统计维度 -> 归档列（列表列按元素展开）
+DIMENSIONS = {
+    "料号": "pn",
+    "位号": "refs",
+    "站位": "slots",
+    "机台-料台": "slot_groups",
+    "机种": "model",
+}
+LIST_COLUMNS = {"refs", "slots", "slot_groups"}
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+_schema = None
+_compact_lock = threading.Lock()
+
+
+def _arrow_schema():
+    global _schema
+    if _schema is None:
+        strings = pa.list_(pa.string())
+        _schema = pa.schema([
+            ("run_id", pa.int64()), ("started_at", pa.timestamp("s")), ("model", pa.string()),
+            ("mode", pa.string()), ("level", pa.string()), ("status", pa.string()), ("pn", pa.string()),
+            ("detail", pa.string()), ("slots", strings), ("slot_groups", strings), ("refs", strings),
+        ])
+    return _schema
+
+
+def enabled():
+    return available("pyarrow")
+
+
+def missing_backend():
+    """pyarrow 未安装时返回 MissingDependency（供分析页提示），否则返回 None"""
+    return None if enabled() else MissingDependency("结果归档与缺陷分析", "pyarrow")
+
+
+def _split(text):
+    return [x.strip() for x in str(text or "").split(",") if x.strip()]
+
+
+def _affected_refs(r):
+    """该条结论涉及的位号：位号不符取 BOM 与实装的差集（按归一化位号比较），其余取全部位号"""
+    bom_refs, found_refs = _split(r.get("BOM位号明细")), _split(r.get("实装位号明细"))
+    if r.get("核对结果") != "位号不符":
+        return list(dict.fromkeys(bom_refs + found_refs))
+    norm_bom = {normalize_ref_designator(x): x for x in bom_refs}
+    norm_found = {normalize_ref_designator(x): x for x in found_refs}
+    return ([v for k, v in norm_bom.items() if k not in norm_found]
+            + [v for k, v in norm_found.items() if k not in norm_bom])
+
+
+def _finding_row(r, run_id, started_at, model, mode):
+    slots = _split(r.get("站位号"))
+    pn = r.get("BOM料号")
+    if r.get("核对结果") == "错料/多余":
+        pn = str(r.get("差异说明", "")).replace("❌ 非法物料: ", "")
+    pn = None if pn is None or str(pn) in PLACEHOLDER_PNS else str(pn)
+    return {
+        "run_id": run_id, "started_at": started_at, "model": model, "mode": mode,
+        "level": r.get("级别"), "status": r.get("核对结果"), "pn": pn,
+        "detail": r.get("差异说明"), "slots": slots,
+        "slot_groups": list(dict.fromkeys(g for g in (slot_group(parse_slot(s)) for s in slots) if g)),
+        "refs": _affected_refs(r),
+    }
+
+
+def _partition(month, model):
+    safe = "".join(c if c.isalnum() or c in "-_." else "_" for c in str(model)) or "_"
+    return f"month={month}/model={safe}"
+
+
+def _write(table, rel):
+    """写到同目录临时文件再原子替换：读者不会看到写了一半的文件"""
+    path = os.path.join(ARCHIVE_DIR, rel)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".", suffix=".tmp")
+    os.close(fd)
+    try:
+        pq.write_table(table, tmp, compression=ARCHIVE_COMPRESSION)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+def archive_findings(run_id, model, started_at, results, mode=None):
+    """
+    归档一次比对的异常结论。
+
+    Args:
+        run_id:     核对记录 ID（user_manager.record_run），可为 None
+        started_at: 'YYYY-MM-DD HH:MM:SS'
+        results:    结果列表（list-of-dicts）
+
+    Returns:
+        int: 归档的结论条数（pyarrow 未安装或无异常时为 0）
+    """
+    if not enabled():
+        logger.info("pyarrow 未安装，跳过结果归档")
+        return 0
+    ts = datetime.strptime(started_at, TIME_FORMAT)
+    rows = [_finding_row(r, run_id, ts, model, mode) for r in results if r.get("级别") not in SKIP_LEVELS]
+    if not rows:
+        return 0
+
+    month = started_at[:7]
+    name = f"run-{run_id:08d}" if run_id else f"run-{uuid.uuid4().hex}"
+    rel = f"{_partition(month, model)}/{name}.parquet"
+    _write(pa.Table.from_pylist(rows, schema=_arrow_schema()), rel)
+    add_archive_file(path=rel, month=month, model=model, rows=len(rows), runs=1,
+                     first_at=started_at, last_at=started_at)
+
+    if len(list_archive_files(month=month, models=[model])) >= ARCHIVE_COMPACT_FILES:
+        compact(month, model)
+    for closed_month, closed_model in archive_partitions(before_month=month):
+        compact(closed_month, closed_model)
+    return len(rows)
+
+
+def compact(month, model):
+    """
+    合并一个分区的全部文件（按时间排序）。索引替换在一个事务内完成；
+    若其间分区已被其他进程合并，则放弃本次结果。
+
+    Returns:
+        bool: 是否完成合并
+    """
+    with _compact_lock:
+        files = list_archive_files(month=month, models=[model])
+        if len(files) < 2:
+            return False
+        paths = [f["path"] for f in files]
+        try:
+            table = pa.concat_tables([pq.read_table(os.path.join(ARCHIVE_DIR, p), schema=_arrow_schema())
+                                      for p in paths])
+        except FileNotFoundError:   # 其他进程正在合并
+            return False
+        rel = f"{_partition(month, model)}/part-{uuid.uuid4().hex}.parquet"
+        _write(table.sort_by("started_at"), rel)
+        ok = replace_archive_files(paths, path=rel, month=month, model=model, rows=table.num_rows,
+                                   runs=sum(f["runs"] for f in files),
+                                   first_at=min(f["first_at"] for f in files),
+                                   last_at=max(f["last_at"] for f in files))
+        for p in (paths if ok else [rel]):
+            try:
+                os.remove(os.path.join(ARCHIVE_DIR, p))
+            except OSError:
+                pass
+        return ok
+
+
+def _filter(since, until, models, statuses):
+    expr = None
+    conds = []
+    if since:
+        conds.append(pa_ds.field("started_at") >= pa.scalar(datetime.strptime(since, TIME_FORMAT), pa.timestamp("s")))
+    if until:
+        conds.append(pa_ds.field("started_at") <= pa.scalar(datetime.strptime(until, TIME_FORMAT), pa.timestamp("s")))
+    if models:
+        conds.append(pa_ds.field("model").isin(list(models)))
+    if statuses:
+        conds.append(pa_ds.field("status").isin(list(statuses)))
+    for c in conds:
+        expr = c if expr is None else expr & c
+    return expr
+
+
+def _scan(files, column, expr):
+    dataset = pa_ds.dataset([os.path.join(ARCHIVE_DIR, f["path"]) for f in files],
+                            schema=_arrow_schema(), format="parquet")
+    cols = list(dict.fromkeys([column, "run_id", "model", "started_at"]))
+    return dataset.to_table(columns=cols, filter=expr)
+
+
+def query_top(dimension, since=None, until=None, models=None, statuses=None, limit=20):
+    """
+    Top-N 统计（帕累托）：按维度计数，附涉及的比对次数、机种数、最近出现时间与累计占比。
+
+    Args:
+        dimension: DIMENSIONS 的键
+        since / until: 'YYYY-MM-DD HH:MM:SS'（含），None 为不限
+        models / statuses: 只统计这些机种 / 核对结果（None 或空为全部）
+
+    Returns:
+        (pd.DataFrame, dict): 统计表（按次数降序，最多 limit 行）与 {'files', 'rows', 'total', 'seconds'}
+    """
+    t0 = time.perf_counter()
+    column = DIMENSIONS[dimension]
+    columns = [dimension, "次数", "占比", "累计占比", "比对次数", "机种数", "最近出现"]
+    expr = _filter(since, until, models, statuses)
+    for attempt in range(2):
+        files = list_archive_files(since, until, models)
+        if not files:
+            return pd.DataFrame(columns=columns), {'files': 0, 'rows': 0, 'total': 0, 'seconds': time.perf_counter() - t0}
+        try:
+            table = _scan(files, column, expr)
+            break
+        except FileNotFoundError:   # 读取期间分区被合并：按新索引重读一次
+            if attempt:
+                raise
+    rows = table.num_rows
+
+    if column in LIST_COLUMNS:
+        parents = pc.list_parent_indices(table[column])
+        table = pa.table({
+            "key": pc.list_flatten(table[column]),
+            "run_id": table["run_id"].take(parents),
+            "model": table["model"].take(parents),
+            "started_at": table["started_at"].take(parents),
+        })
+    else:
+        table = pa.table({"key": table[column], "run_id": table["run_id"],
+                          "model": table["model"], "started_at": table["started_at"]})
+    table = table.filter(pc.and_(pc.is_valid(table["key"]), pc.not_equal(table["key"], "")))
+
+    agg = table.group_by("key").aggregate([
+        ("key", "count"), ("run_id", "count_distinct"), ("model", "count_distinct"), ("started_at", "max"),
+    ]).sort_by([("key_count", "descending"), ("key", "ascending")])
+    total = pc.sum(agg["key_count"]).as_py() or 0
+    top = agg.slice(0, limit).to_pandas()
+
+    df = pd.DataFrame({
+        dimension: top["key"],
+        "次数": top["key_count"],
+        "占比": top["key_count"] / total if total else 0.0,
+        "比对次数": top["run_id_count_distinct"],
+        "机种数": top["model_count_distinct"],
+        "最近出现": top["started_at_max"].dt.strftime(TIME_FORMAT),
+    })
+    df["累计占比"] = df["占比"].cumsum()
+    return df[columns], {'files': len(files), 'rows': rows, 'total': total, 'seconds': time.perf_counter() - t0}
@@ -0,0 +1,275 @@
+# src/bom_library.py
+"""
+共享 BOM 库：目录 BOM_LIBRARY_DIR 中已审核的 BOM（文件名以机种编号开头），按机种编号索引。
+操作员只上传站位表时，按其机种编号直接取库中的 BOM，不必再上传、解析。
+
+- 启动后在后台把每份 BOM 预解析为 Arrow IPC 文件（.cache/ 下，不压缩），使用时内存映射读取：
+  DataFrame 的列保持 Arrow 存储、直接引用映射页，本机各工作进程读的是同一份系统页缓存；
+  聚合等由它派生的数据仍为各进程私有（pyarrow 未安装时退化为进程内解析缓存）
+- 缓存文件名含源文件内容摘要：源文件被替换后自动重建，过期缓存在下次扫描时删除
+- 每次取用前按目录内文件的 (名称, 大小, 修改时间) 判断是否需要重新扫描，增删 BOM 无需重启
+- 同一机种有多个文件时取修改时间最新的一个；add 入库 / remove 删除时该机种的全部文件一并处理，不会残留旧版本；
+  审核通过时本次上传的 BOM 自动入库（BOM_LIBRARY_AUTO_ADD）
+"""
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+
+from config.settings import BOM_LIBRARY_DIR
+from src import metrics, perf
+from src.data_loader import read_table
+from src.lazy import available, lazy_import
+from src.utils import extract_file_id
+
+pd = lazy_import("pandas")
+pa = lazy_import("pyarrow")
+pa_ipc = lazy_import("pyarrow.ipc")
+
+logger = logging.getLogger("smt.bom_library")
+
+EXTENSIONS = ('.xlsx', '.xls', '.csv')
+CACHE_DIR = ".cache"
+
+_lock = threading.Lock()
+_signature = None      # 上次扫描时目录内文件的 (名称, 大小, 修改时间)
+_index = {}            # 机种编号 -> LibraryFile
+_digests = {}          # (路径, 大小, 修改时间) -> 内容摘要
+_frames = {}           # 内容摘要 -> DataFrame（各会话共享，只读）
+_loading = {}          # 内容摘要 -> 加载锁（同一文件只加载一次）
+_preload_started = False
+
+
+class LibraryFile:
+    """库中的 BOM；接口与上传文件一致（name / file_id / getvalue），可直接替代 bom_file 使用"""
+
+    def __init__(self, model, path, digest, mtime):
+        self.model = model
+        self.path = path
+        self.digest = digest
+        self.mtime = mtime
+        self.name = os.path.basename(path)
+        self.file_id = f"library:{digest}"
+
+    def getvalue(self):
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    @property
+    def cache_path(self):
+        return os.path.join(BOM_LIBRARY_DIR, CACHE_DIR, f"{self.model}-{self.digest}.arrow")
+
+
+def _listing():
+    if not os.path.isdir(BOM_LIBRARY_DIR):
+        return ()
+    entries = []
+    for e in os.scandir(BOM_LIBRARY_DIR):
+        if e.is_file() and not e.name.startswith((".", "~$")) and os.path.splitext(e.name)[1].lower() in EXTENSIONS:
+            st = e.stat()
+            entries.append((e.name, st.st_size, st.st_mtime_ns))
+    return tuple(sorted(entries))
+
+
+def _digest(path, size, mtime):
+    key = (path, size, mtime)
+    digest = _digests.get(key)
+    if digest is None:
+        with open(path, "rb") as f:
+            digest = _digests[key] = hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+    return digest
+
+
+def _scan():
+    """目录有变化时重建索引，并删除不再对应任何 BOM 的缓存文件"""
+    global _signature, _index
+    listing = _listing()
+    with _lock:
+        if listing == _signature:
+            return
+        index = {}
+        for name, size, mtime in listing:
+            model = extract_file_id(name)
+            if not model:
+                continue
+            path = os.path.join(BOM_LIBRARY_DIR, name)
+            if model not in index or mtime > index[model].mtime:
+                index[model] = LibraryFile(model, path, _digest(path, size, mtime), mtime)
+        _index, _signature = index, listing
+        live = {os.path.basename(f.cache_path) for f in index.values()}
+        live_digests = {f.digest for f in index.values()}
+        for digest in [d for d in _frames if d not in live_digests]:
+            del _frames[digest]
+    cache_dir = os.path.join(BOM_LIBRARY_DIR, CACHE_DIR)
+    if os.path.isdir(cache_dir):
+        for name in os.listdir(cache_dir):
+            if name.endswith(".arrow") and name not in live:
+                try:
+                    os.remove(os.path.join(cache_dir, name))
+                except OSError:
+                    pass
+
+
+def _write_cache(file, df):
+    """DataFrame -> Arrow IPC（临时文件 + 原子替换，多进程同时构建也不会读到半个文件）"""
+    os.makedirs(os.path.dirname(file.cache_path), exist_ok=True)
+    table = pa.Table.from_pandas(df.astype(str), preserve_index=False)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(file.cache_path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as sink, pa_ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(tmp, file.cache_path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+def _read_cache(file):
+    """
+    内存映射 Arrow 缓存 -> DataFrame。列保持 Arrow 存储（pd.ArrowDtype），数据仍在映射的文件页中，
+    不复制成 object 列；同一进程内各会话共用这一份（见 frame）。
+    """
+    with perf.stage("bom_library_mmap"):
+        table = pa_ipc.open_file(pa.memory_map(file.cache_path)).read_all()
+        df = table.to_pandas(types_mapper=pd.ArrowDtype, self_destruct=False)
+    metrics.inc("smt_file_loads_total", path="arrow_cache")
+    return df
+
+
+def _load(file):
+    """库中 BOM -> DataFrame：优先内存映射 Arrow 缓存，缺失时解析源文件并写缓存"""
+    use_arrow = available("pyarrow")
+    if use_arrow and os.path.exists(file.cache_path):
+        try:
+            return _read_cache(file)
+        except Exception as e:
+            logger.warning("BOM 库缓存损坏，重新解析 %s: %s", file.name, e)
+    with perf.stage("bom_library_parse"):
+        df = read_table(file)   # 不调用 st.*：可能在后台线程 / 工作进程中调用；无法解析时抛出 LoadError
+    if df is None:
+        return None
+    if use_arrow:
+        try:
+            _write_cache(file, df)
+            return _read_cache(file)
+        except Exception as e:
+            logger.warning("BOM 库缓存写入失败 %s: %s", file.name, e)
+    return df
+
+
+def lookup(model):
+    """按机种编号取库中的 BOM（LibraryFile），不存在时返回 None"""
+    if not model:
+        return None
+    _scan()
+    return _index.get(model)
+
+
+def frame(file):
+    """
+    库中 BOM 的解析结果（各会话共享同一个 DataFrame，调用方不得修改）；源文件无法解析时抛出 LoadError。
+    按文件加锁：预加载与多个会话同时首次访问同一 BOM 时只加载一次，其余等待后直接取缓存。
+    """
+    with _lock:
+        df = _frames.get(file.digest)
+        loading = None if df is not None else _loading.setdefault(file.digest, threading.Lock())
+    if df is not None:
+        metrics.inc("smt_file_loads_total", path="cache_hit")
+        return df
+    with loading:
+        with _lock:
+            df = _frames.get(file.digest)
+        if df is not None:
+            metrics.inc("smt_file_loads_total", path="cache_hit")
+            return df
+        df = _load(file)
+        with _lock:
+            if df is not None:
+                _frames[file.digest] = df
+            _loading.pop(file.digest, None)
+    return df
+
+
+def entries():
+    """当前库中的 BOM（按机种编号排序）"""
+    _scan()
+    return [_index[m] for m in sorted(_index)]
+
+
+def _model_paths(model):
+    """目录中属于该机种的全部 BOM 文件（不只是索引中最新的一个）"""
+    return [os.path.join(BOM_LIBRARY_DIR, name) for name, _, _ in _listing() if extract_file_id(name) == model]
+
+
+def _remove_caches(model, keep=None):
+    """删除该机种的 Arrow 缓存（keep 除外）"""
+    cache_dir = os.path.join(BOM_LIBRARY_DIR, CACHE_DIR)
+    if not os.path.isdir(cache_dir):
+        return
+    for name in os.listdir(cache_dir):
+        if name.startswith(f"{model}-") and name.endswith(".arrow") and name != keep:
+            os.remove(os.path.join(cache_dir, name))
+
+
+def add(model, name, data, df=None):
+    """
+    BOM 入库（覆盖该机种原有的 BOM 文件：目录中该机种的其他文件一并删除）。已有解析结果时传入 df，直接写缓存，不再解析。
+
+    Returns:
+        (bool, str)
+    """
+    if not model or extract_file_id(name) != model:
+        return False, "文件名须以机种编号开头"
+    try:
+        os.makedirs(BOM_LIBRARY_DIR, exist_ok=True)
+        path = os.path.join(BOM_LIBRARY_DIR, os.path.basename(name))
+        fd, tmp = tempfile.mkstemp(dir=BOM_LIBRARY_DIR, prefix=".", suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        for old in _model_paths(model):
+            if old != path:
+                os.remove(old)
+        file = lookup(model)
+        _remove_caches(model, keep=None if file is None else os.path.basename(file.cache_path))
+        if df is not None and file is not None and available("pyarrow"):
+            _write_cache(file, df)
+        return True, f"已加入 BOM 库（{model}）"
+    except Exception as e:
+        return False, f"入库失败: {e}"
+
+
+def remove(model):
+    """从库中删除该机种的 BOM（目录中该机种的全部文件及其缓存，不会退回到旧版本）"""
+    paths = _model_paths(model) if model else []
+    if not paths:
+        return False, "BOM 库中没有该机种"
+    try:
+        for path in paths:
+            os.remove(path)
+        _remove_caches(model)
+        _scan()
+        return True, f"已从 BOM 库删除（{model}）"
+    except OSError as e:
+        _scan()
+        return False, f"删除失败: {e}"
+
+
+def _preload():
+    for file in entries():
+        try:
+            frame(file)
+        except Exception as e:
+            logger.warning("BOM 库预加载失败 %s: %s", file.name, e)
+    logger.info("BOM 库预加载完成: %d 个机种", len(_index))
+
+
+def start_preload():
+    """启动后台预加载（每个进程只执行一次）；库目录不存在时为空操作"""
+    global _preload_started
+    with _lock:
+        if _preload_started or not os.path.isdir(BOM_LIBRARY_DIR):
+            return
+        _preload_started = True
+    threading.Thread(target=_preload, name="smt-bom-library", daemon=True).start()
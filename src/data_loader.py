@@ -1,12 +1,20 @@
-import pandas as pd
-import xlwings as xw
+from __future__ import annotations   # 类型注解不触发 pandas 导入
+
 import os
 import tempfile
 import threading
+import time
 import streamlit as st
 import logging
 from config.settings import CACHE_TTL
 from src.utils import deduplicate_headers
+from src import metrics, perf
+from src.lazy import MissingDependency, lazy_import, require
+
+pd = lazy_import("pandas")
+
+# 扩展名 -> pandas 读取引擎（同名模块为可选依赖）；xlwings 仅在 pandas 读取失败时兜底，按需导入
+READ_ENGINES = {'.xlsx': 'openpyxl', '.xls': 'xlrd'}
 
 EXCEL_LOCK = threading.Lock()
 
@@ -89,9 +97,67 @@ def _materialize_dataframe(df: pd.DataFrame):
     data = data.dropna(how="all").reset_index(drop=True)
     return data
 
+class LoadError(Exception):
+    """文件无法解析：title 为提示标题，detail 为失败原因，hint 为处理建议（可为空）"""
+
+    def __init__(self, title, detail, hint=""):
+        super().__init__(f"{title}: {detail}")
+        self.title = title
+        self.detail = detail
+        self.hint = hint
+
+
+def _read_error(pandas_error, fallback_error):
+    """pandas 与 xlwings 兜底均失败时的错误"""
+    if isinstance(pandas_error, MissingDependency):
+        return LoadError("❌ 环境缺失依赖库", str(pandas_error), f"请在终端运行: `pip install {pandas_error.package}`")
+    if isinstance(fallback_error, MissingDependency) or "Microsoft Excel" in str(fallback_error) or "not found" in str(fallback_error):
+        return LoadError("❌ 文件解析失败", str(pandas_error))
+    return LoadError("❌ 文件读取失败", str(fallback_error))
+
+def report_load_error(e):
+    """在页面上显示 LoadError（只能在脚本线程中调用）"""
+    if e.hint:
+        st.error(e.title); st.info(e.hint)
+    else:
+        st.error(e.title); st.warning(f"详情: {e.detail}")
+
+def _record_load(path, t0):
+    """加载方式（pandas / fallback / failed）与耗时计入运行指标"""
+    metrics.inc("smt_file_loads_total", path=path)
+    if path != "failed":
+        metrics.observe("smt_parse_seconds", time.perf_counter() - t0, path=path)
+
+# st.cache_data 命中时不执行函数体：调用前置位，函数体内清除，调用后仍置位即为命中（按线程区分并发会话）
+_cache_probe = threading.local()
+
 @st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def _load_excel_cached(file) -> pd.DataFrame:
+    _cache_probe.hit = False
+    try:
+        return read_table(file)
+    except LoadError as e:
+        report_load_error(e)
+        return None
+
 def load_excel_secure(file) -> pd.DataFrame:
+    """页面读取上传文件（结果经 st.cache_data 缓存，命中计入 cache_hit）；无法解析时在页面上提示并返回 None"""
+    if file is None: return None
+    _cache_probe.hit = True
+    df = _load_excel_cached(file)
+    if _cache_probe.hit:
+        metrics.inc("smt_file_loads_total", path="cache_hit")
+    return df
+
+def read_table(file) -> pd.DataFrame:
+    """
+    解析上传文件 -> DataFrame（不调用 st.*，可在后台线程 / 工作进程中使用）。
+
+    Raises:
+        LoadError: pandas 读取与 xlwings 兜底均失败
+    """
     if file is None: return None
+    t0 = time.perf_counter()
     filename = file.name
     file_ext = os.path.splitext(filename)[1].lower()
     
@@ -103,48 +169,59 @@ def load_excel_secure(file) -> pd.DataFrame:
     pandas_error = None
 
     try:
-        if file_ext == '.csv':
-            df = pd.read_csv(abs_path, dtype=str, header=None, encoding='utf-8', engine='python')
-        elif file_ext == '.xlsx':
-            df = pd.read_excel(abs_path, dtype=str, engine='openpyxl', header=None)
-        elif file_ext == '.xls':
-            df = pd.read_excel(abs_path, dtype=str, engine='xlrd', header=None)
-        else:
-            df = pd.read_excel(abs_path, dtype=str, header=None)
+        with perf.stage("read_pandas"):
+            if file_ext in READ_ENGINES:
+                require(READ_ENGINES[file_ext], f"读取 {file_ext} 文件")
+            if file_ext == '.csv':
+                df = pd.read_csv(abs_path, dtype=str, header=None, encoding='utf-8', engine='python')
+            elif file_ext == '.xlsx':
+                df = pd.read_excel(abs_path, dtype=str, engine='openpyxl', header=None)
+            elif file_ext == '.xls':
+                df = pd.read_excel(abs_path, dtype=str, engine='xlrd', header=None)
+            else:
+                df = pd.read_excel(abs_path, dtype=str, header=None)
         try: os.remove(abs_path)
         except: pass
         if df is not None:
-            return _materialize_dataframe(df)
+            with perf.stage("header_detect"):
+                df = _materialize_dataframe(df)
+            _record_load("pandas", t0)
+            return df
     except Exception as e:
         pandas_error = e
         logging.warning(f"Pandas 读取失败: {e}")
 
+    try:
+        xw = require("xlwings", "Excel 兜底读取")
+    except MissingDependency as e_dep:
+        # 无 xlwings 时无法兜底：直接给出 pandas 侧的失败原因
+        try: os.remove(abs_path)
+        except: pass
+        _record_load("failed", t0)
+        raise _read_error(pandas_error, e_dep)
+
     app = None
     with EXCEL_LOCK:
         try:
-            app = xw.App(visible=False, add_book=False)
-            app.display_alerts = False; app.screen_updating = False
-            book = app.books.open(abs_path)
-            sheet = book.sheets[0]
-            raw_data = sheet.used_range.options(numbers=str).value
-            book.close()
+            with perf.stage("read_xlwings"):
+                app = xw.App(visible=False, add_book=False)
+                app.display_alerts = False; app.screen_updating = False
+                book = app.books.open(abs_path)
+                sheet = book.sheets[0]
+                raw_data = sheet.used_range.options(numbers=str).value
+                book.close()
             if raw_data and len(raw_data) > 0:
                 df = pd.DataFrame(raw_data)
-                df = _materialize_dataframe(df)
+                with perf.stage("header_detect"):
+                    df = _materialize_dataframe(df)
         except Exception as e_xw:
-            error_msg_xw = str(e_xw)
-            if "Microsoft Excel" in error_msg_xw or "not found" in error_msg_xw:
-                if pandas_error and "No module named" in str(pandas_error):
-                    st.error("❌ 环境缺失依赖库"); st.info("请在终端运行: `pip install openpyxl xlrd`")
-                else:
-                    st.error("❌ 文件解析失败")
-            else:
-                st.error("❌ 文件读取失败"); st.warning(f"详情: {e_xw}")
-            return None
+            _record_load("failed", t0)
+            raise _read_error(pandas_error, e_xw)
         finally:
             if app: 
                 try: app.quit()
                 except: pass
             try: os.remove(abs_path)
             except: pass
+    _record_load("fallback" if df is not None else "failed", t0)
     return df
\ No newline at end of file
@@ -0,0 +1,236 @@
+# src/exports.py
+"""
+机读导出（CSV / JSON Lines / Parquet），供 MES 与质量分析脚本读取。
+
+按结果集逐行（Parquet 按批）流式写出；写入的同时计算签名（见 utils.new_signer），不需要再读一遍文件：
+- CSV   : 首行 "# {元数据 JSON}"，末行 "# signature=<hex>"；签名覆盖末行之前的全部字节。
+          pandas 读取：pd.read_csv(f, skiprows=1, skipfooter=1, engine='python')
+- JSONL : 首行 {"_meta": {...}}，末行 {"_signature": "<hex>"}；签名覆盖末行之前的全部字节
+- Parquet: 元数据存于 schema 元数据 smt_meta，签名存于文件尾元数据 smt_signature，
+           覆盖文件尾（footer）之前的全部字节 + 规范化的 smt_meta 与列结构（见 _parquet_trailer）；
+           footer 中的工单信息与列名 / 类型被改动同样校验失败
+"""
+import csv
+import io
+import json
+import os
+import struct
+from datetime import datetime
+
+from config.settings import EXPORT_SIGNING_KEY
+from src import metrics
+from src.lazy import MissingDependency, available, require
+from src.utils import new_signer, temp_output
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', '.csv'),
+    'jsonl': ('application/x-ndjson', '.jsonl'),
+    'parquet': ('application/vnd.apache.parquet', '.parquet'),
+}
+
+# 结果列的固定顺序与类型；结果中出现的其它列追加在后（按字符串导出）
+EXPORT_COLUMNS = ["级别", "核对结果", "原始行号", "BOM料号", "差异说明", "站位号",
+                  "BOM数量", "实际数量", "BOM描述", "站位备注", "BOM位号明细", "实装位号明细"]
+INT_COLUMNS = {"BOM数量", "实际数量"}
+
+# 需要可选依赖的格式：格式 -> (模块, 功能说明)
+OPTIONAL_BACKENDS = {'parquet': ('pyarrow', "Parquet 导出")}
+
+PARQUET_BATCH_ROWS = 10000
+
+
+class _SigningSink(io.RawIOBase):
+    """写穿包装：转发到底层文件对象的同时更新签名；关闭时不关闭底层文件"""
+
+    def __init__(self, fh):
+        self._fh = fh
+        self._pos = 0
+        self.signer = new_signer()
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        b = bytes(b)
+        self.signer.update(b)
+        self._fh.write(b)
+        self._pos += len(b)
+        return len(b)
+
+    def tell(self):
+        return self._pos
+
+    def flush(self):
+        self._fh.flush()
+
+
+def _columns(results):
+    extra = {}
+    for r in results:
+        for k in r:
+            if k not in EXPORT_COLUMNS:
+                extra.setdefault(k, None)
+    return EXPORT_COLUMNS + list(extra)
+
+
+def _as_int(val):
+    try:
+        return int(val)
+    except (TypeError, ValueError):
+        return None
+
+
+def _header(results, meta, columns):
+    header = {
+        'format': 'smt-findings', 'version': 1,
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'signature_alg': 'hmac-sha256' if EXPORT_SIGNING_KEY else 'sha256',
+        'total': len(results), 'columns': columns,
+    }
+    header.update(meta)
+    return header
+
+
+def _write_csv(sink, results, header, columns):
+    text = io.TextIOWrapper(sink, encoding='utf-8', newline='', write_through=True)
+    text.write("# " + json.dumps(header, ensure_ascii=False, default=str) + "\n")
+    writer = csv.writer(text)
+    writer.writerow(columns)
+    for r in results:
+        writer.writerow(["" if r.get(c) is None else r.get(c) for c in columns])
+    text.flush()
+    signature = sink.signer.hexdigest()
+    text.write(f"# signature={signature}\n")
+    text.flush()
+    text.detach()
+    return signature
+
+
+def _write_jsonl(sink, results, header, columns):
+    sink.write((json.dumps({'_meta': header}, ensure_ascii=False, default=str) + "\n").encode('utf-8'))
+    for r in results:
+        row = {c: r.get(c) for c in columns}
+        sink.write((json.dumps(row, ensure_ascii=False, default=str) + "\n").encode('utf-8'))
+    signature = sink.signer.hexdigest()
+    sink.write((json.dumps({'_signature': signature}) + "\n").encode('utf-8'))
+    return signature
+
+
+def _parquet_trailer(meta_json, schema):
+    """Parquet 签名中 footer 部分的规范化表示：smt_meta（键排序）与各列 (名称, 类型)"""
+    payload = {'smt_meta': json.loads(meta_json), 'schema': [[f.name, str(f.type)] for f in schema]}
+    return json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str).encode('utf-8')
+
+
+def _write_parquet(sink, results, header, columns):
+    pa = require("pyarrow", "Parquet 导出")
+    pq = require("pyarrow.parquet", "Parquet 导出", "pyarrow")
+
+    schema = pa.schema(
+        [pa.field(c, pa.int64() if c in INT_COLUMNS else pa.string()) for c in columns],
+        metadata={'smt_meta': json.dumps(header, ensure_ascii=False, default=str)},
+    )
+    writer = pq.ParquetWriter(sink, schema, compression='zstd')
+    try:
+        for start in range(0, len(results), PARQUET_BATCH_ROWS):
+            batch = results[start:start + PARQUET_BATCH_ROWS]
+            data = {}
+            for c in columns:
+                vals = [r.get(c) for r in batch]
+                if c in INT_COLUMNS:
+                    data[c] = [_as_int(v) for v in vals]
+                else:
+                    data[c] = [None if v is None else str(v) for v in vals]
+            writer.write_table(pa.table(data, schema=schema))
+        # 行组均已写出：签名覆盖 footer 之前的全部字节，再加上 footer 中的元数据与列结构
+        signer = sink.signer.copy()
+        signer.update(_parquet_trailer(schema.metadata[b'smt_meta'], schema))
+        signature = signer.hexdigest()
+        writer.add_key_value_metadata({'smt_signature': signature})
+    finally:
+        writer.close()
+    return signature
+
+
+_WRITERS = {'csv': _write_csv, 'jsonl': _write_jsonl, 'parquet': _write_parquet}
+
+
+def missing_backend(fmt):
+    """该格式所需的可选依赖未安装时返回 MissingDependency（供界面禁用按钮并提示），否则返回 None"""
+    backend = OPTIONAL_BACKENDS.get(fmt)
+    if backend is None or available(backend[0]):
+        return None
+    return MissingDependency(backend[1], backend[0])
+
+
+def write_export(fmt, fh, results, meta):
+    """
+    将结果集按 fmt 流式写入二进制文件对象 fh。
+
+    Args:
+        fmt: 'csv' / 'jsonl' / 'parquet'
+        meta: 工单等元数据（model, wo_number, wo_qty, inspector, check_time ...），写入文件头
+
+    Returns:
+        str: 签名（hex）
+    """
+    if fmt not in _WRITERS:
+        raise ValueError(f"不支持的导出格式: {fmt}")
+    columns = _columns(results)
+    sink = _SigningSink(fh)
+    return _WRITERS[fmt](sink, results, _header(results, meta, columns), columns)
+
+
+def export_file(fmt, results, meta):
+    """生成导出文件，返回 (只读文件对象, signature)；内容在磁盘临时文件中，调用方负责关闭"""
+    suffix = EXPORT_FORMATS.get(fmt, ("", ""))[1]
+    fh, signature = temp_output(lambda out: write_export(fmt, out, results, meta), suffix=suffix)
+    metrics.observe("smt_export_bytes", os.fstat(fh.fileno()).st_size, format=fmt)
+    return fh, signature
+
+
+def build_export(fmt, results, meta):
+    """生成导出文件内容，返回 (bytes, signature)（小结果集 / 校验用；下发文件用 export_file）"""
+    fh, signature = export_file(fmt, results, meta)
+    with fh:
+        return fh.read(), signature
+
+
+def verify_export(data, fmt):
+    """
+    校验导出文件内容未被改动。
+
+    Returns:
+        bool: 签名与内容一致时为 True（需使用与导出时相同的 EXPORT_SIGNING_KEY）
+    """
+    if fmt == 'parquet':
+        if len(data) < 12 or data[-4:] != b'PAR1':
+            return False
+        footer_len = struct.unpack('<I', data[-8:-4])[0]
+        body = data[:len(data) - 8 - footer_len]
+        pq = require("pyarrow.parquet", "Parquet 校验", "pyarrow")
+        try:
+            kv = pq.read_metadata(io.BytesIO(data)).metadata or {}
+            schema = pq.read_schema(io.BytesIO(data))
+            meta_json = (schema.metadata or {}).get(b'smt_meta')
+            # 文件尾键值与 Arrow schema 中各存一份 smt_meta，两处须一致（读取端看到的就是签名覆盖的）
+            if meta_json is None or kv.get(b'smt_meta') != meta_json:
+                return False
+            body += _parquet_trailer(meta_json, schema)
+        except Exception:   # footer 损坏 / smt_meta 不是 JSON
+            return False
+        expected = kv.get(b'smt_signature', b'').decode()
+    else:
+        body, _, trailer = data.rstrip(b"\n").rpartition(b"\n")
+        body += b"\n"
+        trailer = trailer.decode('utf-8', 'replace')
+        if fmt == 'csv':
+            expected = trailer[len("# signature="):] if trailer.startswith("# signature=") else ""
+        else:
+            try:
+                expected = json.loads(trailer).get('_signature', '')
+            except ValueError:
+                return False
+    signer = new_signer()
+    signer.update(body)
+    return bool(expected) and signer.hexdigest() == expected
@@ -0,0 +1,256 @@
+# src/jobs.py
+"""
+后台任务：比对与报告导出在工作线程中执行，Streamlit 脚本线程只提交任务并轮询，结果在重跑（rerun）之间保留。
+
+    job_id = JOBS.submit("compare", fn, *args, owner="8088")   # fn(job, *args)
+    job = JOBS.get(job_id); job.state / job.fraction / job.message
+    JOBS.cancel(job_id); JOBS.result(job_id, timeout)
+
+- 状态：queued（等待工作线程或本机槽位）-> running -> done / failed / cancelled；
+  完成的任务保留 JOB_RESULT_TTL 秒，期间可按 ID 取结果
+- 进度与取消：任务函数通过 job.progress(fraction, message) 汇报进度；排队中的任务取消后立即结束，
+  运行中的任务在下一次 job.progress() / job.check() 时抛出 JobCancelled 退出
+- 并发：进程内最多 JOB_WORKERS 个任务同时执行；另有本机级槽位（临时目录下 JOB_HOST_SLOTS 个锁文件），
+  本机所有进程（多个 Streamlit 实例、HTTP 服务等）同时执行的任务合计不超过该数，一批大任务不会占满 CPU
+- 任务函数在工作线程中执行，不得调用 st.*
+"""
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from config.settings import JOB_HOST_SLOTS, JOB_RESULT_TTL, JOB_SLOT_DIR, JOB_WORKERS
+from src import metrics
+
+logger = logging.getLogger("smt.jobs")
+
+FINISHED = ("done", "failed", "cancelled")
+SLOT_POLL_SECONDS = 0.05
+
+
+class JobCancelled(Exception):
+    """任务已被取消（由 job.progress / job.check 抛出）"""
+
+
+class Job:
+    __slots__ = ("id", "kind", "owner", "state", "fraction", "message", "result", "error",
+                 "created_at", "started_at", "finished_at", "_cancel", "_done", "_future")
+
+    def __init__(self, kind, owner):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.owner = owner
+        self.state = "queued"
+        self.fraction = 0.0
+        self.message = ""
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._cancel = threading.Event()
+        self._done = threading.Event()
+        self._future = None
+
+    @property
+    def finished(self):
+        return self.state in FINISHED
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def check(self):
+        """已请求取消时抛出 JobCancelled"""
+        if self._cancel.is_set():
+            raise JobCancelled(self.id)
+
+    def progress(self, fraction, message=None):
+        """汇报进度（0~1），同时检查取消"""
+        self.check()
+        self.fraction = max(0.0, min(1.0, float(fraction)))
+        if message is not None:
+            self.message = message
+
+    def snapshot(self):
+        """状态摘要（不含结果），供轮询 / HTTP 接口返回"""
+        return {
+            "id": self.id, "kind": self.kind, "owner": self.owner, "state": self.state,
+            "progress": round(self.fraction, 3), "message": self.message,
+            "error": None if self.error is None else str(self.error),
+            "created_at": self.created_at, "started_at": self.started_at, "finished_at": self.finished_at,
+        }
+
+
+class _HostSlot:
+    """本机级并发槽位：对 slot_dir 下某个锁文件加非阻塞排他锁；进程退出时操作系统自动释放"""
+
+    def __init__(self, slot_dir, slots):
+        self.slot_dir = slot_dir
+        self.slots = max(1, slots)
+
+    @staticmethod
+    def _try_lock(fh):
+        try:
+            if os.name == "nt":
+                import msvcrt
+                msvcrt.locking(fh.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            return False
+
+    @staticmethod
+    def _unlock(fh):
+        try:
+            if os.name == "nt":
+                import msvcrt
+                fh.seek(0)
+                msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+        except OSError:
+            pass
+        fh.close()
+
+    def acquire(self, job):
+        """轮询各槽位直到取得一个（返回文件句柄）；等待期间任务被取消则抛出 JobCancelled"""
+        os.makedirs(self.slot_dir, exist_ok=True)
+        while True:
+            for i in range(self.slots):
+                fh = open(os.path.join(self.slot_dir, f"slot-{i}.lock"), "a+b")
+                if self._try_lock(fh):
+                    return fh
+                fh.close()
+            job.check()
+            time.sleep(SLOT_POLL_SECONDS)
+
+    release = _unlock
+
+
+class JobQueue:
+    """有界工作线程池 + 本机级槽位；任务按 ID 保存，完成后保留 ttl 秒"""
+
+    def __init__(self, workers, host_slots, slot_dir, ttl=JOB_RESULT_TTL, on_purge=None):
+        self.ttl = ttl
+        self._on_purge = on_purge      # on_purge(job)：已结束的任务被清除（过期或 discard）时释放其结果占用的资源
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="smt-job")
+        self._host = _HostSlot(slot_dir, host_slots)
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind, fn, *args, owner=None, **kwargs):
+        """提交任务，返回任务 ID；fn(job, *args, **kwargs) 的返回值即任务结果"""
+        job = Job(kind, owner)
+        with self._lock:
+            purged = self._purge()
+            self._jobs[job.id] = job
+        self._released(purged)
+        job._future = self._pool.submit(self._run, job, fn, args, kwargs)
+        return job.id
+
+    def _run(self, job, fn, args, kwargs):
+        slot = None
+        try:
+            job.check()
+            slot = self._host.acquire(job)
+            job.state, job.started_at = "running", time.time()
+            job.result = fn(job, *args, **kwargs)
+            job.fraction = 1.0
+            job.state = "done"
+        except JobCancelled:
+            job.state = "cancelled"
+        except Exception as e:
+            logger.exception("job %s (%s) failed", job.id, job.kind)
+            job.error, job.state = e, "failed"
+        finally:
+            if slot is not None:
+                self._host.release(slot)
+            job.finished_at = time.time()
+            job._done.set()
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """请求取消；排队中的任务立即结束。返回任务是否存在且尚未结束"""
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return False
+        job._cancel.set()
+        if job._future is not None and job._future.cancel():
+            job.state, job.finished_at = "cancelled", time.time()
+            job._done.set()
+        return True
+
+    def discard(self, job_id):
+        """删除已结束的任务（不等过期），返回是否删除；运行中的任务应先 cancel"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or not job.finished:
+                return False
+            del self._jobs[job_id]
+        self._released([job])
+        return True
+
+    def wait(self, job_id, timeout=None):
+        """等待任务结束（最多 timeout 秒），返回是否已结束"""
+        job = self.get(job_id)
+        return job is None or job._done.wait(timeout)
+
+    def result(self, job_id, timeout=None):
+        """
+        等待并取任务结果。
+
+        Raises:
+            KeyError: 任务不存在（或已过期）
+            TimeoutError: timeout 秒内未结束
+            JobCancelled: 任务已取消
+            Exception: 任务函数抛出的异常
+        """
+        job = self.get(job_id)
+        if job is None:
+            raise KeyError(job_id)
+        if not job._done.wait(timeout):
+            raise TimeoutError(job_id)
+        if job.state == "cancelled":
+            raise JobCancelled(job_id)
+        if job.state == "failed":
+            raise job.error
+        return job.result
+
+    def run(self, kind, fn, *args, owner=None, **kwargs):
+        """提交并等待结果（受同样的并发限制），用于本身已在后台线程中的调用方"""
+        return self.result(self.submit(kind, fn, *args, owner=owner, **kwargs))
+
+    def stats(self):
+        with self._lock:
+            states = [j.state for j in self._jobs.values()]
+        return {s: states.count(s) for s in ("queued", "running") + FINISHED}
+
+    def _purge(self):
+        """清除过期任务（调用方持有 _lock），返回被清除的任务"""
+        now = time.time()
+        purged = [j for j in self._jobs.values() if j.finished and now - j.finished_at > self.ttl]
+        for job in purged:
+            del self._jobs[job.id]
+        return purged
+
+    def _released(self, jobs):
+        if self._on_purge is None:
+            return
+        for job in jobs:
+            try:
+                self._on_purge(job)
+            except Exception:
+                logger.exception("job %s cleanup failed", job.id)
+
+
+JOBS = JobQueue(JOB_WORKERS, JOB_HOST_SLOTS, JOB_SLOT_DIR)
+metrics.sample("smt_jobs", JOBS.stats)
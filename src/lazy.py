@@ -0,0 +1,60 @@
+# src/lazy.py
+"""
+延迟导入：pandas / numpy / xlsxwriter 等重量级依赖在首次使用时才真正加载，首页（未上传文件）不为其付出启动时间；
+xlwings / pyarrow 等可选后端缺失时给出带安装提示的错误，而不是在启动时 ImportError。
+
+    pd = lazy_import("pandas")              # 首次访问 pd.xxx 时才执行 import
+    xw = require("xlwings", "Excel 兜底读取")  # 立即导入；未安装时抛出 MissingDependency
+
+导入耗时基准见 bench/import_time.py。
+"""
+import importlib
+import importlib.util
+import sys
+import types
+
+
+class MissingDependency(RuntimeError):
+    """可选依赖未安装；package 为需要 pip 安装的包名"""
+
+    def __init__(self, feature, package):
+        super().__init__(f"{feature}需要安装 {package}（pip install {package}）")
+        self.feature = feature
+        self.package = package
+
+
+class _LazyModule(types.ModuleType):
+    """
+    模块占位对象：首次访问属性时导入真实模块，并把其命名空间复制过来（之后的访问是普通属性查找）。
+
+    占位对象不登记到 sys.modules：Streamlit 首次输出元素时会经 inspect 遍历 sys.modules，
+    登记过的延迟模块（importlib.util.LazyLoader）会在首页渲染时被全部触发加载。
+    """
+
+    def __getattr__(self, attr):
+        module = importlib.import_module(self.__name__)
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attr)
+
+
+def lazy_import(name):
+    """返回模块占位对象，首次访问其属性时才导入（未安装时届时抛出 ImportError）；已导入时直接返回模块"""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    return _LazyModule(name)
+
+
+def available(name):
+    """可选依赖是否已安装（只查找模块，不执行导入）"""
+    if name in sys.modules:
+        return sys.modules[name] is not None
+    return importlib.util.find_spec(name) is not None
+
+
+def require(name, feature, package=None):
+    """导入可选依赖，未安装时抛出 MissingDependency(feature, package)"""
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        raise MissingDependency(feature, package or name) from None
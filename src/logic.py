@@ -1,22 +1,75 @@
-import pandas as pd
 import re
-from config.settings import SPLIT_PATTERN
+import json
+import hashlib
+import time
+from collections import Counter
+from config.settings import SPLIT_PATTERN, REF_TOKEN_PATTERN
+from src import metrics, perf
+from src.lazy import lazy_import
 from src.utils import (clean_text, parse_refs, parse_subs,
                        normalize_pn_value, normalize_ref_designator,
-                       check_spec_conflict)
+                       check_spec_conflict, parse_slot)
 
-def run_smt_comparison(df_bom, df_station, config, ignore_nc=False):
+pd = lazy_import("pandas")
+
+STATION_HEADER_TOKENS = {"安装号码", "元件名", "备注", "图样名", "总数", "VERSION", "安装号", "站位号"}
+
+
+def _join_ref_columns(row, ref_cols):
+    """合并多列位号（T/B 面分列），返回以空格拼接的原始字符串"""
+    ref_parts = []
+    # 兼容单列的情况（字符串）
+    cols = ref_cols if isinstance(ref_cols, list) else [ref_cols]
+    for ref_col in cols:
+        val = row[ref_col]
+        if pd.notna(val):
+            val_str = str(val).strip()
+            if val_str and val_str.upper() != 'NAN':  # 过滤空值和 NaN
+                ref_parts.append(val_str)
+    return " ".join(ref_parts)
+
+
+def _index_slot(slot_index, slot, pn, excel_row, state):
+    """
+    站位 -> 料号 索引，随站位表聚合同一遍完成:
+        slot_index[(segment, slot)] = {'slot', 'segment', 'key', 'pns', 'rows'}
+
+    纯数字站位（无机台/料台信息）只按显式的分段标记区分机台：多机台程序拼接导出时，各机台之间的重复表头行 /
+    版本行开始新的一段（见 _next_segment）。段内同一站位无论出现顺序如何都归入同一条目，冲突不会漏报。
+    """
+    key = parse_slot(slot)
+    numeric = key is not None and not key[0] and not key[1]
+    if numeric: state['seen'] = True
+    segment = state['segment'] if numeric else 0
+    entry = slot_index.get((segment, slot))
+    if entry is None:
+        entry = slot_index[(segment, slot)] = {'slot': slot, 'segment': segment, 'key': key, 'pns': [], 'rows': []}
+    if pn not in entry['pns']: entry['pns'].append(pn)
+    entry['rows'].append(str(excel_row))
+
+
+def _next_segment(state):
+    """遇到分段标记（表内重复表头行 / 版本行）：已有纯数字站位时开始新的一段，文件开头的标记不计"""
+    if state['seen']:
+        state['segment'] += 1
+        state['seen'] = False
+
+
+def aggregate_station(df_station, config):
+    """
+    聚合站位表 -> station_map[pn] = {'refs', 'slots', 'desc', 'rows'}，同时构建站位索引
+
+    Returns:
+        (station_map, slot_index, results, error_count)，results 为聚合阶段发现的数据错误记录
+    """
     results = []
     error_count = 0
-    
-    # 1. 聚合站位表
     station_map = {}
+    slot_index = {}
+    segment_state = {'segment': 1, 'seen': False}
     c_s_pn, c_s_ref, c_s_slot = config['st_pn'], config['st_ref'], config['st_slot']
     c_s_desc = config.get('st_desc')
 
-    # 站位表内部表头/说明行关键字，需在聚合时忽略
-    STATION_HEADER_TOKENS = {"安装号码", "元件名", "备注", "图样名", "总数", "VERSION", "安装号", "站位号"}
-
     for idx, row in df_station.iterrows():
         excel_row = idx + 2
         raw_pn = row[c_s_pn]
@@ -31,33 +84,14 @@ def run_smt_comparison(df_bom, df_station, config, ignore_nc=False):
             or "VERSION" in upper_vals
             or STATION_HEADER_TOKENS & set(row_str_vals)
         ):
+            _next_segment(segment_state)
             continue
         # 合并位置号1（T面）和位置号2（B面）
         # 站位表可能有两种格式：
         # 1. 分两行：T面行（位置号1有值，位置号2为空）和B面行（位置号1为空，位置号2有值）
         # 2. 合并一行：位置号1和位置号2分别填入对应面的位号
         # 3. 多列位号：可能有多个位号列（如 T面位号、B面位号），需要拼接
-        
-        # 处理多列位号：遍历 c_s_ref（现在是列表），拼接各列的值
-        ref_parts = []
-        if isinstance(c_s_ref, list):
-            for ref_col in c_s_ref:
-                val = row[ref_col]
-                if pd.notna(val):
-                    val_str = str(val).strip()
-                    if val_str and val_str.upper() != 'NAN':  # 过滤空值和 NaN
-                        ref_parts.append(val_str)
-        else:
-            # 兼容单列的情况（字符串）
-            val = row[c_s_ref]
-            if pd.notna(val):
-                val_str = str(val).strip()
-                if val_str and val_str.upper() != 'NAN':
-                    ref_parts.append(val_str)
-        
-        # 将多列位号拼接成一个字符串，用空格分隔
-        combined_ref = " ".join(ref_parts)
-        refs = parse_refs(combined_ref, SPLIT_PATTERN)
+        refs = parse_refs(_join_ref_columns(row, c_s_ref), SPLIT_PATTERN)
         st_desc_val = str(row[c_s_desc]).strip() if c_s_desc and pd.notna(row[c_s_desc]) else ""
 
         if not pn and refs:
@@ -75,9 +109,21 @@ def run_smt_comparison(df_bom, df_station, config, ignore_nc=False):
         station_map[pn]['refs'].update(refs)
         station_map[pn]['rows'].append(str(excel_row))
         if slot and slot not in station_map[pn]['slots']: station_map[pn]['slots'].append(slot)
+        if slot: _index_slot(slot_index, slot, pn, excel_row, segment_state)
         if st_desc_val and not station_map[pn]['desc']: station_map[pn]['desc'] = st_desc_val
 
-    # 2. 聚合 BOM
+    return station_map, slot_index, results, error_count
+
+
+def aggregate_bom(df_bom, config):
+    """
+    聚合 BOM -> bom_aggregated[pn] = {'refs', 'subs', 'desc', 'rows'}
+
+    Returns:
+        (bom_aggregated, results, error_count)
+    """
+    results = []
+    error_count = 0
     bom_aggregated = {}
     c_b_pn, c_b_ref = config['bom_pn'], config['bom_ref']
     c_b_sub, c_b_desc = config['bom_sub'], config['bom_desc']
@@ -88,30 +134,8 @@ def run_smt_comparison(df_bom, df_station, config, ignore_nc=False):
         # 合并位置号1（T面）和位置号2（B面）
         # 同一物料可能分两行：T面（位置号1有值，位置号2为空）和B面（位置号1为空，位置号2有值）
         # 或者有多个位号列（如 T面位号、B面位号），需要拼接
-        
-        # 处理多列位号：遍历 c_b_ref（现在是列表），拼接各列的值
-        ref_parts = []
-        if isinstance(c_b_ref, list):
-            for ref_col in c_b_ref:
-                val = row[ref_col]
-                if pd.notna(val):
-                    val_str = str(val).strip()
-                    if val_str and val_str.upper() != 'NAN':  # 过滤空值和 NaN
-                        ref_parts.append(val_str)
-        else:
-            # 兼容单列的情况（字符串）
-            val = row[c_b_ref]
-            if pd.notna(val):
-                val_str = str(val).strip()
-                if val_str and val_str.upper() != 'NAN':
-                    ref_parts.append(val_str)
-        
-        # 将多列位号拼接成一个字符串，用空格分隔
-        combined_ref = " ".join(ref_parts)
-        bom_refs = parse_refs(combined_ref, SPLIT_PATTERN)
-        
-        if ignore_nc and not bom_refs: pass
-        
+        bom_refs = parse_refs(_join_ref_columns(row, c_b_ref), SPLIT_PATTERN)
+
         if not bom_pn and bom_refs:
             error_count += 1
             results.append({
@@ -131,117 +155,538 @@ def run_smt_comparison(df_bom, df_station, config, ignore_nc=False):
         bom_aggregated[bom_pn]['rows'].append(str(excel_row))
         if c_b_sub: bom_aggregated[bom_pn]['subs'].update(parse_subs(row[c_b_sub], SPLIT_PATTERN))
 
-    # 3. 正向比对
-    claimed_st_pns = set()
-    for bom_pn, bom_data in bom_aggregated.items():
-        bom_refs = bom_data['refs']
-        bom_desc = bom_data['desc']
-        bom_subs = list(bom_data['subs'])
-        row_str = ",".join(bom_data['rows'][:3]) + ("..." if len(bom_data['rows'])>3 else "")
-        
-        if not bom_refs:
-            if ignore_nc:
-                results.append({
-                    "级别": "⚪ 忽略", "核对结果": "NC/跳过", "原始行号": f"BOM: {row_str}",
-                    "BOM料号": bom_pn, "差异说明": "ℹ️ NC", "站位号": "", "BOM数量": 0, "实际数量": 0,
-                    "BOM描述": bom_desc, "站位备注": ""
-                })
+    return bom_aggregated, results, error_count
+
+
+def _compare_bom_item(bom_pn, bom_data, station_map, ignore_nc):
+    """
+    单个 BOM 料号的正向比对。
+
+    Returns:
+        (result, is_error, matched_pns)
+    """
+    bom_refs = bom_data['refs']
+    bom_desc = bom_data['desc']
+    bom_subs = list(bom_data['subs'])
+    row_str = ",".join(bom_data['rows'][:3]) + ("..." if len(bom_data['rows'])>3 else "")
+    
+    if not bom_refs:
+        if ignore_nc:
+            return {
+                "级别": "⚪ 忽略", "核对结果": "NC/跳过", "原始行号": f"BOM: {row_str}",
+                "BOM料号": bom_pn, "差异说明": "ℹ️ NC", "站位号": "", "BOM数量": 0, "实际数量": 0,
+                "BOM描述": bom_desc, "站位备注": ""
+            }, False, []
+        return {
+            "级别": "🟠 警告", "核对结果": "位号为空", "原始行号": f"BOM: {row_str}",
+            "BOM料号": bom_pn, "差异说明": "⚠️ 位号为空", "站位号": "", "BOM数量": 0, "实际数量": 0,
+            "BOM描述": bom_desc, "站位备注": ""
+        }, True, []
+    
+    targets = [bom_pn] + bom_subs
+    found_refs = set()
+    found_slots = []
+    matched_pns = []
+    found_st_descs = []
+
+    for target in targets:
+        if target in station_map:
+            matched_pns.append(target)
+            found_refs.update(station_map[target]['refs'])
+            found_slots.extend(station_map[target]['slots'])
+            found_st_descs.append(station_map[target]['desc'])
+
+    slots_str = ",".join(sorted(list(set(found_slots))))
+    st_desc_str = " | ".join([d for d in set(found_st_descs) if d])
+
+    norm_bom = {normalize_ref_designator(r): r for r in bom_refs}
+    norm_found = {normalize_ref_designator(r): r for r in found_refs}
+    set_bom = set(norm_bom.keys())
+    set_found = set(norm_found.keys())
+
+    # 准备直观展示的位号明细（未经归一化，用于 UI 预览）
+    bom_refs_display = ",".join(sorted(list(bom_refs))) if bom_refs else ""
+    found_refs_display = ",".join(sorted(list(found_refs))) if found_refs else ""
+
+    is_error = False
+    if not matched_pns:
+        level = "🔴 严重"
+        status = "缺料"
+        detail = "❌ 站位表中未找到主料或替代料"
+        is_error = True
+    else:
+        missing = set_bom - set_found
+        extra = set_found - set_bom
+        if not missing and not extra:
+            is_conf, conf_msg = check_spec_conflict(bom_desc, st_desc_str)
+            if is_conf:
+                level, status, detail = "🟠 警告", "规格预警", f"⚠️ {conf_msg}"
+                is_error = True
             else:
-                error_count += 1
-                results.append({
-                    "级别": "🟠 警告", "核对结果": "位号为空", "原始行号": f"BOM: {row_str}",
-                    "BOM料号": bom_pn, "差异说明": "⚠️ 位号为空", "站位号": "", "BOM数量": 0, "实际数量": 0,
-                    "BOM描述": bom_desc, "站位备注": ""
-                })
-            continue 
-        
-        targets = [bom_pn] + bom_subs
-        found_refs = set()
-        found_slots = []
-        matched_pns = []
-        found_st_descs = []
-
-        for target in targets:
-            if target in station_map:
-                matched_pns.append(target)
-                found_refs.update(station_map[target]['refs'])
-                found_slots.extend(station_map[target]['slots'])
-                found_st_descs.append(station_map[target]['desc'])
-                claimed_st_pns.add(target)
-
-        slots_str = ",".join(sorted(list(set(found_slots))))
-        st_desc_str = " | ".join([d for d in set(found_st_descs) if d])
-
-        norm_bom = {normalize_ref_designator(r): r for r in bom_refs}
-        norm_found = {normalize_ref_designator(r): r for r in found_refs}
-        set_bom = set(norm_bom.keys())
-        set_found = set(norm_found.keys())
-
-        # 准备直观展示的位号明细（未经归一化，用于 UI 预览）
-        bom_refs_display = ",".join(sorted(list(bom_refs))) if bom_refs else ""
-        found_refs_display = ",".join(sorted(list(found_refs))) if found_refs else ""
-
-        if not matched_pns:
-            level = "🔴 严重"
-            status = "缺料"
-            detail = "❌ 站位表中未找到主料或替代料"
-            error_count += 1
+                level, status, detail = "🟢 正常", "通过", "匹配成功"
+            if bom_pn not in matched_pns: detail += " (使用替代料)"
         else:
-            missing = set_bom - set_found
-            extra = set_found - set_bom
-            if not missing and not extra:
-                is_conf, conf_msg = check_spec_conflict(bom_desc, st_desc_str)
-                if is_conf:
-                    level, status, detail = "🟠 警告", "规格预警", f"⚠️ {conf_msg}"
-                    error_count += 1
-                else:
-                    level, status, detail = "🟢 正常", "通过", "匹配成功"
-                if bom_pn not in matched_pns: detail += " (使用替代料)"
-            else:
-                level, status = "🟠 警告", "位号不符"
-                msgs = []
-                if missing: msgs.append(f"漏贴({len(missing)}): {','.join([norm_bom[k] for k in missing])}")
-                if extra: msgs.append(f"多贴({len(extra)}): {','.join([norm_found[k] for k in extra])}")
-                detail = " | ".join(msgs)
-                error_count += 1
+            level, status = "🟠 警告", "位号不符"
+            msgs = []
+            if missing: msgs.append(f"漏贴({len(missing)}): {','.join([norm_bom[k] for k in missing])}")
+            if extra: msgs.append(f"多贴({len(extra)}): {','.join([norm_found[k] for k in extra])}")
+            detail = " | ".join(msgs)
+            is_error = True
+
+    return {
+        "级别": level,
+        "核对结果": status,
+        "原始行号": f"BOM: {row_str}",
+        "BOM料号": bom_pn,
+        "BOM描述": bom_desc,
+        "站位备注": st_desc_str,
+        "差异说明": detail,
+        "站位号": slots_str,
+        "BOM数量": len(bom_refs),
+        "实际数量": len(found_refs),
+        # 新增两列：用于在结果预览中直观对比 BOM vs Station 位号
+        "BOM位号明细": bom_refs_display,
+        "实装位号明细": found_refs_display,
+    }, is_error, matched_pns
+
+
+def _extra_part_result(extra_pn, st_data):
+    """反向检测：站位表中 BOM 未声明的物料"""
+    row_str = ",".join(st_data['rows'][:3])
+    return {
+        "级别": "🔴 严重",
+        "核对结果": "错料/多余",
+        "原始行号": f"Station: {row_str}...",
+        "BOM料号": "N/A",
+        "BOM描述": "",
+        "站位备注": st_data['desc'],
+        "差异说明": f"❌ 非法物料: {extra_pn}",
+        "站位号": ",".join(set(st_data['slots'])),
+        "BOM数量": 0,
+        "实际数量": len(st_data['refs']),
+        "BOM位号明细": "",
+        "实装位号明细": ",".join(sorted(list(st_data['refs']))),
+    }
+
+
+def _is_error_result(result):
+    return result["级别"] in ("🔴 严重", "🟠 警告")
+
+
+def _ref_counts(df, cols):
+    """
+    各行位号个数（去重），与 aggregate_* 中 _join_ref_columns + parse_refs 的口径一致：
+    多列以空格拼接、跳过 "NaN" 文本、大写并去隐形字符后按分隔符切分，同一行重复的位号只计一次
+    """
+    combined = None
+    for col in cols:
+        part = df[col].fillna("").astype(str).str.strip()
+        part = part.where(part.str.upper() != "NAN", "")
+        combined = part if combined is None else combined + " " + part
+    text = combined.str.upper().str.replace("\t", "", regex=False).str.replace("\u200b", "", regex=False)
+    # extractall 一次取出全部位号（行, 序号）为索引，按行去重计数；无位号的行不出现，补 0
+    tokens = text.str.extractall(f"({REF_TOKEN_PATTERN})")[0]
+    counts = tokens.groupby(level=0).nunique()
+    return counts.reindex(df.index, fill_value=0).astype(int)
+
+
+def check_quantities(df, qty_col, ref_cols, source, pn_col=None):
+    """
+    [可选] 声明数量列 vs 位号个数 交叉校验（整列向量化运算，不逐行解析）
 
+    Args:
+        qty_col: 数量列名，为空时跳过
+        ref_cols: 位号列（单列或多列，如站位表 T/B 面两列对应同一个"总数"）
+        source: "BOM" / "Station"，用于原始行号展示
+        pn_col: 料号列名，用于在结论中标明料号
+    """
+    if not qty_col or df is None or df.empty:
+        return []
+    cols = ref_cols if isinstance(ref_cols, list) else [ref_cols]
+    cols = [c for c in cols if c]
+    if not cols:
+        return []
+
+    ref_count = _ref_counts(df, cols)
+    declared = pd.to_numeric(df[qty_col].astype(str).str.strip(), errors="coerce")
+
+    # 无位号的行（NC / PCB / 虚拟件）由正向比对处理，这里只校验有位号的行
+    mismatch = declared.notna() & (ref_count > 0) & (declared != ref_count)
+    if not mismatch.any():
+        return []
+
+    pns = df.loc[mismatch, pn_col] if pn_col else [None] * int(mismatch.sum())
+    results = []
+    for idx, qty, cnt, raw_pn in zip(df.index[mismatch], declared[mismatch], ref_count[mismatch], pns):
+        qty_value = int(qty) if float(qty).is_integer() else float(qty)
         results.append({
-            "级别": level,
-            "核对结果": status,
-            "原始行号": f"BOM: {row_str}",
-            "BOM料号": bom_pn,
-            "BOM描述": bom_desc,
-            "站位备注": st_desc_str,
-            "差异说明": detail,
-            "站位号": slots_str,
-            "BOM数量": len(bom_refs),
-            "实际数量": len(found_refs),
-            # 新增两列：用于在结果预览中直观对比 BOM vs Station 位号
-            "BOM位号明细": bom_refs_display,
-            "实装位号明细": found_refs_display,
+            "级别": "🟠 警告", "核对结果": "数量不符", "原始行号": f"{source}: {idx + 2}",
+            "BOM料号": normalize_pn_value(raw_pn) or "N/A", "BOM描述": "", "站位备注": "",
+            "差异说明": f"⚠️ 声明数量 {qty_value} ≠ 位号数 {cnt}",
+            "站位号": "", "BOM数量": qty_value, "实际数量": int(cnt),
         })
+    return results
 
-    # 4. 反向检测
-    for extra_pn in (set(station_map.keys()) - claimed_st_pns):
-        st_data = station_map[extra_pn]
-        row_str = ",".join(st_data['rows'][:3])
-        error_count += 1
-        results.append({
-            "级别": "🔴 严重",
-            "核对结果": "错料/多余",
-            "原始行号": f"Station: {row_str}...",
-            "BOM料号": "N/A",
-            "BOM描述": "",
-            "站位备注": st_data['desc'],
-            "差异说明": f"❌ 非法物料: {extra_pn}",
-            "站位号": ",".join(set(st_data['slots'])),
-            "BOM数量": 0,
-            "实际数量": len(st_data['refs']),
-            "BOM位号明细": "",
-            "实装位号明细": ",".join(sorted(list(st_data['refs']))),
-        })
 
-    return results, error_count, len(bom_aggregated)
+# 单侧预处理只依赖该侧表格与以下映射键，可在另一侧尚未就绪时提前计算
+BOM_CONFIG_KEYS = ('bom_pn', 'bom_ref', 'bom_sub', 'bom_desc', 'bom_qty')
+STATION_CONFIG_KEYS = ('st_pn', 'st_ref', 'st_slot', 'st_desc', 'st_qty')
+
+
+def prepare_bom(df_bom, config):
+    """
+    BOM 侧预处理：聚合 + 数量列校验。结果只读，可在多次比对间复用。
+
+    Returns:
+        dict: {'bom_map', 'errors', 'error_count', 'qty'}
+    """
+    bom_map, errors, error_count = aggregate_bom(df_bom, config)
+    return {'bom_map': bom_map, 'errors': errors, 'error_count': error_count,
+            'qty': check_quantities(df_bom, config.get('bom_qty'), config['bom_ref'], "BOM", config['bom_pn'])}
+
+
+def prepare_station(df_station, config):
+    """
+    站位表侧预处理：聚合 + 站位索引 + 数量列校验。结果只读，可在多次比对间复用。
+
+    Returns:
+        dict: {'station_map', 'slot_index', 'errors', 'error_count', 'qty'}
+    """
+    station_map, slot_index, errors, error_count = aggregate_station(df_station, config)
+    return {'station_map': station_map, 'slot_index': slot_index, 'errors': errors, 'error_count': error_count,
+            'qty': check_quantities(df_station, config.get('st_qty'), config['st_ref'], "Station",
+                                   config['st_pn'])}
+
+
+def _prepared_sides(df_bom, df_station, config, prepared):
+    """取预先计算好的两侧结果（见 src/speculative.py），缺失的一侧当场计算"""
+    prepared = prepared or {}
+    st_side, bom_side = prepared.get('station'), prepared.get('bom')
+    if st_side is None:
+        with perf.stage("aggregate_station"):
+            st_side = prepare_station(df_station, config)
+    if bom_side is None:
+        with perf.stage("aggregate_bom"):
+            bom_side = prepare_bom(df_bom, config)
+    return st_side, bom_side
+
+
+def _slot_findings(slot_index, bom_aggregated):
+    """站位冲突（同一站位多个料号）与站位格式异常检查"""
+    # 料号 -> 所属 BOM 主料，用于识别同站位的主料/替代料（仅预警，不判严重）
+    owner = {}
+    for bom_pn, bom_data in bom_aggregated.items():
+        for target in {bom_pn} | bom_data['subs']:
+            owner.setdefault(target, bom_pn)
+
+    results = []
+    for entry in slot_index.values():
+        slot, pns, rows = entry['slot'], entry['pns'], entry['rows']
+        slot_label = slot if entry['segment'] <= 1 else f"{slot}(第{entry['segment']}段)"
+        row_str = ",".join(rows[:3]) + ("..." if len(rows) > 3 else "")
+        if len(pns) > 1:
+            owners = {owner.get(pn, pn) for pn in pns}
+            level = "🟠 警告" if len(owners) == 1 else "🔴 严重"
+            results.append({
+                "级别": level, "核对结果": "站位冲突", "原始行号": f"Station: {row_str}",
+                "BOM料号": "N/A", "BOM描述": "", "站位备注": "",
+                "差异说明": f"❌ 站位 {slot_label} 装载多个料号: {','.join(pns)}",
+                "站位号": slot, "BOM数量": 0, "实际数量": len(pns),
+            })
+        if entry['key'] is None:
+            results.append({
+                "级别": "🟠 警告", "核对结果": "站位格式异常", "原始行号": f"Station: {row_str}",
+                "BOM料号": "N/A", "BOM描述": "", "站位备注": "",
+                "差异说明": f"⚠️ 站位号格式无法识别: {slot}",
+                "站位号": slot, "BOM数量": 0, "实际数量": 0,
+            })
+    return results
+
+
+def run_smt_comparison(df_bom, df_station, config, ignore_nc=False):
+    results, error_count, total, _ = run_full_comparison(df_bom, df_station, config, ignore_nc)
+    return results, error_count, total
+
+
+def _record_comparison(mode, t0, results):
+    """比对耗时与各级别结论数计入运行指标（级别去掉图标，如 "严重"）"""
+    if not metrics.enabled():
+        return
+    metrics.observe("smt_compare_seconds", time.perf_counter() - t0, mode=mode)
+    for level, n in Counter(r.get("级别") for r in results).items():
+        metrics.inc("smt_findings_total", n, level=str(level).split()[-1])
+
+
+def run_full_comparison(df_bom, df_station, config, ignore_nc=False, prepared=None, progress=None):
+    """
+    完整比对，同时返回可供下一次换线增量核对使用的基线。
+
+    Args:
+        prepared: 预先算好的单侧结果 {'bom': prepare_bom(...), 'station': prepare_station(...)}（可选，
+                  须与 config 对应）；提供时比对只剩匹配与检查
+        progress: 进度回调 progress(fraction)，正向比对期间约每 5% 调用一次（可在回调中抛出异常中止比对）
+
+    Returns:
+        (results, error_count, total, baseline)
+    """
+    t0 = time.perf_counter()
+    # 1/2. 聚合站位表与 BOM（已预先计算的一侧直接沿用）
+    st_side, bom_side = _prepared_sides(df_bom, df_station, config, prepared)
+    station_map, slot_index = st_side['station_map'], st_side['slot_index']
+    bom_aggregated = bom_side['bom_map']
+    results = st_side['errors'] + bom_side['errors']
+    error_count = st_side['error_count'] + bom_side['error_count']
+
+    # 3. 正向比对
+    with perf.stage("match"):
+        claimed_st_pns = set()
+        step = max(1, len(bom_aggregated) // 20)
+        for i, (bom_pn, bom_data) in enumerate(bom_aggregated.items()):
+            if progress is not None and i % step == 0:
+                progress(i / len(bom_aggregated))
+            result, is_error, matched_pns = _compare_bom_item(bom_pn, bom_data, station_map, ignore_nc)
+            claimed_st_pns.update(matched_pns)
+            if is_error: error_count += 1
+            results.append(result)
+
+        # 4. 反向检测
+        for extra_pn in (set(station_map.keys()) - claimed_st_pns):
+            error_count += 1
+            results.append(_extra_part_result(extra_pn, station_map[extra_pn]))
+
+    with perf.stage("checks"):
+        # 5. 站位冲突 / 格式检查
+        slot_results = _slot_findings(slot_index, bom_aggregated)
+        error_count += len(slot_results)
+        results.extend(slot_results)
+
+        # 6. 数量列交叉校验（可选）
+        qty_results = bom_side['qty'] + st_side['qty']
+        error_count += len(qty_results)
+        results.extend(qty_results)
+
+    baseline = {'station_map': station_map, 'bom_map': bom_aggregated, 'results': results,
+                'ignore_nc': ignore_nc, 'slot_index': slot_index}
+    _record_comparison("full", t0, results)
+    return results, error_count, len(bom_aggregated), baseline
+
+
+# --- 换线增量核对：上一版已核对站位表 vs 新版站位表 ---
+
+def diff_station_programs(prev_map, new_map):
+    """
+    按 料号 + 站位 对两版站位表聚合结果做键控差异。
+
+    Returns:
+        dict: {
+            'added':        [pn, ...],   # 新增上料
+            'removed':      [pn, ...],   # 已下料
+            'moved':        [pn, ...],   # 站位变动
+            'refs_changed': [pn, ...],   # 位号集合变动
+            'desc_changed': [pn, ...],   # 备注/规格变动（影响规格预警）
+            'changed_pns':  set,         # 以上全部，需重新核对
+            'rows':         [dict, ...], # 供 UI/报告展示的变更明细
+        }
+    """
+    prev_pns, new_pns = set(prev_map), set(new_map)
+    diff = {'added': sorted(new_pns - prev_pns), 'removed': sorted(prev_pns - new_pns),
+            'moved': [], 'refs_changed': [], 'desc_changed': []}
+    rows = []
+
+    for pn in diff['added']:
+        rows.append({"变更类型": "新增", "料号": pn, "原站位": "",
+                     "新站位": ",".join(new_map[pn]['slots']), "位号变更": ",".join(sorted(new_map[pn]['refs']))})
+    for pn in diff['removed']:
+        rows.append({"变更类型": "下料", "料号": pn, "原站位": ",".join(prev_map[pn]['slots']),
+                     "新站位": "", "位号变更": ",".join(sorted(prev_map[pn]['refs']))})
+
+    for pn in sorted(prev_pns & new_pns):
+        old, new = prev_map[pn], new_map[pn]
+        moved = set(old['slots']) != set(new['slots'])
+        refs_changed = old['refs'] != new['refs']
+        if moved: diff['moved'].append(pn)
+        if refs_changed: diff['refs_changed'].append(pn)
+        if old['desc'] != new['desc']: diff['desc_changed'].append(pn)
+        if moved or refs_changed:
+            ref_msgs = []
+            if refs_changed:
+                added_refs, removed_refs = new['refs'] - old['refs'], old['refs'] - new['refs']
+                if added_refs: ref_msgs.append(f"+{','.join(sorted(added_refs))}")
+                if removed_refs: ref_msgs.append(f"-{','.join(sorted(removed_refs))}")
+            rows.append({"变更类型": "移位" if moved else "位号变更", "料号": pn,
+                         "原站位": ",".join(old['slots']), "新站位": ",".join(new['slots']),
+                         "位号变更": " | ".join(ref_msgs)})
+
+    diff['changed_pns'] = set().union(diff['added'], diff['removed'], diff['moved'],
+                                      diff['refs_changed'], diff['desc_changed'])
+    diff['rows'] = rows
+    return diff
+
+
+def _same_bom_item(old, new):
+    return old is not None and old['refs'] == new['refs'] and old['subs'] == new['subs'] and old['desc'] == new['desc']
+
+
+def _relocate_forward(prev_result, bom_data, station_map, matched_pns):
+    """
+    沿用上一版的正向结论，但行号 / 站位按本次的 BOM 与站位表重建：
+    料号集合未变时其所在行与站位仍可能随其他行的增删而移动，报告须指向新版程序中的位置。
+    """
+    rows = bom_data['rows']
+    slots = {s for pn in matched_pns for s in station_map[pn]['slots']}
+    return dict(prev_result,
+                **{"原始行号": "BOM: " + ",".join(rows[:3]) + ("..." if len(rows) > 3 else ""),
+                   "站位号": ",".join(sorted(slots))})
+
+
+def run_changeover_comparison(df_bom, df_station, config, baseline, ignore_nc=False, prepared=None):
+    """
+    换线增量核对：仅对变动的料号重新比对，未变动的沿用上一版已核对结论。
+
+    节省的只是正向匹配阶段：新版站位表仍完整聚合（可由推测执行预先完成），两版差异按料号遍历整个聚合结果，
+    站位 / 数量检查也照常全量执行，整体开销仍与板子规模线性相关，只是常数更小。
+
+    Args:
+        baseline: 上一次完整核对留下的基线 {'station_map', 'bom_map', 'results', 'ignore_nc'}
+        prepared: 预先算好的单侧结果（可选），同 run_full_comparison
+
+    Returns:
+        (results, error_count, total, changeover)
+        changeover = {'diff': 站位表差异, 'reverified': 本次重新核对的结果行下标集合, 'baseline': 新基线}
+    """
+    t0 = time.perf_counter()
+    st_side, bom_side = _prepared_sides(df_bom, df_station, config, prepared)
+    station_map, slot_index = st_side['station_map'], st_side['slot_index']
+    bom_aggregated = bom_side['bom_map']
+    results = st_side['errors'] + bom_side['errors']
+    error_count = st_side['error_count'] + bom_side['error_count']
+
+    with perf.stage("diff"):
+        diff = diff_station_programs(baseline['station_map'], station_map)
+    changed_pns = diff['changed_pns']
+    prev_bom = baseline['bom_map']
+    reuse = baseline.get('ignore_nc') == ignore_nc
+
+    # 上一版结论按键索引：正向记录按 BOM料号，反向记录按非法物料料号
+    prev_forward = {}
+    prev_extra = {}
+    for r in baseline['results']:
+        if r["核对结果"] == "错料/多余":
+            prev_extra[r["差异说明"].replace("❌ 非法物料: ", "")] = r
+        elif (r["原始行号"].startswith("BOM:") and r["BOM料号"] not in ("MISSING", "N/A")
+              and r["核对结果"] != "数量不符"):
+            prev_forward[r["BOM料号"]] = r
+
+    with perf.stage("match"):
+        reverified = set()
+        claimed_st_pns = set()
+        for bom_pn, bom_data in bom_aggregated.items():
+            targets = {bom_pn} | bom_data['subs']
+            prev_result = prev_forward.get(bom_pn)
+            if (reuse and prev_result is not None and not (targets & changed_pns)
+                    and _same_bom_item(prev_bom.get(bom_pn), bom_data)):
+                matched = targets & station_map.keys()
+                result = _relocate_forward(prev_result, bom_data, station_map, matched)
+                claimed_st_pns.update(matched)
+            else:
+                result, _, matched_pns = _compare_bom_item(bom_pn, bom_data, station_map, ignore_nc)
+                claimed_st_pns.update(matched_pns)
+                reverified.add(len(results))
+            if _is_error_result(result): error_count += 1
+            results.append(result)
+
+        for extra_pn in (set(station_map.keys()) - claimed_st_pns):
+            error_count += 1
+            # 多余物料结论只取决于新版站位表中该料号的聚合结果，直接生成（行号 / 站位随之更新）；
+            # 上一版已有且未变动的不计入"重新核对"
+            if extra_pn not in prev_extra or extra_pn in changed_pns:
+                reverified.add(len(results))
+            results.append(_extra_part_result(extra_pn, station_map[extra_pn]))
+
+    with perf.stage("checks"):
+        # 站位索引随聚合已重建，检查开销与站位数线性相关
+        slot_results = _slot_findings(slot_index, bom_aggregated)
+        error_count += len(slot_results)
+        results.extend(slot_results)
+
+        qty_results = bom_side['qty'] + st_side['qty']
+        error_count += len(qty_results)
+        results.extend(qty_results)
+
+    baseline = {'station_map': station_map, 'bom_map': bom_aggregated, 'results': results,
+                'ignore_nc': ignore_nc, 'slot_index': slot_index}
+    changeover = {'diff': diff, 'reverified': reverified, 'baseline': baseline}
+    _record_comparison("changeover", t0, results)
+    return results, error_count, len(bom_aggregated), changeover
+
+
+# --- 审核基线快照与回归对比 ---
+
+def finding_key(result):
+    """结果行的稳定键：同一机种不同批次间用于对齐同一条核对记录"""
+    status = result["核对结果"]
+    if status == "错料/多余":
+        return f"EXTRA|{result['差异说明'].replace('❌ 非法物料: ', '')}"
+    if status in ("站位冲突", "站位格式异常"):
+        return f"{status}|{result['站位号']}"
+    if status == "数量不符":   # 同一料号可能有多行数量不符，按行区分
+        return f"{status}|{result['原始行号']}"
+    if result["原始行号"].startswith("BOM:") and result["BOM料号"] not in ("MISSING", "N/A"):
+        return f"BOM|{result['BOM料号']}"
+    return f"{status}|{result['原始行号']}"
+
+
+_HASH_FIELDS = ("级别", "核对结果", "差异说明", "站位号", "BOM数量", "实际数量")
+
+def _hash_value(v):
+    """数值按值归一：结果存储列式化时同列混有小数会把 2 升为 2.0，两者应得到同一哈希"""
+    if isinstance(v, float) and v.is_integer():
+        return int(v)
+    return v
+
+
+def finding_hash(result):
+    payload = json.dumps([_hash_value(result.get(f, "")) for f in _HASH_FIELDS], ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def results_digest(results, *extra):
+    """整个结果集（含行序）的摘要，extra 用于混入源文件标识等，作为报告缓存键"""
+    h = hashlib.sha256()
+    for part in extra:
+        h.update(str(part).encode("utf-8"))
+    for r in results:
+        h.update(json.dumps(r, ensure_ascii=False, default=str, sort_keys=True).encode("utf-8"))
+    return h.hexdigest()
+
+
+def build_result_snapshot(results):
+    """结果集 -> 紧凑快照 {key: [hash, 级别, 核对结果, 差异说明]}"""
+    return {finding_key(r): [finding_hash(r), r["级别"], r["核对结果"], r["差异说明"]] for r in results}
+
+
+def diff_result_snapshots(prev_findings, results):
+    """
+    与上次审核通过的快照做键控对比，O(n) 于记录条数。
+
+    Returns:
+        List[dict]: 变化类型 为 新增 / 已解决 / 变化 的记录
+    """
+    current = build_result_snapshot(results)
+    rows = []
+    for key, (h, level, status, detail) in current.items():
+        prev = prev_findings.get(key)
+        if prev is None:
+            rows.append({"变化类型": "🆕 新增", "键": key, "上次级别": "", "上次结果": "",
+                         "本次级别": level, "本次结果": status, "本次说明": detail})
+        elif prev[0] != h:
+            rows.append({"变化类型": "🔄 变化", "键": key, "上次级别": prev[1], "上次结果": prev[2],
+                         "本次级别": level, "本次结果": status, "本次说明": detail})
+    for key, (_, level, status, detail) in prev_findings.items():
+        if key not in current:
+            rows.append({"变化类型": "✅ 已解决", "键": key, "上次级别": level, "上次结果": status,
+                         "本次级别": "", "本次结果": "", "本次说明": detail})
+    return rows
 
 
 # --- 通用列表结构比对类（BOM_Data / Station_Data） ---
@@ -0,0 +1,219 @@
+# src/metrics.py
+"""
+运行指标（Prometheus 文本格式）：计数器 / 直方图在进程内累加，由本机端口上的 /metrics 输出，供 Prometheus 抓取与告警。
+
+    metrics.inc("smt_file_loads_total", path="pandas")
+    metrics.observe("smt_parse_seconds", 0.12, path="pandas")
+    metrics.sample("smt_jobs", JOBS.stats)     # 采样型指标：抓取时调用
+    metrics.start_server()                     # 每个进程一次
+
+- 热路径上一次记录只是一次加锁的字典累加（无格式化、无 I/O），文本在抓取时才生成；METRICS_ENABLED=False 时为空操作
+- 指标须先在 METRICS 中登记（类型、说明、直方图分桶或采样标签）；记录未登记的指标名抛出 KeyError
+- 采样型指标（活跃会话、任务数）在抓取时由回调读取当前值，不在热路径上维护
+- 进程池工作进程中记录的指标经 run_in_worker / drain 随调用结果带回主进程合并（merge），由主进程统一输出
+"""
+import bisect
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from config.settings import METRICS_ENABLED, METRICS_HOST, METRICS_PORT
+
+logger = logging.getLogger("smt.metrics")
+
+SECONDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BYTES = (1e3, 1e4, 1e5, 1e6, 1e7, 1e8)
+
+# 名称 -> (类型, 说明, 直方图分桶 / 采样型指标的标签名)
+METRICS = {
+    "smt_file_loads_total": ("counter", "文件加载次数（path: pandas / fallback / failed / arrow_cache / cache_hit）", None),
+    "smt_parse_seconds": ("histogram", "文件解析耗时（path: pandas / fallback）", SECONDS),
+    "smt_compare_seconds": ("histogram", "比对耗时（mode: full / changeover）", SECONDS),
+    "smt_findings_total": ("counter", "比对结论条数（level: 严重 / 警告 / 正常 / 忽略）", None),
+    "smt_export_bytes": ("histogram", "导出文件大小（format: csv / jsonl / parquet / xlsx）", BYTES),
+    "smt_active_sessions": ("gauge", "活跃的 Streamlit 会话数", None),
+    "smt_jobs": ("gauge", "后台任务数（state: queued / running / done / failed / cancelled）", "state"),
+}
+
+_lock = threading.Lock()
+_values = {}      # (名称, 标签) -> 计数 | [各分桶计数..., +Inf 计数, 总和]
+_samplers = {}    # 名称 -> 回调
+_server = None
+
+
+def enabled():
+    return METRICS_ENABLED
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items())) if labels else ()
+
+
+def inc(name, value=1, **labels):
+    """计数器累加"""
+    if not METRICS_ENABLED:
+        return
+    if METRICS[name][0] != "counter":
+        raise KeyError(name)
+    key = _key(name, labels)
+    with _lock:
+        _values[key] = _values.get(key, 0) + value
+
+
+def observe(name, value, **labels):
+    """直方图记录一个观测值"""
+    if not METRICS_ENABLED:
+        return
+    buckets = METRICS[name][2]
+    i = bisect.bisect_left(buckets, value)
+    key = _key(name, labels)
+    with _lock:
+        h = _values.get(key)
+        if h is None:
+            h = _values[key] = [0] * (len(buckets) + 1) + [0.0]
+        h[i] += 1
+        h[-1] += value
+
+
+def sample(name, fn):
+    """登记采样型指标的回调（同名覆盖）：返回数值，或 {标签值: 数值}（标签名见 METRICS）"""
+    if METRICS[name][0] != "gauge":
+        raise KeyError(name)
+    _samplers[name] = fn
+
+
+def drain():
+    """取出并清空本进程已记录的值（工作进程把增量带回主进程）；无记录时返回 None"""
+    global _values
+    with _lock:
+        values, _values = _values, {}
+    return values or None
+
+
+def merge(values):
+    """合并 drain() 的结果"""
+    if not values or not METRICS_ENABLED:
+        return
+    with _lock:
+        for key, v in values.items():
+            cur = _values.get(key)
+            if cur is None:
+                _values[key] = list(v) if isinstance(v, list) else v
+            elif isinstance(v, list):
+                for i, x in enumerate(v):
+                    cur[i] += x
+            else:
+                _values[key] = cur + v
+
+
+def run_in_worker(fn, *args, **kwargs):
+    """在进程池工作进程中执行 fn，连同本次记录的指标一起返回 (结果, 指标)；主进程取回后调用 merge"""
+    return fn(*args, **kwargs), drain()
+
+
+def _escape(value):
+    return str(value).replace("\\", r"\\").replace('"', r'\"').replace("\n", r"\n")
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _number(v):
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+def render():
+    """当前全部指标的 Prometheus 文本（exposition format 0.0.4）"""
+    with _lock:
+        values = {k: list(v) if isinstance(v, list) else v for k, v in _values.items()}
+    sampled = {}
+    for name, fn in list(_samplers.items()):
+        try:
+            sampled[name] = fn()
+        except Exception as e:
+            logger.debug("sampler %s failed: %s", name, e)
+
+    by_name = {}
+    for (name, labels), v in values.items():
+        by_name.setdefault(name, []).append((labels, v))
+    lines = []
+    for name, (kind, help_text, extra) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == "gauge":
+            v = sampled.get(name)
+            if isinstance(v, dict):
+                lines.extend(f"{name}{_labels([(extra, k)])} {_number(x)}" for k, x in sorted(v.items()))
+            elif v is not None:
+                lines.append(f"{name} {_number(v)}")
+        elif kind == "counter":
+            lines.extend(f"{name}{_labels(labels)} {_number(v)}" for labels, v in sorted(by_name.get(name, [])))
+        else:
+            for labels, h in sorted(by_name.get(name, [])):
+                cumulative = 0
+                for bound, n in zip(list(extra) + ["+Inf"], h[:-1]):
+                    cumulative += n
+                    le = bound if bound == "+Inf" else _number(float(bound))
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(float(h[-1]))}")
+                lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+def streamlit_sessions():
+    """
+    当前进程中 Streamlit 的活跃会话数（不在 Streamlit 中运行时为 0）。
+    会话管理器是 Streamlit 的内部属性，取不到（版本变化）时返回 None：该指标不输出，其余指标照常抓取。
+    """
+    try:
+        from streamlit import runtime
+        if not runtime.exists():
+            return 0
+        session_mgr = getattr(runtime.get_instance(), "_session_mgr", None)
+        return None if session_mgr is None else int(session_mgr.num_active_sessions())
+    except Exception as e:
+        logger.debug("active sessions unavailable: %s", e)
+        return None
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        pass
+
+
+def start_server(port=METRICS_PORT, host=METRICS_HOST):
+    """
+    在后台线程启动 /metrics 服务（每个进程只启动一次）；port 为 0、指标关闭或端口被占用时不启动。
+
+    Returns:
+        bool: 本次调用后服务是否在运行
+    """
+    global _server
+    with _lock:
+        if _server is not None:
+            return bool(_server)
+        if not METRICS_ENABLED or not port:
+            return False
+        try:
+            _server = ThreadingHTTPServer((host, port), _Handler)
+        except OSError as e:   # 同机多个实例：只有第一个占到端口
+            logger.warning("metrics server not started on %s:%s: %s", host, port, e)
+            _server = False
+            return False
+    threading.Thread(target=_server.serve_forever, name="smt-metrics", daemon=True).start()
+    logger.info("metrics on http://%s:%d/metrics", host, port)
+    return True
@@ -0,0 +1,113 @@
+# src/perf.py
+"""
+轻量分阶段性能埋点。
+
+    with perf.run("compare", model="8088"):
+        with perf.stage("aggregate_station"):
+            ...
+
+每次 run 结束输出一条结构化 JSON 日志；PERF_ENABLED=False 时 stage() 直接返回空上下文，几乎无开销。
+"""
+import contextlib
+import contextvars
+import json
+import logging
+import time
+import tracemalloc
+import uuid
+
+from config.settings import PERF_ENABLED, PERF_TRACEMALLOC
+
+_NULL = contextlib.nullcontext()
+_current = contextvars.ContextVar("smt_perf_recorder", default=None)
+logger = logging.getLogger("smt.perf")
+
+
+class PerfRecorder:
+    """单次运行的阶段耗时记录"""
+
+    def __init__(self, name, trace_memory=False, **fields):
+        self.name = name
+        self.fields = fields
+        self.trace_memory = trace_memory
+        self.stages = []   # [{'stage', 'depth', 'ms', 'peak_kb'}]
+        self._depth = 0
+        self._t0 = time.perf_counter()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        record = {'stage': name, 'depth': self._depth, 'ms': 0.0, 'peak_kb': None}
+        self.stages.append(record)
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        self._depth += 1
+        t0 = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['ms'] = round((time.perf_counter() - t0) * 1000, 2)
+            self._depth -= 1
+            if self.trace_memory:
+                record['peak_kb'] = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+
+    def to_record(self):
+        return {
+            "event": "smt_perf",
+            "run": self.name,
+            "run_id": uuid.uuid4().hex[:12],
+            **self.fields,
+            "total_ms": round((time.perf_counter() - self._t0) * 1000, 2),
+            "stages": self.stages,
+        }
+
+
+@contextlib.contextmanager
+def run(name, **fields):
+    """开启一次运行的埋点；结束时写 JSON 日志并返回 PerfRecorder（关闭时 yield None）"""
+    if not PERF_ENABLED:
+        yield None
+        return
+    started_trace = PERF_TRACEMALLOC and not tracemalloc.is_tracing()
+    if started_trace:
+        tracemalloc.start()
+    recorder = PerfRecorder(name, trace_memory=PERF_TRACEMALLOC, **fields)
+    token = _current.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _current.reset(token)
+        if started_trace:
+            tracemalloc.stop()
+        if recorder.stages:
+            logger.info(json.dumps(recorder.to_record(), ensure_ascii=False))
+
+
+@contextlib.contextmanager
+def scope(name, **fields):
+    """已有运行时沿用（阶段计入外层运行），否则新开一次运行；用于 st.fragment 单独重跑的局部区域"""
+    recorder = _current.get()
+    if recorder is not None:
+        yield recorder
+        return
+    with run(name, **fields) as recorder:
+        yield recorder
+
+
+def current():
+    """当前运行的 PerfRecorder（未开启时为 None）"""
+    return _current.get()
+
+
+def annotate(**fields):
+    """为当前运行补充字段（如机种编号），写入 JSON 日志"""
+    recorder = _current.get()
+    if recorder is not None:
+        recorder.fields.update(fields)
+
+
+def stage(name):
+    """在当前运行中记录一个阶段；无运行或已关闭时为空操作"""
+    recorder = _current.get()
+    if recorder is None:
+        return _NULL
+    return recorder.stage(name)
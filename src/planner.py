@@ -0,0 +1,185 @@
+# src/planner.py
+"""换线规划：最大化前后两个机种之间的 Feeder 复用，输出上下料拣料单。"""
+from src.utils import slot_sort_key
+
+
+def _slot_label(slot_key):
+    segment, slot = slot_key
+    return slot if segment <= 1 else f"{slot}(第{segment}段)"
+
+
+def _slot_positions(slot_keys):
+    """
+    站位键 -> 物理轴坐标。
+
+    同一机台/料台/分段内相邻站位距离为 1，跨分组额外加 1000，
+    使跨机台移位的代价远大于同料台内移位，同时保持一维坐标（匹配可用有序 DP 精确求解）。
+    """
+    def group_of(key):
+        segment, slot = key
+        parsed = slot_sort_key(slot)
+        return (segment, parsed[1][0], parsed[1][1]) if parsed[0] == 0 else (segment, "?", "?")
+
+    ordered = sorted(slot_keys, key=lambda k: (k[0], slot_sort_key(k[1])))
+    positions = {}
+    pos, prev_group = 0, None
+    for key in ordered:
+        group = group_of(key)
+        if prev_group is not None:
+            pos += 1 if group == prev_group else 1000
+        positions[key] = pos
+        prev_group = group
+    return positions
+
+
+def _match_on_line(needs, feeders):
+    """
+    一维最小总距离匹配。needs / feeders 为按坐标排序的 [(pos, item)]。
+    在直线上最优匹配保持顺序，故用 O(n·m) 的 DP 精确求解不等长情况。
+
+    Returns:
+        [(need_item, feeder_item)]，数量为 min(len(needs), len(feeders))
+    """
+    if not needs or not feeders:
+        return []
+    swap = len(needs) > len(feeders)
+    a, b = (feeders, needs) if swap else (needs, feeders)
+    n, m = len(a), len(b)
+    INF = float("inf")
+    # dp[i][j]: a 的前 i 个全部匹配到 b 的前 j 个中的最小代价
+    dp = [[INF] * (m + 1) for _ in range(n + 1)]
+    for j in range(m + 1):
+        dp[0][j] = 0
+    for i in range(1, n + 1):
+        for j in range(i, m + 1):
+            dp[i][j] = min(dp[i][j - 1], dp[i - 1][j - 1] + abs(a[i - 1][0] - b[j - 1][0]))
+    pairs = []
+    i, j = n, m
+    while i > 0:
+        if j > i and dp[i][j] == dp[i][j - 1]:
+            j -= 1
+        else:
+            pairs.append((a[i - 1][1], b[j - 1][1]))
+            i, j = i - 1, j - 1
+    pairs.reverse()
+    return [(y, x) for x, y in pairs] if swap else pairs
+
+
+def _order_moves(moves, order):
+    """
+    移位排序：目标站位仍被另一个待移位 Feeder 占用时需先移走它；
+    形成环（互换）时先把其中一个 Feeder 暂存到料车，环末再装回。
+
+    Returns:
+        [(action, pn, from_key, to_key)]，action 为 "移位" / "暂存" / "装回"
+    """
+    pending = {m['from']: m for m in moves}
+    steps = []
+    while pending:
+        # 目标位已空（无待移位 Feeder 占用）的移位可直接执行
+        ready = [m for m in pending.values() if m['to'] not in pending or m['to'] == m['from']]
+        if ready:
+            for m in sorted(ready, key=lambda x: order(x['from'])):
+                steps.append(("移位", m['pn'], m['from'], m['to']))
+                del pending[m['from']]
+            continue
+        # 只剩环：暂存任意一个以打破环
+        start = min(pending, key=order)
+        m = pending.pop(start)
+        steps.append(("暂存", m['pn'], m['from'], None))
+        cur = start
+        while True:
+            nxt = next((x for x in pending.values() if x['to'] == cur), None)
+            if nxt is None:
+                break
+            steps.append(("移位", nxt['pn'], nxt['from'], nxt['to']))
+            del pending[nxt['from']]
+            cur = nxt['from']
+        steps.append(("装回", m['pn'], None, m['to']))
+    return steps
+
+
+def plan_changeover(out_slot_index, in_slot_index, in_bom_map=None):
+    """
+    计算换线拣料单。
+
+    Args:
+        out_slot_index: 下线机种站位索引（aggregate_station 返回的 slot_index）
+        in_slot_index:  上线机种站位索引
+        in_bom_map:     上线机种 BOM 聚合结果（可选），用于识别可直接复用的替代料
+
+    Returns:
+        dict: {
+            'pick_list': [dict, ...],  # 步骤, 动作, 料号, 原站位, 新站位, 说明
+            'summary':   {'保留': n, '移位': n, '下料': n, '上料': n, '冲突': n, '操作数': n},
+        }
+    """
+    # 料号 -> 等价类（上线 BOM 中同一主料的替代料视为可互换）
+    equiv = {}
+    for bom_pn, bom_data in (in_bom_map or {}).items():
+        for target in {bom_pn} | set(bom_data['subs']):
+            equiv.setdefault(target, bom_pn)
+    cls = lambda pn: equiv.get(pn, pn)
+
+    # 同一站位登记了多个料号（站位冲突）时无法确定实际 Feeder，不参与规划，列入拣料单由人工确认
+    conflicts = [(side, key, e['pns']) for side, index in (("下线", out_slot_index), ("上线", in_slot_index))
+                 for key, e in index.items() if len(e['pns']) > 1]
+    conflict_keys = {key for _, key, _ in conflicts}
+    out_feeders = {key: e['pns'][0] for key, e in out_slot_index.items() if e['pns'] and key not in conflict_keys}
+    in_needs = {key: e['pns'][0] for key, e in in_slot_index.items() if e['pns'] and key not in conflict_keys}
+    positions = _slot_positions(set(out_feeders) | set(in_needs) | conflict_keys)
+
+    pick_rows = []
+    keep, remaining_needs, remaining_feeders = [], {}, {}
+
+    # 1. 同站位同料号（或可替代料号）直接保留
+    for key, pn in in_needs.items():
+        out_pn = out_feeders.get(key)
+        if out_pn is not None and cls(out_pn) == cls(pn):
+            note = "" if out_pn == pn else f"使用替代料 {out_pn}"
+            keep.append((key, out_pn, note))
+        else:
+            remaining_needs.setdefault(cls(pn), []).append((positions[key], (key, pn)))
+    kept_keys = {k for k, _, _ in keep}
+    for key, pn in out_feeders.items():
+        if key not in kept_keys:
+            remaining_feeders.setdefault(cls(pn), []).append((positions[key], (key, pn)))
+
+    # 2. 同等价类的剩余需求与剩余 Feeder 做一维最小距离匹配 -> 移位
+    moves, loads, unloads = [], [], []
+    for c in set(remaining_needs) | set(remaining_feeders):
+        needs = sorted(remaining_needs.get(c, []), key=lambda x: x[0])
+        feeders = sorted(remaining_feeders.get(c, []), key=lambda x: x[0])
+        pairs = _match_on_line(needs, feeders)
+        matched_needs = {n[0] for n, _ in pairs}
+        matched_feeders = {f[0] for _, f in pairs}
+        for (to_key, _), (from_key, out_pn) in pairs:
+            moves.append({'pn': out_pn, 'from': from_key, 'to': to_key})
+        loads.extend(item for _, item in needs if item[0] not in matched_needs)
+        unloads.extend(item for _, item in feeders if item[0] not in matched_feeders)
+
+    order = lambda key: positions[key]
+    step = 0
+    for key, pn in sorted(unloads, key=lambda x: order(x[0])):
+        step += 1
+        pick_rows.append({"步骤": step, "动作": "下料", "料号": pn, "原站位": _slot_label(key), "新站位": "", "说明": ""})
+    for action, pn, from_key, to_key in _order_moves(moves, order):
+        step += 1
+        pick_rows.append({
+            "步骤": step, "动作": action, "料号": pn,
+            "原站位": _slot_label(from_key) if from_key else "料车",
+            "新站位": _slot_label(to_key) if to_key else "料车",
+            "说明": "互换环，先暂存" if action == "暂存" else "",
+        })
+    for key, pn in sorted(loads, key=lambda x: order(x[0])):
+        step += 1
+        pick_rows.append({"步骤": step, "动作": "上料", "料号": pn, "原站位": "", "新站位": _slot_label(key), "说明": "新备料"})
+    for key, pn, note in sorted(keep, key=lambda x: order(x[0])):
+        pick_rows.append({"步骤": "", "动作": "保留", "料号": pn, "原站位": _slot_label(key), "新站位": _slot_label(key), "说明": note})
+    for side, key, pns in sorted(conflicts, key=lambda x: (order(x[1]), x[0])):
+        pick_rows.append({"步骤": "", "动作": "人工确认", "料号": "/".join(pns), "原站位": _slot_label(key),
+                          "新站位": _slot_label(key), "说明": f"{side}站位冲突（登记 {len(pns)} 个料号），未参与规划"})
+
+    summary = {"保留": len(keep), "移位": len(moves), "下料": len(unloads), "上料": len(loads), "冲突": len(conflict_keys)}
+    summary["操作数"] = step
+    return {'pick_list': pick_rows, 'summary': summary}
@@ -0,0 +1,175 @@
+# src/report.py
+"""首件核对报告（xlsx）生成：xlsxwriter constant_memory 逐行流式写出，峰值内存与程序规模无关"""
+import math
+import os
+from datetime import date, datetime
+
+from src import metrics
+from src.lazy import lazy_import
+from src.utils import temp_output
+
+xlsxwriter = lazy_import("xlsxwriter")
+
+PROTECT_OPTS = {
+    'select_locked_cells': True, 'select_unlocked_cells': True,
+    'format_cells': True, 'format_columns': True, 'format_rows': True,
+    'autofilter': True, 'sort': True
+}
+
+REGRESSION_COLUMNS = ["变化类型", "键", "上次级别", "上次结果", "本次级别", "本次结果", "本次说明"]
+CHANGEOVER_COLUMNS = ["变更类型", "料号", "原站位", "新站位", "位号变更"]
+
+WORKBOOK_OPTS = {
+    'constant_memory': True,        # 每行写完即刷到临时文件，不在内存中保留整张表
+    'strings_to_formulas': False,   # 源表中以 "=" 开头的文本按文本写出
+    'strings_to_urls': False,
+    'strings_to_numbers': False,
+}
+
+
+def _result_columns(results):
+    """与 pd.DataFrame(list_of_dicts) 一致：按首次出现顺序取并集"""
+    cols = {}
+    for r in results:
+        for k in r:
+            cols.setdefault(k, None)
+    return list(cols)
+
+
+def _write_cell(ws, row, col, val, date_fmt):
+    """按 pandas to_excel 的口径写单元格：空值留空，numpy 标量转 Python 类型"""
+    if val is None:
+        return
+    if hasattr(val, 'item') and not isinstance(val, (str, bytes)):
+        val = val.item()   # numpy 标量
+    if isinstance(val, float) and math.isnan(val):
+        return
+    if isinstance(val, (datetime, date)):
+        if getattr(val, 'tzinfo', None) is not None:
+            val = val.replace(tzinfo=None)
+        ws.write_datetime(row, col, val, date_fmt)
+    elif isinstance(val, (str, bool, int, float)):
+        ws.write(row, col, val)
+    else:
+        ws.write_string(row, col, str(val))
+
+
+def _write_table(ws, columns, rows, startrow, header_fmt, date_fmt):
+    """写表头与数据行，rows 为逐行可迭代对象（tuple/list），返回写入的数据行数"""
+    for c, name in enumerate(columns):
+        ws.write(startrow, c, name if isinstance(name, (str, int, float)) else str(name), header_fmt)
+    n = 0
+    for n, values in enumerate(rows, start=1):
+        r = startrow + n
+        for c, val in enumerate(values):
+            _write_cell(ws, r, c, val, date_fmt)
+    return n
+
+
+def _frame_rows(df):
+    return df.itertuples(index=False, name=None)
+
+
+def write_report_xlsx(fh, results, df_bom, df_station, meta, regression=None, changeover=None):
+    """
+    将核对报告流式写入文件对象或路径 fh（各工作表按行顺序写出）。
+
+    Args:
+        results: run_smt_comparison 返回的结果列表
+        meta: 工单信息 {'wo_number', 'wo_qty', 'inspector', 'check_time'}
+        regression: 与上次审核结果的回归对比（可选）
+        changeover: 换线增量核对信息（可选）
+    """
+    wb = xlsxwriter.Workbook(fh, WORKBOOK_OPTS)
+    try:
+        text_fmt = wb.add_format({'align': 'left', 'valign': 'vcenter'})
+        col_header_fmt = wb.add_format({'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'})
+        date_fmt = wb.add_format({'num_format': 'yyyy-mm-dd hh:mm:ss'})
+
+        # Sheet 1 - 核对结果
+        ws = wb.add_worksheet('核对结果')
+        ws.protect('admin', PROTECT_OPTS)
+
+        # 添加工单信息到顶栏
+        header_fmt = wb.add_format({
+            'bold': True, 'align': 'left', 'valign': 'vcenter',
+            'bg_color': '#D9E8F5', 'border': 1, 'font_size': 10
+        })
+        info_fmt = wb.add_format({
+            'align': 'left', 'valign': 'vcenter',
+            'bg_color': '#E7F0F7', 'border': 1, 'font_size': 10
+        })
+
+        ws.set_row(0, 18)
+        ws.write('A1', '订单号:', header_fmt)
+        ws.write('B1', meta['wo_number'], info_fmt)
+        ws.write('C1', '订单数量:', header_fmt)
+        ws.write('D1', meta['wo_qty'], info_fmt)
+        ws.set_row(1, 18)
+        ws.write('A2', '核对时间:', header_fmt)
+        ws.write('B2', meta['check_time'], info_fmt)
+        ws.write('C2', '检验人:', header_fmt)
+        ws.write('D2', meta['inspector'], info_fmt)
+        ws.set_column('E:E', 25); ws.set_column('F:F', 25); ws.set_column('G:G', 40)
+
+        columns = _result_columns(results)
+        n_rows = _write_table(ws, columns, ([r.get(c) for c in columns] for r in results),
+                              3, col_header_fmt, date_fmt)
+
+        # 级别列着色，范围按实际数据行数（第 5 行起）
+        if n_rows:
+            fmt_red = wb.add_format({'font_color':'#D00000', 'bold':True})
+            fmt_org = wb.add_format({'font_color':'#FF8800', 'bold':True})
+            fmt_grn = wb.add_format({'font_color':'#008000'})
+            level_range = f"A5:A{4 + n_rows}"
+            ws.conditional_format(level_range, {'type':'text', 'criteria':'containing', 'value':'严重', 'format':fmt_red})
+            ws.conditional_format(level_range, {'type':'text', 'criteria':'containing', 'value':'警告', 'format':fmt_org})
+            ws.conditional_format(level_range, {'type':'text', 'criteria':'containing', 'value':'正常', 'format':fmt_grn})
+
+        # Sheet 2/3 - 原始表格
+        raw_sheets = [
+            ('原BOM表', list(df_bom.columns), _frame_rows(df_bom), 0, None),
+            ('原站位表', list(df_station.columns), _frame_rows(df_station), 0, None),
+        ]
+        if regression is not None:
+            raw_sheets.append((
+                '回归对比', REGRESSION_COLUMNS,
+                ([r.get(c) for c in REGRESSION_COLUMNS] for r in regression['rows']), 2,
+                f"对比基线: {regression['approved_at']}  订单号: {regression['work_order']}  检验人: {regression['inspector']}",
+            ))
+        if changeover:
+            raw_sheets.append((
+                '换线变更', CHANGEOVER_COLUMNS,
+                ([r.get(c) for c in CHANGEOVER_COLUMNS] for r in changeover['diff']['rows']), 0, None,
+            ))
+
+        for sheet_name, cols, rows, startrow, title in raw_sheets:
+            ws_raw = wb.add_worksheet(sheet_name)
+            ws_raw.protect('admin', PROTECT_OPTS)
+            ws_raw.set_column('A:Z', 15, text_fmt)
+            if title:
+                ws_raw.write('A1', title)
+            _write_table(ws_raw, cols, rows, startrow, col_header_fmt, date_fmt)
+    finally:
+        wb.close()
+
+
+def build_report_xlsx(results, df_bom, df_station, meta, regression=None, changeover=None):
+    """
+    生成带工单信息、条件格式与工作表保护的核对报告。
+
+    工作簿直接写入磁盘临时文件，生成与下发过程中都不在内存中保留整本工作簿的 bytes 副本。
+
+    Returns:
+        io.BufferedReader: 定位到开头的只读文件对象，调用方负责关闭（关闭后临时文件即删除）
+    """
+    fh, _ = temp_output(lambda out: write_report_xlsx(out, results, df_bom, df_station, meta, regression, changeover),
+                        suffix=".xlsx")
+    metrics.observe("smt_export_bytes", os.fstat(fh.fileno()).st_size, format="xlsx")
+    return fh
+
+
+def save_report_xlsx(path, results, df_bom, df_station, meta, regression=None, changeover=None):
+    """生成核对报告并写入 path（工作进程中使用：跨进程只传路径，不传报告内容）"""
+    write_report_xlsx(path, results, df_bom, df_station, meta, regression, changeover)
+    metrics.observe("smt_export_bytes", os.path.getsize(path), format="xlsx")
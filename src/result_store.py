@@ -0,0 +1,236 @@
+# src/result_store.py
+"""
+进程级结果存储：比对结果以列式 DataFrame 保存，session_state 只保存句柄。
+
+所有会话共享一个内存预算（RESULT_STORE_BUDGET_MB），超出时按最近最少使用（LRU）
+把结果集落盘到 RESULT_STORE_DIR 下本进程专用的子目录（<pid>-<随机串>，进程退出时删除），再次访问时透明加载回内存。
+同一目录可由多个进程（页面、api.py、watch.py）共用：启动时只清理超过 RESULT_STORE_TTL 未动的遗留文件（多为异常退出的进程所留）。
+派生数据（结果视图索引）随结果集缓存并计入预算，落盘时丢弃、加载后按需重建。
+"""
+import atexit
+import logging
+import math
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from config.settings import RESULT_STORE_BUDGET_MB, RESULT_STORE_DIR, RESULT_STORE_TTL
+from src.lazy import lazy_import
+
+pd = lazy_import("pandas")
+
+logger = logging.getLogger("smt.store")
+
+# 取值种类不超过行数该比例的文本列转为 category
+CATEGORY_RATIO = 0.5
+
+
+def _compact(results):
+    """list-of-dicts -> 列式 DataFrame；低基数文本列转 category"""
+    df = pd.DataFrame(results)
+    n = len(df)
+    for col in df.columns:
+        if df[col].dtype == object and n and df[col].nunique(dropna=True) <= n * CATEGORY_RATIO:
+            df[col] = df[col].astype("category")
+    return df
+
+
+def _is_missing(v):
+    return v is None or (isinstance(v, float) and math.isnan(v))
+
+
+def frame_to_records(df):
+    """列式结果 -> list-of-dicts（缺失的键不写出，与原始结果一致）"""
+    cols = {c: df[c].tolist() for c in df.columns}
+    names = list(cols)
+    out = []
+    for i in range(len(df)):
+        out.append({c: cols[c][i] for c in names if not _is_missing(cols[c][i])})
+    return out
+
+
+def _sizeof(obj, frame):
+    """派生数据的内存估算：数组 / Series / DataFrame 按实际字节数，容器递归；与结果集共享的 frame 不重复计算"""
+    if obj is frame:
+        return 0
+    if isinstance(obj, dict):
+        return sum(_sizeof(v, frame) for v in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return sum(_sizeof(v, frame) for v in obj)
+    if isinstance(obj, (pd.Series, pd.DataFrame)):
+        return int(pd.Series(obj.memory_usage(deep=True)).sum())
+    nbytes = getattr(obj, "nbytes", None)
+    return int(nbytes) if isinstance(nbytes, int) else 0
+
+
+class _Entry:
+    __slots__ = ("frame", "nbytes", "path", "derived", "derived_bytes", "last_used")
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.nbytes = int(frame.memory_usage(deep=True).sum())
+        self.path = None
+        self.derived = {}
+        self.derived_bytes = 0
+        self.last_used = time.time()
+
+
+class ResultStore:
+    """线程安全的 LRU 结果存储；budget_bytes 为所有会话共享的内存上限"""
+
+    def __init__(self, budget_bytes, spill_dir, ttl=RESULT_STORE_TTL):
+        self.budget_bytes = budget_bytes
+        self.spill_root = spill_dir
+        # 句柄只在本进程内有效：落盘文件放在本进程专用的子目录（首次落盘时创建），退出时整个删除
+        self.spill_dir = os.path.join(spill_dir, f"{os.getpid()}-{uuid.uuid4().hex[:8]}")
+        self.ttl = ttl
+        self._entries = {}
+        self._resident = OrderedDict()   # handle -> None，按最近使用排序（末尾最新）
+        self._resident_bytes = 0
+        self._lock = threading.RLock()
+        self._remove_stale()
+        atexit.register(self.close)
+
+    def _remove_stale(self):
+        """删除其他进程遗留、超过 ttl 未动的落盘文件与空目录（仍在运行的进程的文件不会这么久不被访问或清理）"""
+        if not os.path.isdir(self.spill_root):
+            return
+        cutoff = time.time() - self.ttl
+        for entry in os.scandir(self.spill_root):
+            try:
+                if entry.is_dir():
+                    idle = entry.stat().st_mtime < cutoff   # 删除文件会更新目录时间，先记下
+                    for f in os.scandir(entry.path):
+                        if f.name.endswith(".pkl") and f.stat().st_mtime < cutoff:
+                            os.remove(f.path)
+                    if idle and not os.listdir(entry.path):
+                        os.rmdir(entry.path)
+                elif entry.name.endswith(".pkl") and entry.stat().st_mtime < cutoff:   # 旧版直接放在根目录的文件
+                    os.remove(entry.path)
+            except OSError:
+                pass
+
+    def close(self):
+        """删除本进程的落盘目录（进程退出时自动调用）"""
+        shutil.rmtree(self.spill_dir, ignore_errors=True)
+
+    # --- 写入 / 读取 ---
+    def put(self, results):
+        """保存结果集，返回句柄"""
+        entry = _Entry(_compact(results))
+        handle = uuid.uuid4().hex
+        with self._lock:
+            self._entries[handle] = entry
+            self._resident[handle] = None
+            self._resident_bytes += entry.nbytes
+            self._enforce_budget(keep=handle)
+            self._purge_expired()
+        return handle
+
+    def frame(self, handle):
+        """取列式结果（必要时从磁盘加载），句柄无效时返回 None"""
+        with self._lock:
+            entry = self._touch(handle)
+            return None if entry is None else entry.frame
+
+    def records(self, handle):
+        """取 list-of-dicts 形式的结果（导出 / 快照使用）"""
+        df = self.frame(handle)
+        return None if df is None else frame_to_records(df)
+
+    def derived(self, handle, name, build):
+        """按名称缓存由结果集派生的数据（如视图索引），build(frame) 仅在首次或重新加载后调用"""
+        with self._lock:
+            entry = self._touch(handle)
+            if entry is None:
+                return None
+            if name not in entry.derived:
+                value = entry.derived[name] = build(entry.frame)
+                size = _sizeof(value, entry.frame)
+                entry.derived_bytes += size
+                self._resident_bytes += size
+                self._enforce_budget(keep=handle)
+            return entry.derived[name]
+
+    def drop(self, handle):
+        """释放结果集（同一会话产生新结果时调用）"""
+        with self._lock:
+            entry = self._entries.pop(handle, None)
+            if entry is None:
+                return
+            if handle in self._resident:
+                del self._resident[handle]
+                self._resident_bytes -= entry.nbytes + entry.derived_bytes
+            self._remove_file(entry)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "resident": len(self._resident),
+                    "resident_mb": round(self._resident_bytes / 1048576, 1),
+                    "budget_mb": round(self.budget_bytes / 1048576, 1)}
+
+    # --- 内部 ---
+    def _touch(self, handle):
+        entry = self._entries.get(handle)
+        if entry is None:
+            return None
+        entry.last_used = time.time()
+        if entry.frame is None:
+            entry.frame = pd.read_pickle(entry.path)
+            self._remove_file(entry)
+            self._resident[handle] = None
+            self._resident_bytes += entry.nbytes
+            self._enforce_budget(keep=handle)
+        else:
+            self._resident.move_to_end(handle)
+        return entry
+
+    def _enforce_budget(self, keep):
+        """超出预算时先丢弃其他结果集的派生数据（可按需重建），仍超出再把最久未用的结果集落盘（当前访问的结果集除外）"""
+        for handle in list(self._resident):
+            if self._resident_bytes <= self.budget_bytes:
+                return
+            entry = self._entries[handle]
+            if handle != keep and entry.derived:
+                entry.derived = {}
+                self._resident_bytes -= entry.derived_bytes
+                entry.derived_bytes = 0
+        while self._resident_bytes > self.budget_bytes and len(self._resident) > 1:
+            handle = next(iter(self._resident))
+            if handle == keep:
+                self._resident.move_to_end(handle)
+                continue
+            self._spill(handle)
+
+    def _spill(self, handle):
+        entry = self._entries[handle]
+        os.makedirs(self.spill_dir, exist_ok=True)
+        entry.path = os.path.join(self.spill_dir, f"{handle}.pkl")
+        entry.frame.to_pickle(entry.path)
+        entry.frame = None
+        entry.derived = {}
+        del self._resident[handle]
+        self._resident_bytes -= entry.nbytes + entry.derived_bytes
+        entry.derived_bytes = 0
+        logger.info("spilled result set %s (%.1f MB)", handle, entry.nbytes / 1048576)
+
+    def _purge_expired(self):
+        """长时间未访问（会话多半已关闭）的已落盘结果集直接删除"""
+        cutoff = time.time() - self.ttl
+        for handle in [h for h, e in self._entries.items() if e.frame is None and e.last_used < cutoff]:
+            self._remove_file(self._entries.pop(handle))
+
+    @staticmethod
+    def _remove_file(entry):
+        if entry.path:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+            entry.path = None
+
+
+STORE = ResultStore(RESULT_STORE_BUDGET_MB * 1024 * 1024, RESULT_STORE_DIR)
@@ -0,0 +1,109 @@
+# src/result_view.py
+"""
+结果表的服务端视图：比对完成后一次性建好索引与统计，之后的筛选 / 排序 / 搜索 / 分页
+只做数组运算，页面每次只下发当前页。
+"""
+from src.lazy import lazy_import
+from src.utils import parse_slot, slot_sort_key
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+NORMAL_LEVEL = "🟢 正常"
+
+# 搜索字段 -> 结果列
+SEARCH_FIELDS = {
+    "料号": ["BOM料号"],
+    "位号": ["BOM位号明细", "实装位号明细"],
+    "站位": ["站位号"],
+}
+
+
+def slot_group(key):
+    """站位结构键 -> 机台-料台 分组名"""
+    if not key: return ""
+    return "-".join(p for p in key[:2] if p)
+
+
+def build_result_view(results):
+    """
+    结果列表（或列式 DataFrame）-> 视图（一次 O(n)，之后的查询不再逐行解析）。
+
+    Returns:
+        dict: {
+            'frame':         pd.DataFrame,           # 结果表
+            'level_counts':  {级别: n},
+            'status_counts': {核对结果: n},
+            'by_level':      {级别: 行位置数组},
+            'by_group':      {机台-料台: 行位置数组},
+            'slot_order':    行位置数组（按物理站位排序）,
+            'search':        {搜索字段: 大写文本 Series},
+        }
+    """
+    df = results if isinstance(results, pd.DataFrame) else pd.DataFrame(results)
+    n = len(df)
+    view = {'frame': df, 'level_counts': {}, 'status_counts': {}, 'by_level': {}, 'by_group': {},
+            'slot_order': np.arange(n), 'search': {}}
+    if n == 0:
+        return view
+
+    levels = df["级别"].astype(object).to_numpy()
+    view['level_counts'] = df["级别"].value_counts(sort=True).loc[lambda c: c > 0].to_dict()
+    view['status_counts'] = df["核对结果"].value_counts().loc[lambda c: c > 0].to_dict()
+    view['by_level'] = {lvl: np.flatnonzero(levels == lvl) for lvl in view['level_counts']}
+
+    slots = df["站位号"].astype(object).fillna("").astype(str).tolist() if "站位号" in df else [""] * n
+    groups = {}
+    for i, v in enumerate(slots):
+        for g in {slot_group(parse_slot(x)) for x in v.split(",") if x}:
+            if g:
+                groups.setdefault(g, []).append(i)
+    view['by_group'] = {g: np.asarray(pos) for g, pos in groups.items()}
+    view['slot_order'] = np.asarray(sorted(range(n), key=lambda i: slot_sort_key(slots[i])), dtype=np.int64)
+
+    for field, cols in SEARCH_FIELDS.items():
+        present = [c for c in cols if c in df]
+        if present:
+            text = df[present].astype(object).fillna("").astype(str)
+            text = text.agg(" ".join, axis=1) if len(present) > 1 else text[present[0]]
+            view['search'][field] = text.str.upper()
+    return view
+
+
+def query_result_view(view, levels=None, groups=None, text="", field=None, sort_by_slot=False):
+    """
+    筛选 + 排序，返回命中的行位置数组。
+
+    Args:
+        levels: 只保留这些级别（None 为不筛选）
+        groups: 只保留装在这些 机台-料台 上的行
+        text:   搜索文本（不区分大小写的子串匹配）
+        field:  搜索字段（SEARCH_FIELDS 的键，None 为全部字段）
+    """
+    n = len(view['frame'])
+    mask = np.ones(n, dtype=bool)
+    if levels is not None:
+        m = np.zeros(n, dtype=bool)
+        for lvl in levels:
+            m[view['by_level'].get(lvl, [])] = True
+        mask &= m
+    if groups:
+        m = np.zeros(n, dtype=bool)
+        for g in groups:
+            m[view['by_group'].get(g, [])] = True
+        mask &= m
+    text = (text or "").strip().upper()
+    if text:
+        m = np.zeros(n, dtype=bool)
+        for f in ([field] if field else view['search']):
+            if f in view['search']:
+                m |= view['search'][f].str.contains(text, regex=False).to_numpy()
+        mask &= m
+    order = view['slot_order'] if sort_by_slot else np.arange(n)
+    return order[mask[order]]
+
+
+def page_of(view, positions, page, page_size):
+    """取第 page 页（从 1 开始）的结果行"""
+    start = (page - 1) * page_size
+    return view['frame'].iloc[positions[start:start + page_size]]
@@ -0,0 +1,150 @@
+# src/service.py
+"""
+无界面比对流程：解析 -> 映射 -> 比对，与页面使用同一套核心逻辑与缓存，供 HTTP 接口等非 Streamlit 入口调用。
+
+- 解析与单侧预聚合走 speculative 的按内容摘要缓存：同一进程内相同文件不重复解析
+- 未给出 BOM 时按机种编号从 BOM 库（bom_library）取
+- 映射优先用已确认的映射方案（表头指纹 / 机种），缺失列按别名猜测补齐；结果中注明映射来源
+- 可在子进程中执行（参数与返回值均可 pickle），不调用 st.*
+"""
+import hashlib
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from src import bom_library, speculative
+from src.data_loader import LoadError
+from src.logic import results_digest, run_full_comparison
+from src.report import build_report_xlsx, save_report_xlsx
+from src.user_manager import get_mapping_profile, get_mappings
+from src.utils import extract_file_id, guess_mapping, header_fingerprint
+
+
+class ServiceError(Exception):
+    """调用方可处理的错误（文件名不规范、机种不匹配、BOM 缺失、文件无法解析）"""
+
+
+class NamedBytes:
+    """内存中的文件，接口与上传文件一致（name / file_id / getvalue）"""
+
+    def __init__(self, name, data):
+        self.name = name
+        self._data = data
+        self.file_id = "bytes:" + hashlib.blake2b(data, digest_size=16).hexdigest()
+
+    def getvalue(self):
+        return self._data
+
+
+def mapping_defaults(b_cols, s_cols, bom_fp, st_fp, model_id, current_aliases):
+    """映射默认值：已确认方案（表头指纹精确命中 O(1)，其次同机种）优先，缺失列按别名猜测补齐"""
+    guessed = guess_mapping(b_cols, s_cols, current_aliases)
+    profile = get_mapping_profile(bom_fp, st_fp, model_id)
+    if profile is None:
+        return guessed, None
+    cfg = dict(guessed)
+    for key, val in profile['config'].items():
+        cols = b_cols if key.startswith('bom_') else s_cols
+        if isinstance(val, list):
+            if val and all(c in cols for c in val): cfg[key] = val
+        elif val is None or val in cols:
+            cfg[key] = val
+    return cfg, profile
+
+
+def check_pair(station_name, bom_name=None, model=None):
+    """
+    按文件名校验一对文件（不读内容），供调用方在提交任务前尽早报错。
+
+    Returns:
+        str: 机种编号（model 缺省时取站位表文件名开头的编号）
+    """
+    model = model or extract_file_id(station_name)
+    if not model:
+        raise ServiceError(f"站位表文件名须以机种编号开头: {station_name}")
+    if bom_name is not None:
+        bom_id = extract_file_id(bom_name)
+        if bom_id != model:
+            raise ServiceError(f"编号不匹配: {bom_id} vs {model}")
+    elif bom_library.lookup(model) is None:
+        raise ServiceError(f"BOM 库中没有机种 {model}，请同时提交 BOM")
+    return model
+
+
+def load_pair(station_name, station_data, bom_name=None, bom_data=None, model=None):
+    """
+    取得一对 BOM / 站位表的解析结果。
+
+    Args:
+        model: 机种编号；缺省时取站位表文件名开头的编号
+
+    Returns:
+        (model, bom_file, df_bom, station_file, df_station)；bom_file 为上传的 NamedBytes 或 BOM 库的 LibraryFile
+    """
+    model = check_pair(station_name, bom_name if bom_data is not None else None, model)
+    station_file = NamedBytes(station_name, station_data)
+    bom_file = NamedBytes(bom_name, bom_data) if bom_data is not None else bom_library.lookup(model)
+    try:
+        df_bom = speculative.load_headless(bom_file) if bom_data is not None else bom_library.frame(bom_file)
+    except LoadError as e:
+        raise ServiceError(f"无法解析 BOM: {bom_file.name} ({e.detail})")
+    if df_bom is None:
+        raise ServiceError(f"无法解析 BOM: {bom_file.name}")
+    try:
+        df_station = speculative.load_headless(station_file)
+    except LoadError as e:
+        raise ServiceError(f"无法解析站位表: {station_name} ({e.detail})")
+    if df_station is None:
+        raise ServiceError(f"无法解析站位表: {station_name}")
+    return model, bom_file, df_bom, station_file, df_station
+
+
+def compare_files(station_name, station_data, bom_name=None, bom_data=None, model=None, ignore_nc=True):
+    """
+    完整比对一对文件。
+
+    Returns:
+        dict: {'model', 'bom_file', 'station_file', 'bom_from_library', 'mapping'（fingerprint / model / guessed）,
+               'config', 'results', 'error_count', 'total', 'duration_ms', 'digest'}
+    """
+    t0 = time.perf_counter()
+    model, bom_file, df_bom, station_file, df_station = load_pair(station_name, station_data, bom_name, bom_data, model)
+    b_cols, s_cols = df_bom.columns.tolist(), df_station.columns.tolist()
+    config, profile = mapping_defaults(b_cols, s_cols, header_fingerprint(b_cols), header_fingerprint(s_cols),
+                                       model, get_mappings())
+    prepared = speculative.prepared(bom_file, df_bom, station_file, df_station, config)
+    results, error_count, total, _ = run_full_comparison(df_bom, df_station, config, ignore_nc, prepared)
+    return {
+        'model': model, 'bom_file': bom_file.name, 'station_file': station_name,
+        'bom_from_library': bom_data is None, 'mapping': profile['match'] if profile else "guessed",
+        'config': config, 'results': results, 'error_count': error_count, 'total': total,
+        'duration_ms': round((time.perf_counter() - t0) * 1000, 1),
+        'digest': results_digest(results, bom_file.file_id, station_file.file_id, ignore_nc),
+    }
+
+
+def build_report(station_name, station_data, bom_name, bom_data, model, results, meta, path):
+    """按比对结果生成核对报告 xlsx 写入 path（重新取解析结果，多半命中缓存）；跨进程只传路径，报告内容不经 pickle"""
+    _, _, df_bom, _, df_station = load_pair(station_name, station_data, bom_name, bom_data, model)
+    save_report_xlsx(path, results, df_bom, df_station, meta)
+
+
+def compare_with_report(station_name, station_data, bom_name=None, bom_data=None, model=None, ignore_nc=True,
+                        meta=None):
+    """比对并生成核对报告（同一工作进程内完成，报告直接取本次的解析结果）；报告 bytes 在返回值的 'report' 中"""
+    out = compare_files(station_name, station_data, bom_name, bom_data, model, ignore_nc)
+    _, _, df_bom, _, df_station = load_pair(station_name, station_data, bom_name, bom_data, out['model'])
+    with build_report_xlsx(out['results'], df_bom, df_station, meta) as fh:
+        out['report'] = fh.read()
+    return out
+
+
+def init_worker():
+    """工作进程初始化：后台预加载 BOM 库（各进程各自内存映射 Arrow 缓存，原始列共用系统页缓存，聚合结果各自一份）"""
+    bom_library.start_preload()
+
+
+def process_pool(processes):
+    """比对工作进程池：spawn 方式启动（不继承父进程的线程与锁），启动时预加载 BOM 库"""
+    return ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn"),
+                               initializer=init_worker)
@@ -0,0 +1,185 @@
+# src/speculative.py
+"""
+推测执行：文件一上传就在后台线程池解析，映射一确定就按该映射分别预聚合 BOM / 站位表。
+点击比对时多半直接取用已完成的结果，比对本身只剩匹配与检查（见 logic.run_full_comparison 的 prepared 参数）。
+
+- 任务按 (类型, 文件扩展名, 文件内容摘要[, 该侧映射列]) 去重，进程内各会话共享，按 LRU 保留最近 SPECULATIVE_MAX_ENTRIES 个
+- 映射变更后任务键随之改变：同一上传文件尚未开始的旧预聚合任务被取消，已完成的保留（映射改回时直接复用）
+- 取结果时任务仍在排队（线程池被占满）则取消并当场计算，不排队等待；运行中的任务等待其完成，不重复计算
+- 后台线程没有 Streamlit 脚本上下文，不调用 st.*：解析用不含 st.* 的 data_loader.read_table，失败时抛出的 LoadError
+  随任务保存，由前台 load() 在脚本线程中显示（不重复解析）
+- 解析 / 预聚合结果按内容摘要在各会话间共享，返回的是同一对象而非副本：调用方只读，不得原地修改
+"""
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+
+from config.settings import SPECULATIVE_MAX_ENTRIES, SPECULATIVE_WORKERS
+from src import metrics, perf
+from src.data_loader import LoadError, read_table, report_load_error
+from src.logic import BOM_CONFIG_KEYS, STATION_CONFIG_KEYS, prepare_bom, prepare_station
+
+logger = logging.getLogger("smt.speculative")
+
+_PREPARE = {
+    'bom': (prepare_bom, BOM_CONFIG_KEYS),
+    'station': (prepare_station, STATION_CONFIG_KEYS),
+}
+
+_pool = ThreadPoolExecutor(max_workers=SPECULATIVE_WORKERS, thread_name_prefix="smt-speculative")
+_lock = threading.Lock()
+_futures = OrderedDict()   # 任务键 -> Future，按最近使用排序（末尾最新）
+_latest = OrderedDict()    # (side, file_id) -> 该上传文件最近一次提交的预聚合任务键
+_digests = OrderedDict()   # file_id -> 内容摘要，避免每次重跑都对文件内容求哈希
+
+
+def file_digest(file):
+    """上传文件 -> (扩展名, 内容摘要)"""
+    with _lock:
+        digest = _digests.get(file.file_id)
+    if digest is None:
+        digest = (os.path.splitext(file.name)[1].lower(),
+                  hashlib.blake2b(file.getvalue(), digest_size=16).hexdigest())
+        with _lock:
+            _digests[file.file_id] = digest
+            while len(_digests) > SPECULATIVE_MAX_ENTRIES * 4:
+                _digests.popitem(last=False)
+    return digest
+
+
+def _prepare_key(side, file, config):
+    subset = tuple((k, tuple(v) if isinstance(v, list) else v)
+                   for k in _PREPARE[side][1] for v in (config.get(k),))
+    return ('prepare', side) + file_digest(file) + (subset,)
+
+
+def _parse(file):
+    with perf.scope("speculative_parse"):
+        return read_table(file)
+
+
+def _prepare(side, df, config):
+    with perf.scope("speculative_prepare"), perf.stage(f"aggregate_{side}"):
+        return _PREPARE[side][0](df, config)
+
+
+def _evict():
+    while len(_futures) > SPECULATIVE_MAX_ENTRIES:
+        _, fut = _futures.popitem(last=False)
+        fut.cancel()
+
+
+def _submit(key, fn, *args):
+    with _lock:
+        fut = _futures.get(key)
+        if fut is None or fut.cancelled():
+            fut = _futures[key] = _pool.submit(fn, *args)
+            _evict()
+        else:
+            _futures.move_to_end(key)
+        return fut
+
+
+def _resolve(key, fn, *args):
+    """取任务结果；任务不存在、排队中或后台失败时当场计算，成功的结果记入缓存"""
+    with _lock:
+        fut = _futures.get(key)
+    if fut is not None and not fut.cancel():
+        try:
+            result = fut.result()
+            if result is not None:
+                if key[0] == 'parse':
+                    metrics.inc("smt_file_loads_total", path="cache_hit")
+                return result
+        except CancelledError:
+            pass
+        except LoadError:   # 文件本身无法解析：重算结果相同，直接交给调用方
+            raise
+        except Exception as e:
+            logger.warning("speculative %s failed, recomputing: %s", key[0], e)
+    result = fn(*args)
+    if result is not None:
+        done = Future()
+        done.set_result(result)
+        with _lock:
+            _futures[key] = done
+            _futures.move_to_end(key)
+            _evict()
+    return result
+
+
+def submit_parse(file):
+    """文件上传后即调用：后台解析（已提交或已完成时为空操作）"""
+    if file is not None:
+        _submit(('parse',) + file_digest(file), _parse, file)
+
+
+def load(file):
+    """页面取解析结果（替代直接调用 load_excel_secure，只读）；无法解析时在页面上提示并返回 None"""
+    if file is None:
+        return None
+    try:
+        return _resolve(('parse',) + file_digest(file), read_table, file)
+    except LoadError as e:
+        report_load_error(e)
+        return None
+
+
+def load_headless(file):
+    """
+    非 Streamlit 调用方（HTTP 接口等）取解析结果（只读），同样按内容摘要缓存。
+
+    Raises:
+        LoadError: 文件无法解析
+    """
+    if file is None:
+        return None
+    return _resolve(('parse',) + file_digest(file), _parse, file)
+
+
+def submit_prepare(side, file, df, config):
+    """
+    映射确定后即调用：后台按该侧映射预聚合。
+
+    Args:
+        side: 'bom' / 'station'
+        file: 该侧上传文件（用于任务键）
+        df:   该侧解析结果
+    """
+    config = {k: list(v) if isinstance(v, list) else v for k, v in config.items()}
+    key = _prepare_key(side, file, config)
+    owner = (side, file.file_id)
+    with _lock:
+        old = _latest.get(owner)
+        _latest[owner] = key
+        _latest.move_to_end(owner)
+        while len(_latest) > SPECULATIVE_MAX_ENTRIES * 4:
+            _latest.popitem(last=False)
+        # 映射已变更：旧任务若尚未开始则取消
+        if old is not None and old != key:
+            fut = _futures.get(old)
+            if fut is not None and fut.cancel():
+                del _futures[old]
+    _submit(key, _prepare, side, df, config)
+
+
+def prepared(bom_file, df_bom, station_file, df_station, config):
+    """
+    比对时调用：取两侧预聚合结果，供 run_full_comparison / run_changeover_comparison 的 prepared 参数使用。
+
+    Returns:
+        dict: {'bom': ..., 'station': ...}
+    """
+    return {
+        'bom': _resolve(_prepare_key('bom', bom_file, config), _prepare, 'bom', df_bom, config),
+        'station': _resolve(_prepare_key('station', station_file, config), _prepare, 'station', df_station, config),
+    }
+
+
+def stats():
+    with _lock:
+        states = [("done" if f.done() else "running" if f.running() else "pending") for f in _futures.values()]
+    return {s: states.count(s) for s in ("done", "running", "pending")}
@@ -1,182 +1,568 @@
+import contextlib
 import json
 import os
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime
 from config.mappings import ALIAS_CONFIG
 
-DATA_FILE = "system_data.json"
+DB_FILE = "smt_data.db"
+DATA_FILE = "system_data.json"     # 旧版 JSON 存储，首次启动时一次性迁移到 DB_FILE
+SNAPSHOT_DIR = "snapshots"
 RESET_TRIGGER_FILE = "RESET_ADMIN.txt"
 DEFAULT_MAPPINGS = ALIAS_CONFIG
-DEFAULT_DATA = {
-    "inspectors": [],
-    "admin_password": "admin",
-    "mappings": DEFAULT_MAPPINGS
-}
+DEFAULT_PASSWORD = "admin"
+SCHEMA_VERSION = 1
+DB_POOL_SIZE = 4   # 进程内 SQLite 连接数上限
 
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS settings (
+        key   TEXT PRIMARY KEY,
+        value TEXT NOT NULL            -- JSON
+    )""",
+    """CREATE TABLE IF NOT EXISTS inspectors (
+        id         INTEGER PRIMARY KEY AUTOINCREMENT,   -- 保持添加顺序
+        name       TEXT NOT NULL UNIQUE,
+        created_at TEXT NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS mapping_profiles (
+        key          TEXT PRIMARY KEY,  -- "{bom_fp}-{st_fp}"
+        model        TEXT,
+        bom_fp       TEXT NOT NULL,
+        st_fp        TEXT NOT NULL,
+        config       TEXT NOT NULL,     -- JSON
+        confirmed_at TEXT
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_profiles_model ON mapping_profiles(model)",
+    """CREATE TABLE IF NOT EXISTS model_profiles (   -- 机种 -> 最近确认的映射方案
+        model       TEXT PRIMARY KEY,
+        profile_key TEXT NOT NULL REFERENCES mapping_profiles(key) ON DELETE CASCADE
+    )""",
+    """CREATE TABLE IF NOT EXISTS runs (
+        id           INTEGER PRIMARY KEY AUTOINCREMENT,
+        model        TEXT NOT NULL,
+        mode         TEXT,              -- full / changeover
+        bom_file     TEXT,
+        station_file TEXT,
+        total        INTEGER,           -- BOM 项数
+        error_count  INTEGER,
+        result_count INTEGER,
+        duration_ms  REAL,
+        digest       TEXT,
+        started_at   TEXT NOT NULL,
+        work_order   TEXT,              -- 审核通过时补记
+        inspector    TEXT,
+        approved_at  TEXT
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_runs_model_time ON runs(model, started_at)",
+    "CREATE INDEX IF NOT EXISTS idx_runs_time ON runs(started_at)",
+    "CREATE INDEX IF NOT EXISTS idx_runs_work_order ON runs(work_order)",
+    "CREATE INDEX IF NOT EXISTS idx_runs_inspector ON runs(inspector, started_at)",
+    """CREATE TABLE IF NOT EXISTS archive_files (  -- 结果归档（Parquet）文件索引，见 src/archive.py
+        path      TEXT PRIMARY KEY,     -- 相对 ARCHIVE_DIR
+        month     TEXT NOT NULL,        -- YYYY-MM
+        model     TEXT NOT NULL,
+        rows      INTEGER NOT NULL,
+        runs      INTEGER NOT NULL,
+        first_at  TEXT NOT NULL,
+        last_at   TEXT NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_archive_month_model ON archive_files(month, model)",
+]
 
-def load_data():
-    """加载系统数据，处理重置和数据迁移"""
+RUN_FIELDS = ("model", "mode", "bom_file", "station_file", "total", "error_count", "result_count",
+              "duration_ms", "digest", "started_at", "work_order", "inspector", "approved_at")
+
+
+def _now():
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+# --- 数据库连接：进程内一个小的连接池（Streamlit 每次重跑在新线程中执行，不能按线程建连接） ---
+# 连接借出期间只由借用的线程使用；WAL 模式下读不阻塞写、写不阻塞读
+
+_pool_lock = threading.Lock()
+_pool_slots = threading.BoundedSemaphore(DB_POOL_SIZE)
+_idle = []          # [(数据库路径, 连接)]，空闲连接
+_init_lock = threading.Lock()
+_initialized = set()
+
+
+def _connect():
+    conn = sqlite3.connect(DB_FILE, timeout=10, isolation_level=None,   # 事务由 _transaction 显式控制
+                           check_same_thread=False)                       # 借出期间独占，归还后可由其他线程借用
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    with _init_lock:
+        if DB_FILE not in _initialized:
+            _init_db(conn)
+            _initialized.add(DB_FILE)
+    return conn
+
+
+@contextlib.contextmanager
+def _transaction(conn):
+    """写事务：BEGIN IMMEDIATE 立即取得写锁，多进程并发写时排队（busy timeout 10 秒）"""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def _reset_if_requested(conn):
+    """存在重置触发文件时恢复默认（保留核对记录）"""
     if os.path.exists(RESET_TRIGGER_FILE):
         try:
-            data = DEFAULT_DATA.copy()
-            with open(DATA_FILE, "w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False, indent=4)
+            with _transaction(conn):
+                conn.execute("DELETE FROM inspectors")
+                conn.execute("DELETE FROM model_profiles")
+                conn.execute("DELETE FROM mapping_profiles")
+                _set(conn, "admin_password", DEFAULT_PASSWORD)
+                _set(conn, "mappings", DEFAULT_MAPPINGS)
             os.remove(RESET_TRIGGER_FILE)
         except:
             pass
-    
+
+
+@contextlib.contextmanager
+def _db():
+    """
+    借用一个连接（with _db() as conn）：池中最多 DB_POOL_SIZE 个连接，全部借出时等待归还；
+    连接只在首次创建时设置 PRAGMA，用完放回池中复用。
+    """
+    with _pool_slots:
+        path = DB_FILE
+        with _pool_lock:
+            conn = None
+            while _idle and conn is None:
+                idle_path, idle_conn = _idle.pop()
+                if idle_path == path:
+                    conn = idle_conn
+                else:   # 数据库路径已切换（压测等）：旧连接直接关闭
+                    idle_conn.close()
+        if conn is None:
+            conn = _connect()
+        try:
+            _reset_if_requested(conn)
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            with _pool_lock:
+                _idle.append((path, conn))
+
+
+def _init_db(conn):
+    """建表，并在首次启动时从 system_data.json 迁移（只执行一次，多进程同时启动也只有一个执行）"""
+    with _transaction(conn):
+        for stmt in SCHEMA:
+            conn.execute(stmt)
+        conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+        if conn.execute("SELECT 1 FROM settings WHERE key='migrated_from_json'").fetchone() is None:
+            _migrate_json(conn)
+            _set(conn, "migrated_from_json", _now() if os.path.exists(DATA_FILE) else "")
+        conn.execute("INSERT OR IGNORE INTO settings(key, value) VALUES ('admin_password', ?)",
+                     (json.dumps(DEFAULT_PASSWORD),))
+        conn.execute("INSERT OR IGNORE INTO settings(key, value) VALUES ('mappings', ?)",
+                     (json.dumps(DEFAULT_MAPPINGS, ensure_ascii=False),))
+
+
+def _migrate_json(conn):
     if not os.path.exists(DATA_FILE):
-        save_data(DEFAULT_DATA)
-        return DEFAULT_DATA
-    
+        return
     try:
         with open(DATA_FILE, "r", encoding="utf-8") as f:
             data = json.load(f)
-        
-        # 确保必要字段存在
-        if "inspectors" not in data:
-            data["inspectors"] = []
-        if "admin_password" not in data:
-            data["admin_password"] = "admin"
-        if "mappings" not in data:
-            data["mappings"] = DEFAULT_MAPPINGS
-        
-        save_data(data)
-        return data
-    except:
-        return DEFAULT_DATA
+    except (OSError, ValueError):
+        return   # 文件损坏：与旧版一致按默认值启动
+    now = _now()
+    for name in data.get("inspectors", []):
+        conn.execute("INSERT OR IGNORE INTO inspectors(name, created_at) VALUES (?, ?)", (name, now))
+    if "admin_password" in data:
+        _set(conn, "admin_password", data["admin_password"])
+    if isinstance(data.get("mappings"), dict):
+        _set(conn, "mappings", data["mappings"])
+    _replace_profiles(conn, data.get("mapping_profiles", {}), data.get("mapping_profile_models", {}))
+
 
+def _get(conn, key, default=None):
+    row = conn.execute("SELECT value FROM settings WHERE key=?", (key,)).fetchone()
+    return default if row is None else json.loads(row[0])
 
-def save_data(data):
-    """保存系统数据到文件"""
+
+def _set(conn, key, value):
+    conn.execute("INSERT INTO settings(key, value) VALUES (?, ?) "
+                 "ON CONFLICT(key) DO UPDATE SET value=excluded.value WHERE value != excluded.value",
+                 (key, json.dumps(value, ensure_ascii=False)))
+
+
+def _atomic_write(path, text):
+    """先写同目录临时文件再 os.replace：读者只会看到完整的旧文件或新文件"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
     try:
-        with open(DATA_FILE, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=4)
-        return True
-    except:
-        return False
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        for attempt in range(5):
+            try:
+                os.replace(tmp_path, path)
+                break
+            except PermissionError:   # Windows：目标文件正被其它进程读取时短暂重试
+                if attempt == 4:
+                    raise
+                time.sleep(0.05)
+    except BaseException:
+        try: os.remove(tmp_path)
+        except OSError: pass
+        raise
+
 
+# --- 检验员 ---
 
 def get_inspector_list():
     """获取检验员姓名列表"""
-    data = load_data()
-    return data.get("inspectors", [])
+    try:
+        with _db() as conn:
+            return [r[0] for r in conn.execute("SELECT name FROM inspectors ORDER BY id")]
+    except sqlite3.Error:
+        return []
 
 
 def add_inspector(name):
     """添加新的检验员"""
     if not name or not isinstance(name, str):
         return False, "姓名不能为空"
-    
+
     name = name.strip()
     if not name:
         return False, "姓名不能为空"
-    
-    data = load_data()
-    inspectors = data.get("inspectors", [])
-    
-    if name in inspectors:
-        return False, "检验员已存在"
-    
-    inspectors.append(name)
-    data["inspectors"] = inspectors
-    
-    if save_data(data):
-        return True, "成功添加"
-    else:
+
+    try:
+        with _db() as conn, _transaction(conn):
+            cur = conn.execute("INSERT OR IGNORE INTO inspectors(name, created_at) VALUES (?, ?)", (name, _now()))
+    except sqlite3.Error:
         return False, "保存失败"
+    return (True, "成功添加") if cur.rowcount else (False, "检验员已存在")
 
 
 def delete_inspector(name):
     """删除检验员"""
     if not name or not isinstance(name, str):
         return False, "姓名不能为空"
-    
+
     name = name.strip()
-    data = load_data()
-    inspectors = data.get("inspectors", [])
-    
-    if name not in inspectors:
-        return False, "检验员不存在"
-    
-    inspectors.remove(name)
-    data["inspectors"] = inspectors
-    
-    if save_data(data):
-        return True, "成功删除"
-    else:
+    try:
+        with _db() as conn, _transaction(conn):
+            cur = conn.execute("DELETE FROM inspectors WHERE name=?", (name,))
+    except sqlite3.Error:
         return False, "保存失败"
+    return (True, "成功删除") if cur.rowcount else (False, "检验员不存在")
+
 
+# --- 管理员密码 / 字段别名 ---
 
 def verify_admin(pwd):
     """验证后台管理密码"""
-    data = load_data()
-    return data.get("admin_password", "admin") == pwd
+    try:
+        with _db() as conn:
+            return _get(conn, "admin_password", DEFAULT_PASSWORD) == pwd
+    except sqlite3.Error:
+        return pwd == DEFAULT_PASSWORD
 
 
 def update_admin_password(pwd):
     """更新后台管理密码"""
     if not pwd or len(pwd) < 5:
         return False, "密码太短（至少5位）"
-    
-    data = load_data()
-    data["admin_password"] = pwd
-    
-    if save_data(data):
-        return True, "密码更新成功"
-    else:
+    try:
+        with _db() as conn, _transaction(conn):
+            _set(conn, "admin_password", pwd)
+    except sqlite3.Error:
         return False, "保存失败"
+    return True, "密码更新成功"
 
 
 def get_mappings():
-    """获取当前映射配置字典"""
-    data = load_data()
-    mappings = data.get("mappings", DEFAULT_MAPPINGS)
-
-    # 如果存储的映射不是字典（文件被意外修改或损坏），回退到默认并持久化修复
-    if not isinstance(mappings, dict):
-        mappings = DEFAULT_MAPPINGS.copy()
-        data["mappings"] = mappings
-        try:
-            save_data(data)
-        except:
-            pass
-
-    # 确保所有必要的键都存在，如果缺失则用默认值填充并保存修复
-    changed = False
-    for key in DEFAULT_MAPPINGS:
-        if key not in mappings:
-            mappings[key] = DEFAULT_MAPPINGS[key]
-            changed = True
-
-    if changed:
-        data["mappings"] = mappings
-        try:
-            save_data(data)
-        except:
-            pass
-
-    return mappings
+    """获取当前映射配置字典（存储的映射损坏或缺键时用默认值修复并持久化）"""
+    try:
+        with _db() as conn:
+            mappings = _get(conn, "mappings", None)
+            repaired = dict(mappings) if isinstance(mappings, dict) else {}
+            for key in DEFAULT_MAPPINGS:
+                repaired.setdefault(key, DEFAULT_MAPPINGS[key])
+            if repaired != mappings:
+                try:
+                    with _transaction(conn):
+                        _set(conn, "mappings", repaired)
+                except sqlite3.Error:
+                    pass
+    except sqlite3.Error:
+        return dict(DEFAULT_MAPPINGS)
+    return repaired
 
 
 def update_mappings(new_mappings):
     """更新映射配置"""
     if not isinstance(new_mappings, dict):
         return False, "映射必须是字典类型"
-    
-    data = load_data()
-    data["mappings"] = new_mappings
-    
-    if save_data(data):
-        return True, "映射更新成功"
-    else:
+    try:
+        with _db() as conn, _transaction(conn):
+            _set(conn, "mappings", new_mappings)
+    except sqlite3.Error:
         return False, "保存失败"
+    return True, "映射更新成功"
 
 
 def reset_mappings():
     """重置映射配置为默认值"""
-    data = load_data()
-    data["mappings"] = DEFAULT_MAPPINGS
-    
-    if save_data(data):
-        return True, "映射已重置为默认值"
-    else:
-        return False, "保存失败"
\ No newline at end of file
+    try:
+        with _db() as conn, _transaction(conn):
+            _set(conn, "mappings", DEFAULT_MAPPINGS)
+    except sqlite3.Error:
+        return False, "保存失败"
+    return True, "映射已重置为默认值"
+
+
+# --- 映射方案 ---
+
+def _profile(row):
+    return {"model": row["model"], "bom_fp": row["bom_fp"], "st_fp": row["st_fp"],
+            "config": json.loads(row["config"]), "confirmed_at": row["confirmed_at"]}
+
+
+def get_mapping_profile(bom_fp, st_fp, model_id=None):
+    """
+    查找已确认的映射方案：先按 BOM/站位表 表头指纹精确命中，再按机种编号回退。
+
+    Returns:
+        dict | None: {'model', 'bom_fp', 'st_fp', 'config', 'confirmed_at', 'match'}，match 为 "fingerprint" / "model"
+    """
+    try:
+        with _db() as conn:
+            row = conn.execute("SELECT * FROM mapping_profiles WHERE key=?", (f"{bom_fp}-{st_fp}",)).fetchone()
+            if row is not None:
+                return dict(_profile(row), match="fingerprint")
+            if model_id:
+                row = conn.execute("SELECT p.* FROM model_profiles m JOIN mapping_profiles p ON p.key = m.profile_key "
+                                   "WHERE m.model=?", (model_id,)).fetchone()
+                if row is not None:
+                    return dict(_profile(row), match="model")
+    except sqlite3.Error:
+        pass
+    return None
+
+
+def save_mapping_profile(model_id, bom_fp, st_fp, config, confirmed_at=""):
+    """保存（覆盖）该表头组合的映射方案，并记为该机种的最近方案；内容未变化时不写入"""
+    key = f"{bom_fp}-{st_fp}"
+    config_json = json.dumps(config, ensure_ascii=False)
+    try:
+        with _db() as conn:
+            row = conn.execute("SELECT p.model, p.config, m.profile_key FROM mapping_profiles p "
+                               "LEFT JOIN model_profiles m ON m.model = p.model WHERE p.key=?", (key,)).fetchone()
+            if row is not None and row["config"] == config_json and row["model"] == model_id and row["profile_key"] == key:
+                return True, "映射方案未变化"
+            with _transaction(conn):
+                conn.execute("INSERT INTO mapping_profiles(key, model, bom_fp, st_fp, config, confirmed_at) "
+                             "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(key) DO UPDATE SET "
+                             "model=excluded.model, config=excluded.config, confirmed_at=excluded.confirmed_at",
+                             (key, model_id, bom_fp, st_fp, config_json, confirmed_at))
+                if model_id:
+                    conn.execute("INSERT OR REPLACE INTO model_profiles(model, profile_key) VALUES (?, ?)",
+                                 (model_id, key))
+    except sqlite3.Error:
+        return False, "保存失败"
+    return True, "映射方案已保存"
+
+
+def list_mapping_profiles():
+    """所有映射方案 {key: profile}"""
+    try:
+        with _db() as conn:
+            return {r["key"]: _profile(r) for r in conn.execute("SELECT * FROM mapping_profiles ORDER BY confirmed_at")}
+    except sqlite3.Error:
+        return {}
+
+
+def _replace_profiles(conn, profiles, model_index):
+    model_index = {m: k for m, k in model_index.items() if k in profiles}
+    conn.execute("DELETE FROM model_profiles")
+    conn.execute("DELETE FROM mapping_profiles")
+    for key, p in profiles.items():
+        conn.execute("INSERT INTO mapping_profiles(key, model, bom_fp, st_fp, config, confirmed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                     (key, p.get("model"), p.get("bom_fp", ""), p.get("st_fp", ""),
+                      json.dumps(p.get("config", {}), ensure_ascii=False), p.get("confirmed_at", "")))
+        if p.get("model") and p["model"] not in model_index:
+            model_index[p["model"]] = key
+    conn.executemany("INSERT INTO model_profiles(model, profile_key) VALUES (?, ?)", model_index.items())
+
+
+def update_mapping_profiles(profiles):
+    """整体替换映射方案（管理员编辑/删除后保存）；机种索引中失效的条目一并清理"""
+    if not isinstance(profiles, dict):
+        return False, "映射方案必须是字典类型"
+    try:
+        with _db() as conn, _transaction(conn):
+            model_index = {r[0]: r[1] for r in conn.execute("SELECT model, profile_key FROM model_profiles")}
+            _replace_profiles(conn, profiles, model_index)
+    except sqlite3.Error:
+        return False, "保存失败"
+    return True, "映射方案已更新"
+
+
+# --- 核对记录 ---
+
+def record_run(**fields):
+    """
+    记录一次比对（字段见 RUN_FIELDS，未给出 started_at 时取当前时间）。
+
+    Returns:
+        int | None: 记录 ID，写入失败时为 None
+    """
+    fields = {k: v for k, v in fields.items() if k in RUN_FIELDS}
+    fields.setdefault("started_at", _now())
+    cols = ", ".join(fields)
+    try:
+        with _db() as conn, _transaction(conn):
+            cur = conn.execute(f"INSERT INTO runs({cols}) VALUES ({', '.join('?' * len(fields))})",
+                               tuple(fields.values()))
+        return cur.lastrowid
+    except sqlite3.Error:
+        return None
+
+
+def update_run(run_id, **fields):
+    """补记核对记录（如审核通过时的订单号 / 检验人 / 审核时间）"""
+    fields = {k: v for k, v in fields.items() if k in RUN_FIELDS}
+    if not run_id or not fields:
+        return False
+    try:
+        with _db() as conn, _transaction(conn):
+            conn.execute(f"UPDATE runs SET {', '.join(f'{k}=?' for k in fields)} WHERE id=?",
+                         (*fields.values(), run_id))
+        return True
+    except sqlite3.Error:
+        return False
+
+
+def list_runs(model=None, work_order=None, inspector=None, since=None, limit=100):
+    """按条件查询核对记录（新的在前），各条件均走索引"""
+    where, args = [], []
+    for col, val in (("model", model), ("work_order", work_order), ("inspector", inspector)):
+        if val:
+            where.append(f"{col}=?"); args.append(val)
+    if since:
+        where.append("started_at>=?"); args.append(since)
+    sql = "SELECT * FROM runs" + (f" WHERE {' AND '.join(where)}" if where else "") + " ORDER BY started_at DESC, id DESC LIMIT ?"
+    try:
+        with _db() as conn:
+            return [dict(r) for r in conn.execute(sql, (*args, limit))]
+    except sqlite3.Error:
+        return []
+
+
+# --- 结果归档文件索引 ---
+
+ARCHIVE_FIELDS = ("path", "month", "model", "rows", "runs", "first_at", "last_at")
+
+
+def add_archive_file(**entry):
+    """登记一个归档文件（字段见 ARCHIVE_FIELDS）"""
+    with _db() as conn, _transaction(conn):
+        conn.execute(f"INSERT OR REPLACE INTO archive_files({', '.join(ARCHIVE_FIELDS)}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                     tuple(entry[k] for k in ARCHIVE_FIELDS))
+
+
+def list_archive_files(since=None, until=None, models=None, month=None):
+    """
+    按时间范围 / 机种 / 月份查询归档文件（走 month, model 索引，只返回时间上有交集的文件）。
+
+    Args:
+        since / until: 'YYYY-MM-DD HH:MM:SS'（含），None 为不限
+    """
+    where, args = [], []
+    if since:
+        where.append("month>=? AND last_at>=?"); args += [since[:7], since]
+    if until:
+        where.append("month<=? AND first_at<=?"); args += [until[:7], until]
+    if month:
+        where.append("month=?"); args.append(month)
+    if models:
+        where.append(f"model IN ({', '.join('?' * len(models))})"); args += list(models)
+    sql = "SELECT * FROM archive_files" + (f" WHERE {' AND '.join(where)}" if where else "") + " ORDER BY month, model, path"
+    try:
+        with _db() as conn:
+            return [dict(r) for r in conn.execute(sql, args)]
+    except sqlite3.Error:
+        return []
+
+
+def list_archive_models():
+    """归档中出现过的机种"""
+    try:
+        with _db() as conn:
+            return [r[0] for r in conn.execute("SELECT DISTINCT model FROM archive_files ORDER BY model")]
+    except sqlite3.Error:
+        return []
+
+
+def archive_partitions(before_month=None, min_files=2):
+    """文件数不少于 min_files 的分区 [(month, model)]；before_month 只取该月之前（已结束的月份）"""
+    sql = "SELECT month, model FROM archive_files" + (" WHERE month<?" if before_month else "") + \
+          " GROUP BY month, model HAVING COUNT(*)>=? ORDER BY month, model"
+    try:
+        with _db() as conn:
+            return [tuple(r) for r in conn.execute(sql, (before_month, min_files) if before_month else (min_files,))]
+    except sqlite3.Error:
+        return []
+
+
+def replace_archive_files(old_paths, **entry):
+    """
+    合并归档文件后替换索引：old_paths 须仍全部在索引中（否则说明已被其他进程合并），成功返回 True。
+    """
+    with _db() as conn, _transaction(conn):
+        marks = ", ".join("?" * len(old_paths))
+        found = conn.execute(f"SELECT COUNT(*) FROM archive_files WHERE path IN ({marks})", tuple(old_paths)).fetchone()[0]
+        if found != len(old_paths):
+            return False
+        conn.execute(f"DELETE FROM archive_files WHERE path IN ({marks})", tuple(old_paths))
+        conn.execute(f"INSERT INTO archive_files({', '.join(ARCHIVE_FIELDS)}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                     tuple(entry[k] for k in ARCHIVE_FIELDS))
+    return True
+
+
+# --- 审核基线快照（每个机种一个 JSON 文件） ---
+
+def save_result_snapshot(model_id, snapshot):
+    """保存机种最近一次审核通过的结果快照（每个机种一个文件，覆盖旧快照）"""
+    if not model_id:
+        return False, "机种编号为空"
+    try:
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        _atomic_write(os.path.join(SNAPSHOT_DIR, f"{model_id}.json"),
+                      json.dumps(snapshot, ensure_ascii=False, separators=(",", ":")))
+        return True, "已保存为审核基线"
+    except Exception as e:
+        return False, f"保存失败: {e}"
+
+
+def load_result_snapshot(model_id):
+    """读取机种最近一次审核通过的结果快照，不存在时返回 None"""
+    path = os.path.join(SNAPSHOT_DIR, f"{model_id}.json") if model_id else None
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except:
+        return None
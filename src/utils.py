@@ -1,9 +1,14 @@
 # src/utils.py
-import pandas as pd
+import os
 import re
 import socket
+import tempfile
 import hashlib
-from config.settings import SPLIT_PATTERN, SPEC_PATTERNS
+import hmac
+from config.settings import SPLIT_PATTERN, SPEC_PATTERNS, SLOT_PATTERNS, EXPORT_SIGNING_KEY
+from src.lazy import lazy_import
+
+pd = lazy_import("pandas")
 
 # --- 基础清洗 ---
 def clean_text(text):
@@ -85,6 +90,38 @@ def guess_column_names(cols, keys, exclude_keys=None):
     
     return matched_cols
 
+def guess_mapping(b_cols, s_cols, aliases):
+    """
+    按别名猜测整套映射（与映射面板的默认选项一致）
+
+    Returns:
+        dict: config_map，键同 run_smt_comparison 的 config
+    """
+    from config.mappings import EXCLUDE_QTY_KEYWORDS
+
+    def first_or_none(cols, keys):
+        found = guess_column_names(cols, keys)
+        return found[0] if found else None
+
+    idx_sub = guess_column_index(b_cols, aliases['BOM_SUB'])
+    has_sub = idx_sub < len(b_cols) and any(k in b_cols[idx_sub] for k in ["替代", "Sub"])
+    return {
+        'bom_pn': b_cols[min(guess_column_index(b_cols, aliases['BOM_PN']), len(b_cols) - 1)],
+        'bom_ref': guess_column_names(b_cols, aliases['BOM_REF'], exclude_keys=EXCLUDE_QTY_KEYWORDS),
+        'bom_sub': b_cols[idx_sub] if has_sub and idx_sub else None,
+        'bom_desc': b_cols[guess_column_index(b_cols, aliases['BOM_DESC'])],
+        'st_pn': s_cols[min(guess_column_index(s_cols, aliases['ST_PN']), len(s_cols) - 1)],
+        'st_ref': guess_column_names(s_cols, aliases['ST_REF'], exclude_keys=EXCLUDE_QTY_KEYWORDS),
+        'st_slot': s_cols[guess_column_index(s_cols, aliases['ST_SLOT'])],
+        'st_desc': s_cols[guess_column_index(s_cols, aliases['ST_DESC'])],
+        'bom_qty': first_or_none(b_cols, aliases.get('BOM_QTY', [])),
+        'st_qty': first_or_none(s_cols, aliases.get('ST_QTY', [])),
+    }
+
+def header_fingerprint(cols):
+    """表头指纹：有序列名的哈希，同一客户/同一导出模板的文件指纹相同"""
+    return hashlib.sha256("\x1f".join(str(c) for c in cols).encode('utf-8')).hexdigest()[:16]
+
 # --- [v5.0] 规格提取逻辑 ---
 def extract_specs(text):
     """提取封装、耐压等参数"""
@@ -109,6 +146,36 @@ def check_spec_conflict(bom_desc, st_desc):
     if conflicts: return True, " | ".join(conflicts)
     return False, ""
 
+# --- 站位号结构解析 ---
+_SLOT_REGEXES = [re.compile(p) for p in SLOT_PATTERNS]
+
+def parse_slot(slot):
+    """
+    站位号 -> (machine, table, lane, sub)，无法匹配 SLOT_PATTERNS 时返回 None
+
+    Example:
+        "1-2-15-L" -> ('1', '2', 15, 'L');  "6" -> ('', '', 6, '')
+    """
+    text = clean_text(slot)
+    if not text: return None
+    for regex in _SLOT_REGEXES:
+        match = regex.match(text)
+        if match:
+            parts = match.groupdict()
+            return (parts.get('machine') or '', parts.get('table') or '',
+                    int(parts['lane']), parts.get('sub') or '')
+    return None
+
+def slot_sort_key(slot_str):
+    """按物理站位顺序排序的键：取逗号分隔的首个站位，无法解析的排在最后"""
+    first = str(slot_str or "").split(",")[0]
+    key = parse_slot(first)
+    if key is None: return (1, ('', '', 0, ''), first)
+    machine, table, lane, sub = key
+    # 机台/料台按自然顺序比较（"M2" < "M10"）
+    natural = lambda s: (len(s), s)
+    return (0, (natural(machine), natural(table), lane, sub), first)
+
 # --- [v5.1] 追溯与安全 ---
 def get_machine_info():
     try:
@@ -117,9 +184,40 @@ def get_machine_info():
         return f"{hostname} ({ip})"
     except: return "Unknown Device"
 
+def new_signer():
+    """增量签名器（update/hexdigest）：配置了 EXPORT_SIGNING_KEY 时为 HMAC-SHA256，否则为 SHA-256"""
+    if EXPORT_SIGNING_KEY:
+        return hmac.new(EXPORT_SIGNING_KEY.encode('utf-8'), digestmod=hashlib.sha256)
+    return hashlib.sha256()
+
 def generate_signature(data_str):
-    """生成防篡改 MD5 指纹"""
-    return hashlib.md5(data_str.encode('utf-8')).hexdigest()[:16].upper()
+    """生成防篡改指纹（SHA-256 / HMAC-SHA256 前 16 位）"""
+    signer = new_signer()
+    signer.update(data_str.encode('utf-8'))
+    return signer.hexdigest()[:16].upper()
+
+def open_temporary(path):
+    """只读打开临时文件，关闭后即删除（POSIX 打开后立即 unlink；Windows 以 O_TEMPORARY 打开，由系统在关闭时删除）"""
+    if os.name == "nt":
+        return open(path, "rb", opener=lambda p, flags: os.open(p, flags | os.O_TEMPORARY))
+    fh = open(path, "rb")
+    os.unlink(path)
+    return fh
+
+def temp_output(write, suffix=""):
+    """
+    write(fh) 写入磁盘临时文件，返回 (只读文件对象, write 的返回值)。
+    文件对象为定位到开头的 io.BufferedReader（可直接交给 download_button 或分块发送），内容不在内存中另存 bytes 副本；关闭后文件即删除。
+    """
+    fd, path = tempfile.mkstemp(prefix="smt_", suffix=suffix)
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            result = write(fh)
+        return open_temporary(path), result
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
 
 # --- [核心修复] 补全缺失的函数 ---
 def extract_file_id(filename):
@@ -0,0 +1,105 @@
+# tests/test_api.py
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+import pytest
+
+import api
+from src.result_store import STORE
+
+BOM = "料号,位号\nA,R1 R2\nB,C1\n".encode("utf-8")
+STATION = "元件名,位号,站位\nA,R1 R2,1-1\nB,C1,1-2\n".encode("utf-8")
+
+
+@pytest.fixture(scope="module")
+def base_url(tmp_path_factory):
+    # 数据库、归档等相对路径落在临时目录（工作进程继承当前目录）
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("api"))
+    httpd = api.start("127.0.0.1", 0, 1)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+    api.stop(httpd)
+    os.chdir(cwd)
+
+
+def _request(url, data=None, method=None, headers=None):
+    req = urllib.request.Request(url, data=data, method=method, headers=headers or {})
+    try:
+        with urllib.request.urlopen(req, timeout=30) as resp:
+            return resp.status, resp.headers, resp.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read()
+
+
+def _multipart(files):
+    boundary = uuid.uuid4().hex
+    body = b"".join(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{name}"\r\n\r\n'.encode("utf-8")
+        + data + b"\r\n" for field, (name, data) in files.items())
+    return body + f"--{boundary}--\r\n".encode(), {"Content-Type": f"multipart/form-data; boundary={boundary}"}
+
+
+def _compare(base_url):
+    body, headers = _multipart({"station": ("8088_ST.csv", STATION), "bom": ("8088_BOM.csv", BOM)})
+    status, _, data = _request(f"{base_url}/api/compare", body, headers=headers)
+    assert status == 202
+    return json.loads(data)["id"]
+
+
+def _wait(base_url, job_id):
+    for _ in range(300):
+        job = json.loads(_request(f"{base_url}/api/jobs/{job_id}")[2])
+        if job["state"] not in ("queued", "running"):
+            return job
+        time.sleep(0.1)
+    raise AssertionError("任务未结束")
+
+
+def test_compare_poll_result_delete(base_url):
+    job_id = _compare(base_url)
+    job = _wait(base_url, job_id)
+    assert job["state"] == "done" and job["result"]["total"] == 2
+    assert "handle" not in job["result"] and "_files" not in job["result"]
+
+    status, _, data = _request(f"{base_url}/api/jobs/{job_id}/result")
+    assert status == 200 and len(json.loads(data)["results"]) > 0
+    status, headers, data = _request(f"{base_url}/api/jobs/{job_id}/result?format=csv")
+    assert status == 200 and headers["Content-Type"].startswith("text/csv") and data.startswith(b"# ")
+    status, headers, data = _request(f"{base_url}/api/jobs/{job_id}/result?format=xlsx&wo_number=WO1")
+    assert status == 200 and data[:2] == b"PK" and int(headers["Content-Length"]) == len(data)
+
+    out = api._jobs.get(job_id).result
+    files = [path for _, path in out['_files']]
+    assert all(os.path.exists(p) for p in files)
+    status, _, data = _request(f"{base_url}/api/jobs/{job_id}", method="DELETE")
+    assert status == 200 and json.loads(data)["deleted"] is True
+    # 结果集与暂存的上传文件随删除释放
+    assert STORE.frame(out['handle']) is None
+    assert not any(os.path.exists(p) for p in files)
+    assert _request(f"{base_url}/api/jobs/{job_id}")[0] == 404
+
+
+def test_token_required(base_url, monkeypatch):
+    monkeypatch.setattr(api, "API_TOKEN", "secret")
+    assert _request(f"{base_url}/api/health")[0] == 401
+    assert _request(f"{base_url}/api/health", headers={"Authorization": "Bearer wrong"})[0] == 401
+    assert _request(f"{base_url}/api/health", headers={"Authorization": "Bearer secret"})[0] == 200
+
+
+def test_unknown_paths_and_jobs(base_url):
+    assert _request(f"{base_url}/api/nowhere")[0] == 404
+    assert _request(f"{base_url}/api/jobs/0123456789ab")[0] == 404
+    assert _request(f"{base_url}/api/jobs/0123456789ab", method="DELETE")[0] == 404
+
+
+def test_upload_too_large(base_url, monkeypatch):
+    monkeypatch.setattr(api, "API_MAX_UPLOAD_MB", 0)
+    body, headers = _multipart({"station": ("8088_ST.csv", STATION)})
+    assert _request(f"{base_url}/api/compare", body, headers=headers)[0] == 413
@@ -0,0 +1,50 @@
+# tests/test_bom_library.py
+import os
+
+import pytest
+
+from src import bom_library
+
+
+@pytest.fixture
+def library(tmp_path, monkeypatch):
+    monkeypatch.setattr(bom_library, "BOM_LIBRARY_DIR", str(tmp_path))
+    monkeypatch.setattr(bom_library, "_signature", None)
+    monkeypatch.setattr(bom_library, "_index", {})
+    return tmp_path
+
+
+def _bom(text):
+    return f"编号,位置号1\n{text},R1\n".encode("utf-8")
+
+
+def test_replace_then_remove_leaves_no_older_bom(library):
+    # 同一机种、不同文件名的旧版 BOM（例如手工放入的）
+    old = library / "8088_BOM_v1.csv"
+    old.write_bytes(_bom("OLD"))
+    os.utime(old, (1, 1))
+    assert bom_library.lookup("8088").name == "8088_BOM_v1.csv"
+
+    ok, _ = bom_library.add("8088", "8088_BOM_v2.csv", _bom("NEW"))
+    assert ok
+    assert sorted(os.listdir(library)) == ["8088_BOM_v2.csv"]
+    assert bom_library.lookup("8088").name == "8088_BOM_v2.csv"
+
+    ok, _ = bom_library.remove("8088")
+    assert ok
+    assert bom_library.lookup("8088") is None
+
+
+def test_remove_deletes_every_file_and_cache_of_the_model(library):
+    for name in ("8088_A.csv", "8088_B.csv", "9001_BOM.csv"):
+        (library / name).write_bytes(_bom(name))
+    cache = library / bom_library.CACHE_DIR
+    cache.mkdir()
+    (cache / "8088-deadbeef.arrow").write_bytes(b"")
+
+    ok, _ = bom_library.remove("8088")
+    assert ok
+    assert bom_library.lookup("8088") is None            # 不会退回到另一个旧文件
+    assert bom_library.lookup("9001").name == "9001_BOM.csv"
+    assert not (cache / "8088-deadbeef.arrow").exists()
+    assert bom_library.remove("8088")[0] is False
@@ -0,0 +1,66 @@
+# tests/test_exports.py
+import io
+import json
+
+import pytest
+
+from src.exports import build_export, verify_export
+
+RESULTS = [
+    {"级别": "🔴 严重", "核对结果": "缺料", "原始行号": "BOM: 2", "BOM料号": "A", "差异说明": "❌", "站位号": "",
+     "BOM数量": 2, "实际数量": 0},
+    {"级别": "🟢 正常", "核对结果": "通过", "原始行号": "BOM: 3", "BOM料号": "B", "差异说明": "匹配成功",
+     "站位号": "1-1-1", "BOM数量": 1, "实际数量": 1},
+]
+META = {'model': "8088", 'wo_number': "WO-1", 'inspector': "张三", 'wo_qty': "100", 'check_time': "2026-01-01"}
+
+
+@pytest.mark.parametrize("fmt", ["csv", "jsonl", "parquet"])
+def test_export_verifies(fmt):
+    if fmt == "parquet":
+        pytest.importorskip("pyarrow")
+    data, _ = build_export(fmt, RESULTS, META)
+    assert verify_export(data, fmt)
+
+
+def _patch_footer(data, old, new):
+    """只改 footer：替换 smt_meta 中等长的一段文本（文件尾键值与 Arrow schema 两处都改），行数据不动"""
+    import base64
+    import struct
+    pq = pytest.importorskip("pyarrow.parquet")
+    assert len(old) == len(new)
+    footer_len = struct.unpack('<I', data[-8:-4])[0]
+    body, footer = data[:len(data) - 8 - footer_len], data[len(data) - 8 - footer_len:-8]
+    arrow_schema = pq.read_metadata(io.BytesIO(data)).metadata[b'ARROW:schema']
+    patched_schema = base64.b64encode(base64.b64decode(arrow_schema).replace(old, new))
+    footer = footer.replace(arrow_schema, patched_schema).replace(old, new)
+    return body + footer + data[-8:]
+
+
+def test_parquet_metadata_tamper_detected():
+    pq = pytest.importorskip("pyarrow.parquet")
+    data, _ = build_export("parquet", RESULTS, META)
+    old, new = "张三".encode('utf-8'), "李四".encode('utf-8')
+    tampered = _patch_footer(data, old, new)
+    assert json.loads(pq.read_schema(io.BytesIO(tampered)).metadata[b'smt_meta'])['inspector'] == "李四"
+    assert not verify_export(tampered, "parquet")
+    assert not verify_export(_patch_footer(data, b"WO-1", b"WO-2"), "parquet")
+
+
+def _rewrite_parquet(data, edit_table):
+    """读出、改行数据后重写（保留原元数据与签名）"""
+    pq = pytest.importorskip("pyarrow.parquet")
+    table = pq.read_table(io.BytesIO(data))
+    out = io.BytesIO()
+    pq.write_table(edit_table(table), out, compression='zstd')
+    return out.getvalue()
+
+
+def test_parquet_row_tamper_detected():
+    pa = pytest.importorskip("pyarrow")
+    data, _ = build_export("parquet", RESULTS, META)
+
+    def edit(table):
+        i = table.schema.get_field_index("核对结果")
+        return table.set_column(i, table.schema.field(i), pa.array(["通过", "通过"]))
+    assert not verify_export(_rewrite_parquet(data, edit), "parquet")
@@ -0,0 +1,95 @@
+# tests/test_logic.py
+import pandas as pd
+
+from src.logic import run_changeover_comparison, run_full_comparison
+
+CONFIG = {'bom_pn': "料号", 'bom_ref': ["位号"], 'bom_sub': None, 'bom_desc': None, 'bom_qty': None,
+          'st_pn': "元件名", 'st_ref': ["位号"], 'st_slot': "站位", 'st_desc': None, 'st_qty': None}
+
+
+def _bom(rows):
+    return pd.DataFrame(rows, columns=["料号", "位号"])
+
+
+def _station(rows):
+    return pd.DataFrame(rows, columns=["元件名", "位号", "站位"])
+
+
+def test_changeover_reuse_points_at_new_program():
+    bom = _bom([["A", "R1,R2"], ["B", "C1"]])
+    prev = _station([["A", "R1,R2", "1-1-1"], ["B", "C1", "1-1-2"], ["X", "U9", "1-1-3"]])
+    _, _, _, baseline = run_full_comparison(bom, prev, CONFIG)
+
+    # 在最前面插入一个新料号：A / X 的料号集合未变，但所在行后移
+    new = _station([["C", "C2", "1-1-5"], ["A", "R1,R2", "1-1-1"], ["B", "C1", "1-1-2"], ["X", "U9", "1-1-3"]])
+    new_bom = _bom([["Z", "Q1"], ["A", "R1,R2"], ["B", "C1"]])
+    results, _, _, changeover = run_changeover_comparison(new_bom, new, CONFIG, baseline)
+
+    by_pn = {r["BOM料号"]: (i, r) for i, r in enumerate(results) if r["原始行号"].startswith("BOM:")}
+    i, a = by_pn["A"]
+    assert i not in changeover['reverified']
+    assert a["原始行号"] == "BOM: 3" and a["站位号"] == "1-1-1"
+    extra = next(r for r in results if r["核对结果"] == "错料/多余" and r["差异说明"].endswith(": X"))
+    assert extra["原始行号"].startswith("Station: 5")
+
+
+def test_quantity_check_dedupes_refs_and_names_the_part():
+    from src.logic import check_quantities
+    bom = pd.DataFrame({"料号": ["3.00E+13", "B"], "位号": ["R1,R2,R1", "C1 C2"], "数量": ["2", "3"]})
+    results = check_quantities(bom, "数量", ["位号"], "BOM", "料号")
+    # 重复位号与比对口径一致只计一次：第一行 2 = 2 不报
+    assert len(results) == 1
+    r = results[0]
+    assert r["BOM料号"] == "B" and r["BOM数量"] == 3 and r["实际数量"] == 2 and r["原始行号"] == "BOM: 3"
+
+
+def test_quantity_check_station_total_spans_both_sides():
+    from src.logic import check_quantities
+    station = pd.DataFrame({"元件名": ["A", "B"], "位号1": ["R1,R2", "C1"], "位号2": ["R3", None],
+                            "总数": [3, 2]})
+    results = check_quantities(station, "总数", ["位号1", "位号2"], "Station", "元件名")
+    assert [(r["BOM料号"], r["BOM数量"], r["实际数量"]) for r in results] == [("B", 2, 1)]
+
+
+def _conflicts(rows):
+    _, _, _, baseline = run_full_comparison(_bom([["A", "R1"]]), _station(rows), CONFIG)
+    return {(e['segment'], e['slot']): e['pns'] for e in baseline['slot_index'].values() if len(e['pns']) > 1}
+
+
+def test_parse_slot_formats():
+    from src.utils import parse_slot
+    assert parse_slot("6") == ('', '', 6, '')
+    assert parse_slot("1-2-15-L") == ('1', '2', 15, 'L')
+    assert parse_slot("m1_t2_15") == ('M1', 'T2', 15, '')
+    assert parse_slot("R-08L") == ('', 'R', 8, 'L')
+    assert parse_slot("") is None and parse_slot("??") is None
+
+
+def test_slot_index_sorted_program_has_no_conflict():
+    assert _conflicts([["A", "R1", "1"], ["B", "R2", "2"], ["C", "R3", "3"]]) == {}
+
+
+def test_slot_index_unsorted_program_still_reports_conflict():
+    # 站位号无序：5, 3, 5 —— 两个 5 号站位必须落在同一段并报冲突
+    assert _conflicts([["A", "R1", "5"], ["B", "R2", "3"], ["C", "R3", "5"]]) == {(1, "5"): ["A", "C"]}
+
+
+def test_slot_index_multi_machine_program_split_on_header_rows():
+    rows = [["A", "R1", "1"], ["B", "R2", "2"],
+            ["元件名", "位号", "站位"],              # 第二台机的表头行
+            ["C", "R3", "1"], ["D", "R4", "2"], ["E", "R5", "2"]]
+    assert _conflicts(rows) == {(2, "2"): ["D", "E"]}
+    # 带机台/料台的站位号本身可区分，不分段
+    assert _conflicts([["A", "R1", "1-1-1"], ["B", "R2", "2-1-1"], ["C", "R3", "1-1-1"]]) == {(0, "1-1-1"): ["A", "C"]}
+
+
+def test_snapshot_round_trips_through_result_store():
+    from src.logic import build_result_snapshot, check_quantities, diff_result_snapshots
+    from src.result_store import _compact, frame_to_records
+    # 同列混有 2.5 时列式化会把整数数量升为 float64，快照哈希不应因此变化
+    bom = pd.DataFrame({"料号": ["A", "B"], "位号": ["R1 R2 R3", "C1 C2"], "数量": ["2", "2.5"]})
+    results = check_quantities(bom, "数量", ["位号"], "BOM", "料号")
+    stored = frame_to_records(_compact(results))
+    assert stored[0]["BOM数量"] == 2.0
+    assert build_result_snapshot(stored) == build_result_snapshot(results)
+    assert diff_result_snapshots(build_result_snapshot(stored), results) == []
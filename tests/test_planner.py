@@ -0,0 +1,19 @@
+# tests/test_planner.py
+from src.planner import plan_changeover
+
+
+def _index(slots):
+    return {(1, slot): {'pns': pns} for slot, pns in slots.items()}
+
+
+def test_conflicting_slots_are_left_out_and_listed():
+    out_index = _index({"1-1": ["A"], "1-2": ["B", "X"], "1-3": ["C"]})
+    in_index = _index({"1-1": ["A"], "1-2": ["B"], "1-4": ["C"]})
+    plan = plan_changeover(out_index, in_index)
+    summary = plan['summary']
+    assert summary['保留'] == 1 and summary['移位'] == 1 and summary['冲突'] == 1
+    # 冲突站位的 B 既不算保留也不生成上料
+    assert summary['上料'] == 0 and summary['下料'] == 0
+    rows = [r for r in plan['pick_list'] if r['动作'] == "人工确认"]
+    assert len(rows) == 1
+    assert rows[0]['料号'] == "B/X" and rows[0]['原站位'] == "1-2" and "站位冲突" in rows[0]['说明']
@@ -0,0 +1,67 @@
+# tests/test_result_store.py
+import os
+import time
+
+import numpy as np
+
+from src.result_store import ResultStore
+
+
+def _results(n, tag):
+    return [{"级别": "🟢 正常", "BOM料号": f"{tag}{i}", "差异说明": f"row {i} " * 4} for i in range(n)]
+
+
+def _view(frame):
+    return {'frame': frame, 'order': np.arange(len(frame) * 50)}
+
+
+def test_derived_views_count_against_budget(tmp_path):
+    store = ResultStore(10 ** 9, str(tmp_path))
+    h = store.put(_results(100, "A"))
+    before = store._resident_bytes
+    view = store.derived(h, 'view', _view)
+    assert store._resident_bytes == before + view['order'].nbytes   # 共享的 frame 不重复计算
+    store.drop(h)
+    assert store._resident_bytes == 0
+
+
+def test_derived_views_dropped_before_spilling(tmp_path):
+    store = ResultStore(10 ** 9, str(tmp_path))
+    a = store.put(_results(100, "A"))
+    store.derived(a, 'view', _view)
+    b = store.put(_results(100, "B"))
+    # 预算只够两份结果集本身：先丢 A 的派生数据，两份结果集都不必落盘
+    store.budget_bytes = store._entries[a].nbytes + store._entries[b].nbytes
+    store.derived(b, 'view', lambda f: {'frame': f})
+    store._enforce_budget(keep=b)
+    assert store.stats()['resident'] == 2 and store._entries[a].derived == {}
+    assert store._resident_bytes <= store.budget_bytes
+    assert store.derived(a, 'view', _view)['order'].shape == (5000,)   # 按需重建
+
+
+def test_stores_sharing_a_directory_keep_each_others_spills(tmp_path):
+    a = ResultStore(1, str(tmp_path))
+    first = a.put(_results(50, "A"))
+    a.put(_results(50, "B"))                         # 超出预算：first 落盘
+    assert a._entries[first].frame is None and os.path.exists(a._entries[first].path)
+
+    b = ResultStore(1, str(tmp_path))                # 同目录启动另一个进程的存储
+    b.put(_results(50, "C"))
+    b.put(_results(50, "D"))
+    assert a.spill_dir != b.spill_dir
+    assert a.records(first)[0]["BOM料号"] == "A0"     # a 的落盘文件未被 b 删除
+
+    a.close()
+    assert not os.path.exists(a.spill_dir) and os.path.isdir(b.spill_dir)
+
+
+def test_stale_spills_removed_after_ttl(tmp_path):
+    stale_dir = tmp_path / "123-dead"
+    stale_dir.mkdir()
+    (stale_dir / "x.pkl").write_bytes(b"")
+    (tmp_path / "legacy.pkl").write_bytes(b"")
+    old = time.time() - 7200
+    for p in (stale_dir / "x.pkl", stale_dir, tmp_path / "legacy.pkl"):
+        os.utime(p, (old, old))
+    ResultStore(1, str(tmp_path), ttl=3600)
+    assert os.listdir(tmp_path) == []
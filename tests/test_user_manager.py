@@ -0,0 +1,25 @@
+# tests/test_user_manager.py
+import threading
+
+from src import user_manager
+
+
+def test_connections_pooled_across_threads(tmp_path, monkeypatch):
+    monkeypatch.setattr(user_manager, "DB_FILE", str(tmp_path / "smt.db"))
+    monkeypatch.setattr(user_manager, "DATA_FILE", str(tmp_path / "missing.json"))
+    opened = []
+    connect = user_manager._connect
+    monkeypatch.setattr(user_manager, "_connect", lambda: opened.append(1) or connect())
+
+    def work(i):   # 模拟 Streamlit：每次重跑一个新线程
+        assert user_manager.record_run(model=f"M{i % 3}", mode="full", total=1, error_count=0) is not None
+        user_manager.list_runs(model="M0")
+        user_manager.get_mappings()
+
+    for _ in range(5):
+        threads = [threading.Thread(target=work, args=(i,)) for i in range(12)]
+        for t in threads: t.start()
+        for t in threads: t.join()
+
+    assert len(user_manager.list_runs(limit=1000)) == 60
+    assert 1 <= len(opened) <= user_manager.DB_POOL_SIZE
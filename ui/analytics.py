@@ -0,0 +1,48 @@
+import streamlit as st
+from datetime import date, datetime, time, timedelta
+from src import archive
+from src.user_manager import list_archive_models
+
+# 可筛选的核对结果（与 logic 中的 核对结果 取值一致）
+STATUS_OPTIONS = ["缺料", "位号不符", "错料/多余", "规格预警", "数量不符", "站位冲突", "站位格式异常", "位号为空", "数据错误"]
+
+
+def render_analytics():
+    """缺陷分析页：按时间范围 / 机种 / 核对结果统计历史归档中的 Top 料号、位号、站位（帕累托）"""
+    st.markdown("### 📊 缺陷分析（历史归档）")
+    missing = archive.missing_backend()
+    if missing is not None:
+        st.warning(f"⚠️ {missing}")
+        return
+
+    with st.container(border=True):
+        c1, c2, c3 = st.columns([3, 3, 2])
+        today = date.today()
+        period = c1.date_input("时间范围", value=(today - timedelta(days=30), today), max_value=today)
+        models = c2.multiselect("机种", list_archive_models(), placeholder="全部机种")
+        limit = c3.number_input("Top N", value=20, min_value=5, max_value=200, step=5)
+        c4, c5 = st.columns([3, 5])
+        dimension = c4.radio("统计维度", list(archive.DIMENSIONS), horizontal=True)
+        statuses = c5.multiselect("核对结果", STATUS_OPTIONS, placeholder="全部异常")
+
+    if not isinstance(period, (tuple, list)) or len(period) != 2:
+        st.info("请选择起止日期")
+        return
+    since = datetime.combine(period[0], time.min).strftime('%Y-%m-%d %H:%M:%S')
+    until = datetime.combine(period[1], time.max).strftime('%Y-%m-%d %H:%M:%S')
+
+    df, stats = archive.query_top(dimension, since, until, models, statuses, int(limit))
+    st.caption(f"扫描 {stats['files']} 个归档文件 · {stats['rows']} 条结论 · 合计 {stats['total']} 次 · "
+               f"用时 {stats['seconds'] * 1000:.0f} ms")
+    if df.empty:
+        st.info("该范围内没有归档的异常结论")
+        return
+
+    st.bar_chart(df.set_index(dimension)["次数"], horizontal=True, sort=False)
+    st.dataframe(
+        df, hide_index=True, use_container_width=True,
+        column_config={
+            "占比": st.column_config.ProgressColumn("占比", format="percent", min_value=0, max_value=1),
+            "累计占比": st.column_config.NumberColumn("累计占比", format="percent"),
+        },
+    )
@@ -1,30 +1,627 @@
 # ui/main_content.py
 import streamlit as st
-import pandas as pd
-import io
-import re
-import gc
+import time
+import logging
 from datetime import datetime
 from config.styles import BANNER_HTML
 from config.mappings import EXCLUDE_QTY_KEYWORDS
-from src.user_manager import get_inspector_list, get_mappings
+from config.settings import BOM_LIBRARY_AUTO_ADD, JOB_INLINE_WAIT, JOB_POLL_INTERVAL
+from src.user_manager import (get_inspector_list, get_mappings, save_result_snapshot, load_result_snapshot,
+                              record_run, update_run,
+                              save_mapping_profile)
 
 # --- [核心修复] 修正引用路径，与实际文件名保持一致 ---
-from src.utils import guess_column_index, guess_column_names, get_machine_info, generate_signature
-from src.data_loader import load_excel_secure   # 修正: io_engine -> data_loader
-from src.logic import run_smt_comparison        # 修正: core_logic -> logic
+from src.utils import (guess_column_index, guess_column_names, header_fingerprint, get_machine_info,
+                       extract_file_id)
+from src.logic import (run_full_comparison, run_changeover_comparison,   # 修正: core_logic -> logic
+                       build_result_snapshot, diff_result_snapshots, results_digest,
+                       aggregate_station, aggregate_bom)
+from src.planner import plan_changeover
+from src.data_loader import LoadError, report_load_error
+from src.result_store import STORE
+from src import speculative
+from src import archive
+from src import bom_library
+from src.jobs import JOBS
+from src.service import mapping_defaults
+from src.result_view import build_result_view, query_result_view, page_of, NORMAL_LEVEL, SEARCH_FIELDS
+from src.report import build_report_xlsx
+from src.exports import export_file, missing_backend, EXPORT_FORMATS
+from src import perf
+from src.lazy import lazy_import
 
-def extract_file_id(filename):
-    match = re.match(r'^([a-zA-Z0-9]+)', filename)
-    if match: return match.group(1)
+# 首页（未上传文件）不加载 pandas，缩短冷启动白屏时间
+pd = lazy_import("pandas")
+
+def _library_frame(file):
+    """BOM 库中 BOM 的解析结果；源文件无法解析时在页面上提示并返回 None"""
+    try:
+        return bom_library.frame(file)
+    except LoadError as e:
+        report_load_error(e)
+        return None
+
+def _deferred_download(build):
+    """
+    download_button 的延迟生成回调：build() 作为后台任务执行（受任务池与本机并发限制），返回磁盘临时文件的只读文件对象。
+    会话中不缓存文件内容，每次点击重新生成；回调内只使用闭包对象，不访问 st.*。
+    """
+    return lambda: JOBS.run("export", lambda job: build())
+
+RESULT_COL_CFG = {
+    "级别": st.column_config.TextColumn("级别", width="small"),
+    "核对结果": st.column_config.TextColumn("状态", width="small"),
+    "原始行号": st.column_config.TextColumn("行号", width="small"),
+    "BOM料号": st.column_config.TextColumn("BOM料号", width="medium"),
+    "BOM描述": st.column_config.TextColumn("BOM描述", width="large"),
+    "站位备注": st.column_config.TextColumn("站位备注", width="large"),
+    "差异说明": st.column_config.TextColumn("差异", width="large"),
+    "站位号": st.column_config.TextColumn("站位", width="small"),
+}
+PAGE_SIZES = [50, 100, 200, 500]
+
+def _render_results_table(view, err_cnt):
+    """结果表：筛选/排序/搜索在服务端完成，只下发当前页"""
+    level_counts = view['level_counts']
+    all_levels = list(level_counts)
+    total_rows = len(view['frame'])
+
+    c_mode, c_groups, c_sort = st.columns([2, 3, 1])
+    with c_mode:
+        mode = st.radio("视图", [f"🚫 异常 ({err_cnt})", f"📋 全量 ({total_rows})"],
+                        horizontal=True, label_visibility="collapsed", key="res_mode")
+    with c_groups:
+        slot_groups = sorted(view['by_group'])
+        sel_groups = st.multiselect("机台/料台", slot_groups, placeholder="全部机台/料台",
+                                    label_visibility="collapsed", key="res_groups") if slot_groups else []
+    with c_sort:
+        sort_by_slot = st.toggle("按站位顺序排序", value=False, key="res_sort")
+
+    c_field, c_text, c_size = st.columns([1, 4, 1])
+    with c_field:
+        field = st.selectbox("搜索字段", ["全部"] + list(SEARCH_FIELDS), label_visibility="collapsed", key="res_field")
+    with c_text:
+        text = st.text_input("搜索", placeholder="🔍 搜索料号 / 位号 / 站位", label_visibility="collapsed", key="res_text")
+    with c_size:
+        page_size = st.selectbox("每页", PAGE_SIZES, index=1, label_visibility="collapsed", key="res_page_size")
+
+    st.caption("  ·  ".join(f"{k} {v}" for k, v in level_counts.items()) + "　｜　"
+               + "  ·  ".join(f"{k} {v}" for k, v in sorted(view['status_counts'].items(), key=lambda x: -x[1])))
+
+    errors_only = mode.startswith("🚫")
+    if errors_only and err_cnt == 0:
+        st.success("🎉 无异常")
+        return
+    levels = [lvl for lvl in all_levels if lvl != NORMAL_LEVEL] if errors_only else None
+    positions = query_result_view(view, levels=levels, groups=sel_groups, text=text,
+                                  field=None if field == "全部" else field, sort_by_slot=sort_by_slot)
+
+    # 筛选条件变化或页码越界时回到第 1 页
+    n_pages = max(1, -(-len(positions) // page_size))
+    filter_sig = (mode, tuple(sel_groups), sort_by_slot, field, text, page_size)
+    if st.session_state.get("res_filter_sig") != filter_sig or st.session_state.get("res_page", 1) > n_pages:
+        st.session_state.res_filter_sig = filter_sig
+        st.session_state.res_page = 1
+    if errors_only:
+        st.error("请核实异常：")
+    st.dataframe(page_of(view, positions, st.session_state.get("res_page", 1), page_size),
+                 use_container_width=True, hide_index=True, column_config=RESULT_COL_CFG)
+    p1, p2 = st.columns([1, 5])
+    with p1:
+        st.number_input("页码", min_value=1, max_value=n_pages, step=1, key="res_page", label_visibility="collapsed")
+    with p2:
+        st.caption(f"共 {len(positions)} 条 · 第 {st.session_state.get('res_page', 1)} / {n_pages} 页")
+
+def _adapt_config(config_map, df, prefix, aliases):
+    """沿用当前映射；下一机种文件列名不同时按别名重新猜测"""
+    cols = df.columns.tolist()
+    cfg = dict(config_map)
+    for key, alias_key in ((f'{prefix}_pn', f'{prefix.upper()}_PN'), (f'{prefix}_desc', f'{prefix.upper()}_DESC')):
+        if cfg.get(key) not in cols:
+            cfg[key] = cols[guess_column_index(cols, aliases[alias_key])]
+    ref_key = f'{prefix}_ref'
+    if not all(c in cols for c in cfg.get(ref_key) or []) or not cfg.get(ref_key):
+        cfg[ref_key] = guess_column_names(cols, aliases[f'{prefix.upper()}_REF'], exclude_keys=EXCLUDE_QTY_KEYWORDS)
+    if prefix == 'st' and cfg.get('st_slot') not in cols:
+        cfg['st_slot'] = cols[guess_column_index(cols, aliases['ST_SLOT'])]
+    if prefix == 'bom' and cfg.get('bom_sub') not in cols:
+        cfg['bom_sub'] = None
+    return cfg
+
+def _changeover_plan(next_station, next_bom, baseline, aliases):
+    """
+    计算换线规划（下一机种站位表聚合 + plan_changeover），按 (下一机种文件摘要, 当前结果摘要, 映射) 缓存在会话中：
+    结果面板的筛选 / 翻页重跑直接取缓存。下一机种文件解析失败时返回 None，未识别到站位时 plan 为 None。
+    """
+    key = (speculative.file_digest(next_station), next_bom and speculative.file_digest(next_bom),
+           st.session_state.get('comparison_digest'), repr(baseline['config']), repr(aliases))
+    cached = st.session_state.get('changeover_plan_cache')
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    df_next = speculative.load(next_station)
+    if df_next is None:
+        return None
+    st_cfg = _adapt_config(baseline['config'], df_next, 'st', aliases)
+    _, next_slots, _, _ = aggregate_station(df_next, st_cfg)
+    next_bom_map = None
+    if next_bom:
+        df_next_bom = speculative.load(next_bom)
+        if df_next_bom is not None:
+            next_bom_map, _, _ = aggregate_bom(df_next_bom, _adapt_config(baseline['config'], df_next_bom, 'bom', aliases))
+    out = {'plan': None}
+    if next_slots and baseline.get('slot_index'):
+        plan = plan_changeover(baseline['slot_index'], next_slots, next_bom_map)
+        df_plan = pd.DataFrame(plan['pick_list'])
+        out = {'plan': plan, 'frame': df_plan, 'csv': df_plan.to_csv(index=False).encode('utf-8-sig')}
+    st.session_state.changeover_plan_cache = (key, out)
+    return out
+
+def _render_changeover_plan(aliases):
+    """下一机种站位表已上传时，基于当前已核对站位表给出换线拣料单"""
+    next_station = st.session_state.get('next_station_file')
+    baseline = st.session_state.get('comparison_baseline')
+    if not next_station or not baseline:
+        return
+    with st.expander(f"🔀 换线规划：{baseline['model']} → {extract_file_id(next_station.name) or next_station.name}", expanded=True):
+        out = _changeover_plan(next_station, st.session_state.get('next_bom_file'), baseline, aliases)
+        if out is None:
+            return
+        if out['plan'] is None:
+            st.warning("⚠️ 未识别到站位号列，无法规划"); return
+
+        summary = out['plan']['summary']
+        c1, c2, c3, c4, c5 = st.columns(5)
+        c1.metric("♻️ 保留", summary['保留']); c2.metric("↔️ 移位", summary['移位'])
+        c3.metric("⬇️ 下料", summary['下料']); c4.metric("⬆️ 上料", summary['上料'])
+        c5.metric("🔧 操作数", summary['操作数'])
+        if summary['冲突']:
+            st.warning(f"⚠️ {summary['冲突']} 个站位登记了多个料号，未参与换线规划，请按拣料单中“人工确认”行核实")
+        st.dataframe(out['frame'], use_container_width=True, hide_index=True)
+        st.download_button("📥 导出拣料单", out['csv'],
+                           file_name=f"{baseline['model']}_换线拣料单.csv", mime="text/csv", use_container_width=True)
+
+def _render_perf_panel():
+    """性能面板：展示本会话最近一次各阶段耗时（缓存命中的阶段不会重复出现）"""
+    recorder = perf.current()
+    if recorder is None:
+        return
+    last = st.session_state.setdefault('perf_last', {})
+    for rec in recorder.stages:
+        last[rec['stage']] = rec
+    if not last:
+        return
+    with st.expander("⏱️ 性能"):
+        rows = [{"阶段": "　" * r['depth'] + name, "耗时(ms)": r['ms'],
+                 **({"峰值内存(KB)": r['peak_kb']} if r['peak_kb'] is not None else {})}
+                for name, r in last.items()]
+        st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+        st.caption("缓存命中时加载阶段耗时接近 0；完整记录见日志中的 smt_perf JSON。")
+        store = STORE.stats()
+        st.caption(f"结果存储：{store['entries']} 个结果集，内存中 {store['resident']} 个 / "
+                   f"{store['resident_mb']} MB（预算 {store['budget_mb']} MB，超出按 LRU 落盘）")
+        spec = speculative.stats()
+        st.caption(f"后台预解析 / 预聚合：已完成 {spec['done']}，运行中 {spec['running']}，排队 {spec['pending']}")
+        jobs = JOBS.stats()
+        st.caption(f"后台任务：运行中 {jobs['running']}，排队 {jobs['queued']}，已完成 {jobs['done']}")
+
+def _option_index(options, value):
+    return options.index(value) if value in options else 0
+
+@st.fragment
+def _render_mapping_panel(bom_file, station_file, df_bom, df_station, current_aliases, model_id):
+    """映射配置面板（独立重跑）：选择结果写入 session_state.mapping_config，供比对按钮读取；
+    同时按当前映射在后台预聚合两侧，映射变更时旧任务作废"""
+    b_cols = df_bom.columns.tolist()
+    s_cols = df_station.columns.tolist()
+    bom_fp, st_fp = header_fingerprint(b_cols), header_fingerprint(s_cols)
+    st.session_state.mapping_fingerprints = (bom_fp, st_fp)
+    defaults, profile = mapping_defaults(b_cols, s_cols, bom_fp, st_fp, model_id, current_aliases)
+
+    # 有比对结果或表头命中已确认方案时，默认将映射配置折叠，避免占用空间
+    show_mapping_expanded = 'comparison_handle' not in st.session_state and not (profile and profile['match'] == "fingerprint")
+    if profile is not None:
+        source = "相同表头" if profile['match'] == "fingerprint" else f"机种 {profile['model']}"
+        st.caption(f"🧷 已应用已确认的映射方案（{source}，{profile.get('confirmed_at') or '时间未知'}）")
+    with st.expander("🧩 映射配置（如需调整，请展开）", expanded=show_mapping_expanded):
+        with st.container(border=True):
+            # 字段映射区
+            c1, c2 = st.columns(2, gap="large")
+
+            with c1:
+                st.markdown('<div class="bom-header">📋 BOM 表配置</div>', unsafe_allow_html=True)
+                with st.container(border=True):
+                    b1, b2 = st.columns(2)
+                    with b1:
+                        sel_b_pn = st.selectbox("料号列", b_cols, index=_option_index(b_cols, defaults['bom_pn']), label_visibility="collapsed")
+                        st.caption("BOM料号")
+                    with b2:
+                        # BOM 位号列 - 使用多选支持 T/B 面分列
+                        sel_b_ref = st.multiselect("位号列", b_cols, default=defaults['bom_ref'], label_visibility="collapsed")
+                        st.caption("BOM位号（支持多列）")
+
+                    b3, b4 = st.columns(2)
+                    with b3:
+                        opts = ["(不显示)"] + b_cols
+                        sel_b_desc = st.selectbox("描述列", opts, index=_option_index(opts, defaults['bom_desc']), label_visibility="collapsed")
+                        if sel_b_desc == "(不显示)": sel_b_desc = None
+                        st.caption("规格描述")
+                    with b4:
+                        opts = ["(无)"] + b_cols
+                        sel_b_sub = st.selectbox("替代列", opts, index=_option_index(opts, defaults['bom_sub']), label_visibility="collapsed")
+                        if sel_b_sub == "(无)": sel_b_sub = None
+                        st.caption("替代料")
+
+                    b5, _ = st.columns(2)
+                    with b5:
+                        # 数量列为可选项：仅在别名命中时默认启用 数量 vs 位号数 校验
+                        sel_b_qty = st.selectbox("数量列", opts, index=_option_index(opts, defaults['bom_qty']), label_visibility="collapsed")
+                        if sel_b_qty == "(无)": sel_b_qty = None
+                        st.caption("数量（可选，校验位号数）")
+
+            with c2:
+                st.markdown('<div class="station-header">🏗️ 站位表配置</div>', unsafe_allow_html=True)
+                with st.container(border=True):
+                    s1, s2 = st.columns(2)
+                    with s1:
+                        sel_s_pn = st.selectbox("物料列", s_cols, index=_option_index(s_cols, defaults['st_pn']), label_visibility="collapsed")
+                        st.caption("物料编号")
+                    with s2:
+                        # 站位表 位号列 - 使用多选支持 T/B 面分列
+                        sel_s_ref = st.multiselect("位号列", s_cols, default=defaults['st_ref'], label_visibility="collapsed")
+                        st.caption("位号（支持多列）")
+
+                    s3, s4 = st.columns(2)
+                    opts = ["(无)"] + s_cols
+                    with s3:
+                        sel_s_desc = st.selectbox("备注列", opts, index=_option_index(opts, defaults['st_desc']), label_visibility="collapsed")
+                        if sel_s_desc == "(无)": sel_s_desc = None
+                        st.caption("物料规格")
+                    with s4:
+                        sel_s_slot = st.selectbox("安装号", opts, index=_option_index(opts, defaults['st_slot']), label_visibility="collapsed")
+                        if sel_s_slot == "(无)": sel_s_slot = None
+                        st.caption("安装号码")
+
+                    s5, _ = st.columns(2)
+                    with s5:
+                        sel_s_qty = st.selectbox("总数列", opts, index=_option_index(opts, defaults['st_qty']), label_visibility="collapsed")
+                        if sel_s_qty == "(无)": sel_s_qty = None
+                        st.caption("总数（可选，校验位号数）")
+
+    st.session_state.mapping_config = {
+        'bom_pn': sel_b_pn, 'bom_ref': sel_b_ref, 'bom_sub': sel_b_sub, 'bom_desc': sel_b_desc,
+        'st_pn': sel_s_pn, 'st_ref': sel_s_ref, 'st_slot': sel_s_slot,
+        'st_desc': sel_s_desc, 'bom_qty': sel_b_qty, 'st_qty': sel_s_qty
+    }
+    speculative.submit_prepare('bom', bom_file, df_bom, st.session_state.mapping_config)
+    speculative.submit_prepare('station', station_file, df_station, st.session_state.mapping_config)
+
+@st.fragment
+def _render_work_order_panel(bom_id, bom_file, df_bom, df_station):
+    """工单信息与导出（独立重跑）：输入检验人 / 订单号 / 数量只重绘本面板"""
+    if 'comparison_handle' not in st.session_state:
+        return
+    with perf.scope("work_order", model=bom_id):
+        handle = st.session_state.comparison_handle
+
+        st.write("")
+        st.write("")
+        st.markdown("---")
+        st.markdown("### 📦 工单信息 - 导出前确认")
+
+        with st.container(border=True):
+            col_ins, col_wo, col_qty = st.columns([2, 2, 2])
+
+            # 检验员选择
+            with col_ins:
+                inspectors = get_inspector_list()
+                inspector_options = ["请选择..."] + inspectors
+                selected_inspector = st.selectbox(
+                    "检验人 👩🏻‍🚒",
+                    inspector_options,
+                    index=0,
+                    label_visibility="visible"
+                )
+                inspector = selected_inspector if selected_inspector != "请选择..." else None
+                if inspector is None:
+                    st.caption("🔴 *必填项*")
+
+            # 订单号输入
+            with col_wo:
+                wo_number = st.text_input(
+                    "订单号 #️⃣",
+                    placeholder="PO20250101",
+                    label_visibility="visible"
+                )
+                if not wo_number.strip():
+                    st.caption("🔴 *必填项*")
+
+            # 订单数量输入
+            with col_qty:
+                wo_qty = st.number_input(
+                    "订单数量 📊",
+                    value=0,
+                    min_value=0,
+                    step=1,
+                    label_visibility="visible"
+                )
+                if wo_qty <= 0:
+                    st.caption("🔴 *必填项*")
+
+            # 校验逻辑并显示下载按钮
+            is_valid = inspector is not None and wo_number.strip() and wo_qty > 0
+
+            if is_valid:
+                # 工单信息完整，生成导出按钮（文件在点击下载时才生成）
+                now = datetime.now()
+                date_str = now.strftime("%y%m%d")
+                report_name = f"{bom_id}_{inspector}_{date_str}核对报告.xlsx"
+                regression = st.session_state.get('comparison_regression')
+                changeover = st.session_state.get('comparison_changeover')
+                meta = {'wo_number': wo_number, 'wo_qty': wo_qty, 'inspector': inspector}
+
+                def _report_file():
+                    with perf.run("export", model=bom_id), perf.stage("export_xlsx"):
+                        return build_report_xlsx(
+                            STORE.records(handle), df_bom, df_station,
+                            dict(meta, check_time=datetime.now().strftime('%Y-%m-%d %H:%M:%S')),
+                            regression=regression, changeover=changeover,
+                        )
+
+                st.download_button(
+                    label="📥 导出报告",
+                    data=_deferred_download(_report_file),
+                    file_name=report_name,
+                    mime="application/vnd.ms-excel",
+                    type="primary",
+                    on_click="ignore",
+                    use_container_width=True
+                )
+
+                # 机读格式（MES / 质量分析），文件内带工单元数据与 SHA-256 签名
+                export_meta = dict(meta, model=bom_id, wo_number=wo_number.strip(), wo_qty=int(wo_qty))
+                for col, fmt in zip(st.columns(len(EXPORT_FORMATS)), EXPORT_FORMATS):
+                    def _export_file(fmt=fmt):
+                        with perf.run("export", model=bom_id), perf.stage(f"export_{fmt}"):
+                            fh, _ = export_file(
+                                fmt, STORE.records(handle),
+                                dict(export_meta, check_time=datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+                        return fh
+
+                    mime, ext = EXPORT_FORMATS[fmt]
+                    missing = missing_backend(fmt)   # 可选依赖未安装：按钮置灰并提示安装命令
+                    col.download_button(
+                        label=f"📄 {fmt.upper()}",
+                        data=_deferred_download(_export_file),
+                        file_name=f"{bom_id}_{inspector}_{date_str}核对结果{ext}",
+                        mime=mime,
+                        on_click="ignore",
+                        disabled=missing is not None,
+                        help=None if missing is None else str(missing),
+                        use_container_width=True
+                    )
+
+                if st.button("✅ 审核通过（存为该机种基线）", use_container_width=True):
+                    # 快照在比对任务中由原始结果生成，与回归对比同源；结果集已失效时不保存空基线
+                    findings = st.session_state.get('comparison_findings')
+                    if findings is None or STORE.frame(handle) is None:
+                        st.warning("⚠️ 本次比对结果已失效，请重新比对后再审核")
+                        return
+                    ok, msg = save_result_snapshot(bom_id, {
+                        'model': bom_id,
+                        'approved_at': now.strftime('%Y-%m-%d %H:%M:%S'),
+                        'inspector': inspector,
+                        'work_order': wo_number.strip(),
+                        'findings': findings,
+                    })
+                    if ok:
+                        update_run(st.session_state.get('comparison_run_id'), work_order=wo_number.strip(),
+                                   inspector=inspector, approved_at=now.strftime('%Y-%m-%d %H:%M:%S'))
+                        # 审核通过的 BOM 入库，之后同机种只需上传站位表
+                        if BOM_LIBRARY_AUTO_ADD and not isinstance(bom_file, bom_library.LibraryFile):
+                            bom_library.add(bom_id, bom_file.name, bom_file.getvalue(), df_bom)
+                    if ok: st.success(msg)
+                    else: st.error(msg)
+            else:
+                st.info("⏳ 请完整填写上述信息后，下载按钮将自动显示")
+
+@st.fragment
+def _render_results_panel(current_aliases):
+    """核对统计与结果表（独立重跑）：筛选 / 翻页只重绘本面板"""
+    if 'comparison_handle' not in st.session_state:
+        return
+    with perf.scope("results"):
+        with perf.stage("result_view"):
+            view = STORE.derived(st.session_state.comparison_handle, 'view', build_result_view)
+        if view is None:
+            st.warning("⌛ 比对结果已过期，请重新执行比对")
+            return
+        err_cnt = st.session_state.comparison_err_cnt
+        total = st.session_state.comparison_total
+
+        # 显示统计指标
+        st.markdown("---")
+        st.markdown("### 📊 核对统计")
+        k1, k2, k3, k4 = st.columns([2, 2, 2, 3])
+        k1.metric("🔢 BOM项", total)
+        k2.metric("🟢 正常", total - err_cnt)
+        k3.metric("🔴 异常", err_cnt)
+
+        # 与上次审核通过结果的回归对比
+        regression = st.session_state.get('comparison_regression')
+        if regression is not None:
+            reg_rows = regression['rows']
+            with st.expander(f"🧾 与上次审核结果对比（{regression['approved_at']} · {regression['work_order']}）：{len(reg_rows)} 项变化",
+                             expanded=bool(reg_rows)):
+                counts = pd.Series([r["变化类型"] for r in reg_rows], dtype=object).value_counts()
+                c1, c2, c3 = st.columns(3)
+                c1.metric("🆕 新增", int(counts.get("🆕 新增", 0)))
+                c2.metric("✅ 已解决", int(counts.get("✅ 已解决", 0)))
+                c3.metric("🔄 变化", int(counts.get("🔄 变化", 0)))
+                if reg_rows:
+                    st.dataframe(pd.DataFrame(reg_rows), use_container_width=True, hide_index=True)
+                else:
+                    st.success("🎉 与上次审核结果完全一致")
+
+        # 换线增量核对：仅展示变更部分
+        changeover = st.session_state.get('comparison_changeover')
+        if changeover:
+            diff = changeover['diff']
+            reverified = sorted(changeover['reverified'])
+            with st.expander(f"🔁 换线变更 ({len(diff['rows'])} 项站位变动，重新核对 {len(reverified)} 项)", expanded=True):
+                c1, c2, c3, c4 = st.columns(4)
+                c1.metric("➕ 新增", len(diff['added'])); c2.metric("➖ 下料", len(diff['removed']))
+                c3.metric("↔️ 移位", len(diff['moved'])); c4.metric("✏️ 位号变更", len(diff['refs_changed']))
+                if diff['rows']:
+                    st.dataframe(pd.DataFrame(diff['rows']), use_container_width=True, hide_index=True)
+                if reverified:
+                    st.caption("重新核对结果（其余料号沿用上一版结论）：")
+                    st.dataframe(view['frame'].iloc[reverified], use_container_width=True, hide_index=True)
+                else:
+                    st.success("🎉 站位表无变动，全部沿用上一版结论")
+
+        _render_changeover_plan(current_aliases)
+
+        _render_results_table(view, err_cnt)
+
+        _render_perf_panel()
+
+def _compare_job(job, bom_id, bom_file, df_bom, station_file, df_station, config_map, baseline, ignore_nc,
+                 prev_digest):
+    """
+    比对任务（在后台工作线程中执行，不调用 st.*）：比对、存入结果存储、回归对比、核对记录与归档。
+
+    Args:
+        baseline:    换线增量核对的基线（含上一版结果），None 为完整比对
+        prev_digest: 本会话上一次比对的结果摘要（相同则不重复归档）
+    """
+    t_start = time.perf_counter()
+    with perf.run("compare_job", model=bom_id) as recorder:
+        with perf.stage("compare"):
+            job.progress(0.0, "🔄 清洗数据...")
+            # 两侧聚合多已在映射确定时于后台完成，这里只取结果
+            with perf.stage("prepared"):
+                prepared = speculative.prepared(bom_file, df_bom, station_file, df_station, config_map)
+            if baseline is not None:
+                job.progress(0.3, "🔁 换线增量核对...")
+                results, err_cnt, total, changeover = run_changeover_comparison(
+                    df_bom, df_station, config_map, baseline, ignore_nc, prepared)
+                new_baseline = changeover.pop('baseline')
+            else:
+                job.progress(0.3, "🔍 比对中...")
+                results, err_cnt, total, new_baseline = run_full_comparison(
+                    df_bom, df_station, config_map, ignore_nc, prepared,
+                    progress=lambda f: job.progress(0.3 + 0.6 * f))
+                changeover = None
+        job.progress(0.9, "📦 整理结果...")
+
+        # 结果集进入共享结果存储（列式、超预算按 LRU 落盘），session_state 只保留句柄
+        with perf.stage("result_store"):
+            handle = STORE.put(results)
+        new_baseline.pop('results', None)
+        new_baseline.update({'model': bom_id, 'config': config_map})
+
+        # 与该机种上一次审核通过的结果做回归对比
+        findings = build_result_snapshot(results)
+        snapshot = load_result_snapshot(bom_id)
+        regression = None if snapshot is None else {
+            'approved_at': snapshot.get('approved_at', ''),
+            'inspector': snapshot.get('inspector', ''),
+            'work_order': snapshot.get('work_order', ''),
+            'rows': diff_result_snapshots(snapshot.get('findings', {}), results),
+        }
+        digest = results_digest(results, bom_file.file_id, station_file.file_id, ignore_nc)
+
+        # 核对记录（订单号 / 检验人在审核通过时补记）
+        started_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        mode = "full" if baseline is None else "changeover"
+        run_id = record_run(
+            model=bom_id, mode=mode, bom_file=bom_file.name, station_file=station_file.name,
+            total=total, error_count=err_cnt, result_count=len(results),
+            duration_ms=round((time.perf_counter() - t_start) * 1000, 1), digest=digest, started_at=started_at)
+
+        # 异常结论归档（同一会话对相同文件重复比对只归档一次）；归档失败不影响本次比对
+        if digest != prev_digest:
+            try:
+                with perf.stage("archive"):
+                    archive.archive_findings(run_id, bom_id, started_at, results, mode)
+            except Exception as e:
+                logging.getLogger("smt.archive").warning("archive failed: %s", e)
+
+    return {'handle': handle, 'err_cnt': err_cnt, 'total': total, 'baseline': new_baseline,
+            'changeover': changeover, 'regression': regression, 'findings': findings, 'digest': digest, 'run_id': run_id,
+            'stages': [] if recorder is None else recorder.stages}
+
+
+def _finish_comparison(out, config_map):
+    """比对任务完成：结果句柄与统计写入 session_state（替换上一次的结果集）"""
+    prev_handle = st.session_state.get('comparison_handle')
+    if prev_handle and prev_handle != out['handle']:
+        STORE.drop(prev_handle)
+    st.session_state.comparison_baseline = out['baseline']
+    st.session_state.comparison_changeover = out['changeover']
+    st.session_state.comparison_regression = out['regression']
+    st.session_state.comparison_findings = out['findings']
+    st.session_state.comparison_handle = out['handle']
+    st.session_state.comparison_err_cnt = out['err_cnt']
+    st.session_state.comparison_total = out['total']
+    st.session_state.comparison_config = config_map
+    st.session_state.comparison_digest = out['digest']
+    st.session_state.comparison_run_id = out['run_id']
+    # 任务在工作线程中计时，阶段耗时并入本会话的性能面板
+    st.session_state.setdefault('perf_last', {}).update({r['stage']: r for r in out['stages']})
+
+
+@st.fragment(run_every=JOB_POLL_INTERVAL)
+def _render_job_progress(job_id):
+    """比对进行中：轮询任务进度，结束后整页重跑以载入结果"""
+    job = JOBS.get(job_id)
+    if job is None or job.finished:
+        st.rerun()
+    st.progress(job.fraction, text=job.message if job.state == "running" else "⏳ 排队中（等待空闲的比对槽位）...")
+    if st.button("⏹ 取消比对"):
+        JOBS.cancel(job_id)
+
+
+def _render_compare_job(pending):
+    """
+    处理本会话提交的比对任务：未结束时显示进度，结束后载入结果或给出提示。
+
+    Returns:
+        仍在进行中的任务（pending），已结束时为 None
+    """
+    job = JOBS.get(pending['id'])
+    if job is not None and not job.finished:
+        _render_job_progress(job.id)
+        return pending
+    del st.session_state['comparison_job']
+    if job is None:
+        st.warning("⚠️ 比对任务已过期，请重新执行")
+    elif job.state == "done":
+        _finish_comparison(job.result, pending['config'])
+    elif job.state == "cancelled":
+        st.info("⏹ 比对已取消")
+    else:
+        st.error(f"❌ 比对失败: {job.error}")
     return None
 
+
 def render_main_area(bom_file, station_file, ignore_nc):
     st.markdown(BANNER_HTML, unsafe_allow_html=True)
     
     # 从数据库获取最新的映射配置
     current_aliases = get_mappings()
 
+    # 只上传站位表时，按机种编号从共享 BOM 库取已审核的 BOM（已预解析，无需再上传）
+    library_bom = None
+    if station_file and not bom_file:
+        library_bom = bom_file = bom_library.lookup(extract_file_id(station_file.name))
+
+    # 文件一上传即后台解析（另一份尚未上传时也先开始），点击比对前多半已就绪
+    for f in (None if library_bom else bom_file, station_file,
+              st.session_state.get('next_station_file'), st.session_state.get('next_bom_file')):
+        speculative.submit_parse(f)
+
     # 场景 A: 未上传文件
     if not (bom_file and station_file):
         st.info(f"👋 欢迎使用 SMT 智能防错系统。请在左侧上传文件。")
@@ -45,7 +642,7 @@ def render_main_area(bom_file, station_file, ignore_nc):
                 st.markdown("#### 🚦 结果状态")
                 c1, c2, c3, c4 = st.columns(4)
                 c1.error("🔴 缺料/错料"); c2.warning("🟠 位号不符")
-                c3.warning("🟠 规格预警"); c4.success("🟢 通过")
+                c3.warning("🟠 规格/数量预警"); c4.success("🟢 通过")
         return
 
     # 场景 B: 业务处理
@@ -56,255 +653,53 @@ def render_main_area(bom_file, station_file, ignore_nc):
     if bom_id != st_id:
         st.error(f"🛑 编号不匹配: {bom_id} vs {st_id}"); return
 
+    perf.annotate(model=bom_id)
+    if library_bom:
+        st.caption(f"📚 BOM 取自 BOM 库：{bom_file.name}")
     with st.spinner("⏳ 解析中..."):
-        df_bom = load_excel_secure(bom_file)
-        df_station = load_excel_secure(station_file)
+        with perf.stage("load_bom"):
+            df_bom = _library_frame(bom_file) if library_bom else speculative.load(bom_file)
+        with perf.stage("load_station"):
+            df_station = speculative.load(station_file)
 
     if df_bom is not None and df_station is not None:
-        # 有比对结果时，默认将映射配置折叠，避免占用空间
-        show_mapping_expanded = 'comparison_results' not in st.session_state
-        with st.expander("🧩 映射配置（如需调整，请展开）", expanded=show_mapping_expanded):
-            with st.container(border=True):
-                # 字段映射区
-                c1, c2 = st.columns(2, gap="large")
-                b_cols = df_bom.columns.tolist()
-                s_cols = df_station.columns.tolist()
-
-                with c1:
-                    st.markdown('<div class="bom-header">📋 BOM 表配置</div>', unsafe_allow_html=True)
-                    with st.container(border=True):
-                        b1, b2 = st.columns(2)
-                        with b1:
-                            idx_b_pn = guess_column_index(b_cols, current_aliases['BOM_PN'])
-                            sel_b_pn = st.selectbox("料号列", b_cols, index=min(idx_b_pn, len(b_cols)-1), label_visibility="collapsed")
-                            st.caption("BOM料号")
-                        with b2:
-                            # BOM 位号列 - 使用多选支持 T/B 面分列
-                            default_b_ref = guess_column_names(b_cols, current_aliases['BOM_REF'], exclude_keys=EXCLUDE_QTY_KEYWORDS)
-                            sel_b_ref = st.multiselect("位号列", b_cols, default=default_b_ref, label_visibility="collapsed")
-                            st.caption("BOM位号（支持多列）")
-                        
-                        b3, b4 = st.columns(2)
-                        with b3:
-                            idx_b_desc = guess_column_index(b_cols, current_aliases['BOM_DESC'])
-                            sel_b_desc = st.selectbox("描述列", ["(不显示)"]+b_cols, index=min(idx_b_desc+1, len(b_cols)) if idx_b_desc < len(b_cols) else 0, label_visibility="collapsed")
-                            if sel_b_desc == "(不显示)": sel_b_desc = None
-                            st.caption("规格描述")
-                        with b4:
-                            idx_sub = guess_column_index(b_cols, current_aliases['BOM_SUB'])
-                            d_idx = idx_sub if idx_sub < len(b_cols) and any(k in b_cols[idx_sub] for k in ["替代", "Sub"]) else 0
-                            sel_b_sub = st.selectbox("替代列", ["(无)"]+b_cols, index=min(d_idx+1, len(b_cols)) if d_idx else 0, label_visibility="collapsed")
-                            if sel_b_sub == "(无)": sel_b_sub = None
-                            st.caption("替代料")
-
-                with c2:
-                    st.markdown('<div class="station-header">🏗️ 站位表配置</div>', unsafe_allow_html=True)
-                    with st.container(border=True):
-                        s1, s2 = st.columns(2)
-                        with s1:
-                            idx_s_pn = guess_column_index(s_cols, current_aliases['ST_PN'])
-                            sel_s_pn = st.selectbox("物料列", s_cols, index=min(idx_s_pn, len(s_cols)-1), label_visibility="collapsed")
-                            st.caption("物料编号")
-                        with s2:
-                            # 站位表 位号列 - 使用多选支持 T/B 面分列
-                            default_s_ref = guess_column_names(s_cols, current_aliases['ST_REF'], exclude_keys=EXCLUDE_QTY_KEYWORDS)
-                            sel_s_ref = st.multiselect("位号列", s_cols, default=default_s_ref, label_visibility="collapsed")
-                            st.caption("位号（支持多列）")
-                        
-                        s3, s4 = st.columns(2)
-                        with s3:
-                            idx_s_desc = guess_column_index(s_cols, current_aliases['ST_DESC'])
-                            sel_s_desc = st.selectbox("备注列", ["(无)"]+s_cols, index=min(idx_s_desc+1, len(s_cols)) if idx_s_desc < len(s_cols) else 0, label_visibility="collapsed")
-                            if sel_s_desc == "(无)": sel_s_desc = None
-                            st.caption("物料规格")
-                        with s4:
-                            idx_s_slot = guess_column_index(s_cols, current_aliases['ST_SLOT'])
-                            sel_s_slot = st.selectbox("安装号", ["(无)"]+s_cols, index=min(idx_s_slot+1, len(s_cols)) if idx_s_slot < len(s_cols) else 0, label_visibility="collapsed")
-                            if sel_s_slot == "(无)": sel_s_slot = None
-                            st.caption("安装号码")
+        _render_mapping_panel(bom_file, station_file, df_bom, df_station, current_aliases, bom_id)
 
         st.write("")
-        if st.button("🚀 执行自动化比对"):
-            config_map = {
-                'bom_pn': sel_b_pn, 'bom_ref': sel_b_ref, 'bom_sub': sel_b_sub, 'bom_desc': sel_b_desc,
-                'st_pn': sel_s_pn, 'st_ref': sel_s_ref, 'st_slot': sel_s_slot,
-                'st_desc': sel_s_desc
-            }
-
-            with st.status("🔍 运算中...", expanded=True) as status:
-                st.write("🔄 清洗数据...")
-                results, err_cnt, total = run_smt_comparison(df_bom, df_station, config_map, ignore_nc)
-                status.update(label="✅ 完成", state="complete", expanded=False)
-
-            # 缓存比对结果到 session_state，避免后续输入时丢失
-            st.session_state.comparison_results = results
-            st.session_state.comparison_err_cnt = err_cnt
-            st.session_state.comparison_total = total
-            st.session_state.comparison_config = config_map
+        # 比对在后台任务中执行：小任务当场出结果，大任务显示进度并可取消，重跑不会中断
+        pending = st.session_state.get('comparison_job')
+        if pending is not None:
+            pending = _render_compare_job(pending)
+        if pending is None and st.button("🚀 执行自动化比对"):
+            config_map = dict(st.session_state.mapping_config)
+            # 执行比对即视为确认当前映射：按表头指纹 + 机种保存为映射方案（未变化时不写盘）
+            save_mapping_profile(bom_id, *st.session_state.mapping_fingerprints, config_map,
+                                 datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
 
-        # 工单信息输入区（如果已有缓存结果，则进入导出信息填写与统计展示）
-        if 'comparison_results' in st.session_state:
-            results = st.session_state.comparison_results
-            err_cnt = st.session_state.comparison_err_cnt
-            total = st.session_state.comparison_total
-            config_map = st.session_state.comparison_config
-
-            st.write("")
-            st.write("")
-            st.markdown("---")
-            st.markdown("### 📦 工单信息 - 导出前确认")
-            
-            with st.container(border=True):
-                col_ins, col_wo, col_qty = st.columns([2, 2, 2])
-                
-                # 检验员选择
-                with col_ins:
-                    inspectors = get_inspector_list()
-                    inspector_options = ["请选择..."] + inspectors
-                    selected_inspector = st.selectbox(
-                        "检验人 👩🏻‍🚒",
-                        inspector_options,
-                        index=0,
-                        label_visibility="visible"
-                    )
-                    inspector = selected_inspector if selected_inspector != "请选择..." else None
-                    if inspector is None:
-                        st.caption("🔴 *必填项*")
-                
-                # 订单号输入
-                with col_wo:
-                    wo_number = st.text_input(
-                        "订单号 #️⃣",
-                        placeholder="PO20250101",
-                        label_visibility="visible"
-                    )
-                    if not wo_number.strip():
-                        st.caption("🔴 *必填项*")
-                
-                # 订单数量输入
-                with col_qty:
-                    wo_qty = st.number_input(
-                        "订单数量 📊",
-                        value=0,
-                        min_value=0,
-                        step=1,
-                        label_visibility="visible"
-                    )
-                    if wo_qty <= 0:
-                        st.caption("🔴 *必填项*")
-                
-                # 校验逻辑并显示下载按钮
-                is_valid = inspector is not None and wo_number.strip() and wo_qty > 0
-                
-                if is_valid:
-                    # 工单信息完整，生成导出按钮
-                    now = datetime.now()
-                    date_str = now.strftime("%y%m%d")
-                    report_name = f"{bom_id}_{inspector}_{date_str}核对报告.xlsx"
-                    
-                    out = io.BytesIO()
-                    with pd.ExcelWriter(out, engine='xlsxwriter') as writer:
-                        df_res = pd.DataFrame(results)
-                        df_res.to_excel(writer, index=False, sheet_name='核对结果', startrow=3)
-                        
-                        df_bom.to_excel(writer, index=False, sheet_name='原BOM表')
-                        df_station.to_excel(writer, index=False, sheet_name='原站位表')
-
-                        wb = writer.book
-                        text_fmt = wb.add_format({'align': 'left', 'valign': 'vcenter'})
-                        
-                        protect_opts = {
-                            'select_locked_cells': True, 'select_unlocked_cells': True,
-                            'format_cells': True, 'format_columns': True, 'format_rows': True,
-                            'autofilter': True, 'sort': True
-                        }
-
-                        # Sheet 1 - 核对结果
-                        ws = writer.sheets['核对结果']
-                        ws.protect('admin', protect_opts)
-                        
-                        # 添加工单信息到顶栏
-                        header_fmt = wb.add_format({
-                            'bold': True, 'align': 'left', 'valign': 'vcenter',
-                            'bg_color': '#D9E8F5', 'border': 1, 'font_size': 10
-                        })
-                        info_fmt = wb.add_format({
-                            'align': 'left', 'valign': 'vcenter',
-                            'bg_color': '#E7F0F7', 'border': 1, 'font_size': 10
-                        })
-                        
-                        ws.set_row(0, 18)
-                        ws.set_row(1, 18)
-                        ws.write('A1', '订单号:', header_fmt)
-                        ws.write('B1', wo_number, info_fmt)
-                        ws.write('C1', '订单数量:', header_fmt)
-                        ws.write('D1', wo_qty, info_fmt)
-                        ws.write('A2', '核对时间:', header_fmt)
-                        ws.write('B2', now.strftime('%Y-%m-%d %H:%M:%S'), info_fmt)
-                        ws.write('C2', '检验人:', header_fmt)
-                        ws.write('D2', inspector, info_fmt)
-                        
-                        # 添加数据开始行的格式
-                        fmt_red = wb.add_format({'font_color':'#D00000', 'bold':True})
-                        fmt_org = wb.add_format({'font_color':'#FF8800', 'bold':True})
-                        fmt_grn = wb.add_format({'font_color':'#008000'})
-                        ws.conditional_format('A5:A9999', {'type':'text', 'criteria':'containing', 'value':'严重', 'format':fmt_red})
-                        ws.conditional_format('A5:A9999', {'type':'text', 'criteria':'containing', 'value':'警告', 'format':fmt_org})
-                        ws.conditional_format('A5:A9999', {'type':'text', 'criteria':'containing', 'value':'正常', 'format':fmt_grn})
-                        ws.set_column('E:E', 25); ws.set_column('F:F', 25); ws.set_column('G:G', 40)
-
-                        # Sheet 2/3 - 原始表格
-                        for sheet_name in ['原BOM表', '原站位表']:
-                            ws_raw = writer.sheets[sheet_name]
-                            ws_raw.protect('admin', protect_opts)
-                            ws_raw.set_column('A:Z', 15, text_fmt)
-
-                    st.download_button(
-                        label="📥 导出报告",
-                        data=out.getvalue(),
-                        file_name=report_name,
-                        mime="application/vnd.ms-excel",
-                        type="primary",
-                        use_container_width=True
-                    )
-                else:
-                    st.info("⏳ 请完整填写上述信息后，下载按钮将自动显示")
+            # 换线模式：同机种、同映射的上一版站位表作为基线，仅重新核对变动料号
+            baseline = st.session_state.get('comparison_baseline')
+            use_changeover = (
+                st.session_state.get('changeover_mode')
+                and baseline is not None
+                and baseline['model'] == bom_id
+                and baseline['config'] == config_map
+            )
+            if use_changeover:
+                # 基线结果集保存在结果存储中，这里取回供沿用
+                prev_results = STORE.records(st.session_state.get('comparison_handle'))
+                use_changeover = prev_results is not None
+                if use_changeover:
+                    baseline = dict(baseline, results=prev_results)
 
+            job_id = JOBS.submit("compare", _compare_job, bom_id, bom_file, df_bom, station_file, df_station,
+                                 config_map, baseline if use_changeover else None, ignore_nc,
+                                 st.session_state.get('comparison_digest'), owner=bom_id)
+            st.session_state.comparison_job = {'id': job_id, 'config': config_map}
+            JOBS.wait(job_id, JOB_INLINE_WAIT)
+            _render_compare_job(st.session_state.comparison_job)
+
+        # 工单信息输入区（如果已有缓存结果，则进入导出信息填写与统计展示）
+        _render_work_order_panel(bom_id, bom_file, df_bom, df_station)
 
         # 显示对比结果（如果有缓存）
-        if 'comparison_results' in st.session_state:
-            results = st.session_state.comparison_results
-            err_cnt = st.session_state.comparison_err_cnt
-            total = st.session_state.comparison_total
-            config_map = st.session_state.comparison_config
-            
-            # 显示统计指标
-            st.markdown("---")
-            st.markdown("### 📊 核对统计")
-            k1, k2, k3, k4 = st.columns([2, 2, 2, 3])
-            k1.metric("🔢 BOM项", total)
-            k2.metric("🟢 正常", total - err_cnt)
-            k3.metric("🔴 异常", err_cnt)
-            
-            # 显示数据表
-            df_res = pd.DataFrame(results)
-            tab_err, tab_all = st.tabs([f"🚫 异常 ({err_cnt})", "📋 全量"])
-            col_cfg = {
-                "级别": st.column_config.TextColumn("级别", width="small"),
-                "核对结果": st.column_config.TextColumn("状态", width="small"),
-                "原始行号": st.column_config.TextColumn("行号", width="small"),
-                "BOM料号": st.column_config.TextColumn("BOM料号", width="medium"),
-                "BOM描述": st.column_config.TextColumn("BOM描述", width="large"),
-                "站位备注": st.column_config.TextColumn("站位备注", width="large"),
-                "差异说明": st.column_config.TextColumn("差异", width="large"),
-                "站位号": st.column_config.TextColumn("站位", width="small"),
-            }
-            with tab_err:
-                if err_cnt > 0:
-                    st.error("请核实异常：")
-                    st.dataframe(df_res[df_res["级别"]!="🟢 正常"], use_container_width=True, hide_index=True, column_config=col_cfg)
-                else: st.success("🎉 无异常")
-            with tab_all:
-                st.dataframe(df_res, use_container_width=True, hide_index=True, column_config=col_cfg)
-            
-            del df_res, results; gc.collect()
\ No newline at end of file
+        _render_results_panel(current_aliases)
\ No newline at end of file
@@ -1,25 +1,101 @@
 import streamlit as st
+import os
+from datetime import datetime
+from src import bom_library
 from src.user_manager import (
     verify_admin, update_admin_password, get_inspector_list,
-    add_inspector, delete_inspector, get_mappings, update_mappings, reset_mappings
+    add_inspector, delete_inspector, get_mappings, update_mappings, reset_mappings,
+    list_mapping_profiles, update_mapping_profiles
 )
 
+# 映射方案编辑表的列：config 键 -> 显示名（位号为多列，以逗号分隔）
+PROFILE_FIELDS = {
+    'bom_pn': "BOM料号", 'bom_ref': "BOM位号", 'bom_sub': "替代料", 'bom_desc': "BOM描述", 'bom_qty': "BOM数量",
+    'st_pn': "站位料号", 'st_ref': "站位位号", 'st_slot': "安装号", 'st_desc': "站位备注", 'st_qty': "站位总数",
+}
+LIST_FIELDS = ('bom_ref', 'st_ref')
+
+
+def _render_mapping_profiles():
+    """规则页：已确认映射方案（按表头指纹 + 机种）的查看、修改与删除"""
+    profiles = list_mapping_profiles()
+    st.caption("**已确认映射方案**（执行比对时自动保存）")
+    if not profiles:
+        st.info("暂无映射方案")
+        return
+    rows = []
+    for key, p in profiles.items():
+        cfg = p.get('config', {})
+        row = {"删除": False, "机种": p.get('model', ''), "确认时间": p.get('confirmed_at', '')}
+        for field, label in PROFILE_FIELDS.items():
+            val = cfg.get(field)
+            row[label] = ", ".join(val) if isinstance(val, list) else (val or "")
+        row["表头指纹"] = key
+        rows.append(row)
+    edited = st.data_editor(rows, hide_index=True, key="profile_editor",
+                            disabled=["确认时间", "表头指纹"], use_container_width=True)
+    if st.button("保存方案", use_container_width=True):
+        new_profiles = {}
+        for row in edited:
+            if row["删除"]:
+                continue
+            key = row["表头指纹"]
+            cfg = {}
+            for field, label in PROFILE_FIELDS.items():
+                val = (row[label] or "").strip()
+                if field in LIST_FIELDS:
+                    cfg[field] = [x.strip() for x in val.split(",") if x.strip()]
+                else:
+                    cfg[field] = val or None
+            new_profiles[key] = dict(profiles[key], model=(row["机种"] or "").strip(), config=cfg)
+        ok, msg = update_mapping_profiles(new_profiles)
+        if ok: st.success(msg)
+        else: st.error(msg)
+
+def _render_bom_library():
+    """BOM 库页：库中已审核的 BOM（审核通过时自动入库，也可直接放入 BOM 库目录）"""
+    files = bom_library.entries()
+    if not files:
+        st.info("BOM 库为空（审核通过后自动入库）")
+        return
+    rows = [{"机种": f.model, "文件": f.name,
+             "更新时间": datetime.fromtimestamp(f.mtime / 1e9).strftime('%Y-%m-%d %H:%M'),
+             "已预解析": os.path.exists(f.cache_path)} for f in files]
+    st.dataframe(rows, hide_index=True)
+    to_remove = st.multiselect("选择", [f.model for f in files], label_visibility='collapsed', key='bom_library_remove')
+    if to_remove and st.button(f"移出 BOM 库 ({len(to_remove)})", use_container_width=True):
+        for model in to_remove:
+            ok, msg = bom_library.remove(model)
+            if not ok: st.error(msg)
+        st.success("删除完成")
+
 def render_sidebar():
     # 数据导入区域
     with st.container(border=True):
         st.markdown("##### 📥 数据导入")
         bom_file = st.file_uploader("BOM", type=["xlsx", "xls", "csv"], label_visibility="collapsed")
-        st.caption("👆 上传 BOM 表")
+        st.caption("👆 上传 BOM 表（BOM 库中已有的机种可不上传）")
         st.write("")
         station_file = st.file_uploader("Station", type=["xlsx", "xls", "csv"], label_visibility="collapsed")
         st.caption("👆 上传 站位表")
 
+    # 换线规划：下一机种站位表（及可选 BOM，用于识别可复用的替代料）
+    with st.expander("🔀 换线规划（下一机种）"):
+        st.file_uploader("Next Station", type=["xlsx", "xls", "csv"], key="next_station_file", label_visibility="collapsed")
+        st.caption("👆 下一机种 站位表")
+        st.file_uploader("Next BOM", type=["xlsx", "xls", "csv"], key="next_bom_file", label_visibility="collapsed")
+        st.caption("👆 下一机种 BOM（可选）")
+
     # 系统参数区域
     with st.container(border=True):
         st.markdown("##### ⚙️ 系统参数")
         st.caption("支持分隔符: `,` `/` `;` `空格`")
         st.markdown("---")
         st.info("✅ 已启用 NC/不贴件过滤")
+        st.toggle("🔁 换线增量核对", key="changeover_mode",
+                  help="以本会话上一次比对的同机种站位表为基线（不要求已审核通过），仅重新核对变动的料号，其余沿用上一版结论（含上一版的异常项）")
+        st.toggle("📊 缺陷分析", key="analytics_mode",
+                  help="按时间范围统计历史比对中最常出现的异常料号 / 位号 / 站位（帕累托）")
 
     st.write("")
     
@@ -70,7 +146,7 @@ def render_sidebar():
                     st.rerun() if hasattr(st, 'rerun') else st.experimental_rerun()
 
             # 管理员功能以标签页展示，但布局更紧凑：去掉多余说明，控件使用更紧凑的 label_visibility
-            t1, t2, t3, t4, t5 = st.tabs(["检验员", "添加", "删除", "规则", "密码"])
+            t1, t2, t3, t4, t5, t6 = st.tabs(["检验员", "添加", "删除", "规则", "密码", "BOM库"])
 
             # Tab 1: 检验员列表（紧凑）
             with t1:
@@ -163,6 +239,9 @@ def render_sidebar():
                             return bom_file, station_file, True
                         else:
                             st.error(msg)
+
+                st.divider()
+                _render_mapping_profiles()
             # Tab 5: 管理员密码修改（独立选项卡）
             with t5:
                 nap = st.text_input("新管理密码", type="password", placeholder="至少5位", label_visibility='collapsed')
@@ -177,4 +256,8 @@ def render_sidebar():
                     else:
                         st.error("密码不能为空")
 
+            # Tab 6: 共享 BOM 库
+            with t6:
+                _render_bom_library()
+
     return bom_file, station_file, True
\ No newline at end of file
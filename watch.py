@@ -0,0 +1,360 @@
+# watch.py
+"""
+目录监视（无人值守首件核对）：贴片机软件导出到共享目录的站位表，写完后自动与 BOM 库中同机种的 BOM 比对，
+核对报告与结果记录写在原文件旁边。
+
+    python watch.py D:/share/programs [--processes 2] [--settle 2] [--poll]
+
+    20130101300816.xls
+    20130101300816.xls.smt-report.xlsx     # 核对报告
+    20130101300816.xls.smt.json            # 结果记录：状态、机种、BOM、统计、核对记录 ID、内容摘要
+
+- 监视：安装了 watchdog 时用系统文件事件（inotify / ReadDirectoryChangesW / FSEvents），另每 WATCH_SWEEP_INTERVAL 秒
+  全量扫描一次兜底（网络共享上其他主机写入的文件往往没有事件）；未安装或加 --poll 时每 WATCH_POLL_INTERVAL 秒扫描
+- 防抖：文件的 (大小, 修改时间) 连续 WATCH_SETTLE_SECONDS 秒不变、非空且能打开读取，才视为写完；
+  临时文件（~$ / . 开头）与本程序写出的报告、记录不处理
+- 配对：按文件名开头的机种编号取 BOM 库（bom_library）；库中暂无该机种时记为 no_bom，BOM 入库后自动补核
+- 去重：按 (机种, 文件内容摘要)，同一内容（重复导出、改名、同一批中的副本）只比对一次，其余直接复用报告并记为 duplicate；
+  结果记录保存文件大小与修改时间，重启后已核对过的文件不重复比对
+- 比对在有界进程池中执行（同 api.py），排队与本机并发槽位沿用 src.jobs；每次比对写入核对记录（mode=watch）并归档
+- 运行指标：--metrics-port（默认 WATCH_METRICS_PORT）上的 /metrics，含工作进程中的解析 / 比对指标
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import signal
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from config.settings import (JOB_HOST_SLOTS, JOB_SLOT_DIR, WATCH_POLL_INTERVAL, WATCH_PROCESSES,
+                             WATCH_METRICS_PORT, WATCH_SETTLE_SECONDS, WATCH_SWEEP_INTERVAL)
+from src import archive, bom_library, metrics, service
+from src.jobs import JobQueue
+from src.lazy import available, require
+from src.user_manager import record_run
+from src.utils import extract_file_id
+
+logger = logging.getLogger("smt.watch")
+
+REPORT_SUFFIX = ".smt-report.xlsx"
+RECORD_SUFFIX = ".smt.json"
+INSPECTOR = "自动核对"
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def _candidate(name):
+    """是否为待核对的站位表（排除临时文件与本程序的输出）"""
+    lower = name.lower()
+    return (not name.startswith(("~$", ".")) and not lower.endswith(REPORT_SUFFIX)
+            and os.path.splitext(lower)[1] in bom_library.EXTENSIONS)
+
+
+def _write_atomic(path, data):
+    """同目录临时文件 + 原子替换（临时文件以 . 开头，不会被当作新文件）"""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+def _read_record(path):
+    try:
+        with open(path + RECORD_SUFFIX, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class Watcher:
+    """监视一个目录：发现 -> 防抖 -> 去重 -> 提交比对任务 -> 写报告与结果记录"""
+
+    def __init__(self, root, processes=WATCH_PROCESSES, settle=WATCH_SETTLE_SECONDS, use_events=True):
+        self.root = os.path.abspath(root)
+        self.settle = settle
+        self.use_events = use_events
+        self._executor = service.process_pool(processes)
+        self._jobs = JobQueue(processes, JOB_HOST_SLOTS, JOB_SLOT_DIR)
+        metrics.sample("smt_jobs", self._jobs.stats)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._pending = {}     # 路径 -> [大小, 修改时间, 开始保持不变的时刻]
+        self._seen = {}        # 路径 -> (大小, 修改时间)：已处理的版本
+        self._by_content = {}  # (机种, 内容摘要) -> {'path', 'record'（比对中为 None）, 'followers'}
+        self._waiting = {}     # 机种编号 -> {路径}：等待 BOM 入库
+
+    # ---- 发现与防抖 ----
+
+    def touch(self, path):
+        """登记一个可能新增 / 变化的文件（文件事件与扫描共用）"""
+        if os.path.dirname(path) != self.root or not _candidate(os.path.basename(path)):
+            return
+        try:
+            st = os.stat(path)
+        except OSError:
+            return
+        key = (st.st_size, st.st_mtime_ns)
+        with self._lock:
+            if self._seen.get(path) == key:
+                return
+            pending = self._pending.get(path)
+            if pending is None or tuple(pending[:2]) != key:
+                self._pending[path] = [*key, time.monotonic()]
+
+    def _scan(self):
+        try:
+            paths = [e.path for e in os.scandir(self.root) if e.is_file() and _candidate(e.name)]
+        except OSError as e:
+            logger.warning("扫描失败 %s: %s", self.root, e)
+            return
+        for path in paths:
+            self.touch(path)
+
+    def _settle(self):
+        """取出已写完的文件：大小与修改时间保持不变超过 settle 秒、非空且能完整读取"""
+        now = time.monotonic()
+        with self._lock:
+            pending = list(self._pending.items())
+        for path, (size, mtime, since) in pending:
+            try:
+                st = os.stat(path)
+            except OSError:
+                with self._lock:
+                    self._pending.pop(path, None)
+                continue
+            key = (st.st_size, st.st_mtime_ns)
+            if key != (size, mtime):
+                with self._lock:
+                    self._pending[path] = [*key, now]
+                continue
+            if now - since < self.settle or not size:
+                continue
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+            except OSError:   # 仍被导出程序占用（Windows 下写入中的文件通常无法共享读取）
+                continue
+            if len(data) != size:
+                continue
+            with self._lock:
+                self._pending.pop(path, None)
+                self._seen[path] = key
+            self._dispatch(path, key, data)
+
+    def _load_records(self):
+        """启动时读取已有的结果记录：文件未变的不再比对，核对结果供后续相同内容复用"""
+        for path in [e.path for e in os.scandir(self.root) if e.is_file() and _candidate(e.name)]:
+            record = _read_record(path)
+            if record is None or record.get("status") == "no_bom":
+                continue
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if (record.get("size"), record.get("mtime_ns")) != (st.st_size, st.st_mtime_ns):
+                continue
+            self._seen[path] = (st.st_size, st.st_mtime_ns)
+            if record.get("status") == "ok":
+                self._by_content[(record["model"], record["sha"])] = {'path': path, 'record': record, 'followers': []}
+
+    def _retry_waiting(self):
+        """BOM 已入库的机种：其等待中的文件重新进入处理（只在有等待文件时查看库目录）"""
+        for model in list(self._waiting):
+            if bom_library.lookup(model) is None:
+                continue
+            with self._lock:
+                paths = self._waiting.pop(model, ())
+                for path in paths:
+                    self._seen.pop(path, None)
+            for path in paths:
+                self.touch(path)
+
+    # ---- 比对 ----
+
+    def _dispatch(self, path, key, data):
+        name = os.path.basename(path)
+        base = {'file': name, 'sha': hashlib.blake2b(data, digest_size=16).hexdigest(),
+                'size': key[0], 'mtime_ns': key[1]}
+        model = extract_file_id(name)
+        try:
+            service.check_pair(name, None, model)
+        except service.ServiceError as e:
+            if model:
+                with self._lock:
+                    self._waiting.setdefault(model, set()).add(path)
+            logger.warning("%s: %s", name, e)
+            self._write_record(path, dict(base, status="no_bom" if model else "failed", model=model, error=str(e),
+                                          checked_at=datetime.now().strftime(TIME_FORMAT)))
+            return
+
+        content = (model, base['sha'])
+        with self._lock:
+            entry = self._by_content.get(content)
+            if entry is None:
+                self._by_content[content] = {'path': path, 'record': None, 'followers': []}
+            elif entry['record'] is None:   # 相同内容正在比对：完成后一并写出
+                entry['followers'].append((path, base))
+                return
+        if entry is not None:
+            self._write_duplicate(path, base, entry)
+            return
+        self._jobs.submit("watch", self._compare_job, path, base, data, model, owner="watch")
+
+    def _compare_job(self, job, path, base, data, model):
+        """比对任务（工作线程）：比对后写结果记录；无论成败都写出等待同一内容的文件（followers），不会一直挂起"""
+        started_at = datetime.now().strftime(TIME_FORMAT)
+        record = dict(base, status="failed", model=model, error="比对中断", checked_at=started_at)
+        try:
+            record = self._compare(path, base, data, model, started_at)
+        except Exception as e:
+            logger.exception("%s: 比对失败", base['file'])
+            record = dict(base, status="failed", model=model, error=str(e), checked_at=started_at)
+        finally:
+            self._write_record(path, record)
+            self._resolve(model, base, record)
+        return record
+
+    def _compare(self, path, base, data, model, started_at):
+        """进程池中比对并生成报告，写核对记录、归档与报告，返回结果记录"""
+        meta = {'wo_number': "", 'wo_qty': "", 'inspector': INSPECTOR, 'check_time': started_at}
+        try:
+            out, values = self._executor.submit(metrics.run_in_worker, service.compare_with_report, base['file'],
+                                                data, None, None, model, True, meta).result()
+            metrics.merge(values)
+        except Exception as e:
+            logger.warning("%s: 比对失败: %s", base['file'], e)
+            return dict(base, status="failed", model=model, error=str(e), checked_at=started_at)
+        results, report = out.pop('results'), out.pop('report')
+        run_id = record_run(
+            model=model, mode="watch", bom_file=out['bom_file'], station_file=base['file'],
+            total=out['total'], error_count=out['error_count'], result_count=len(results),
+            duration_ms=out['duration_ms'], digest=out['digest'], started_at=started_at)
+        try:
+            archive.archive_findings(run_id, model, started_at, results, "watch")
+        except Exception as e:
+            logging.getLogger("smt.archive").warning("archive failed: %s", e)
+        logger.info("%s: %d 项，异常 %d（%.0f ms）", base['file'], out['total'], out['error_count'],
+                    out['duration_ms'])
+        return dict(base, status="ok", model=model, bom_file=out['bom_file'], mapping=out['mapping'],
+                    total=out['total'], error_count=out['error_count'], digest=out['digest'],
+                    duration_ms=out['duration_ms'], run_id=run_id, checked_at=started_at,
+                    report=self._write_report(path, report))
+
+    def _resolve(self, model, base, record):
+        """内容比对结束：记下结论，写出等待中的相同内容文件"""
+        content = (model, base['sha'])
+        with self._lock:
+            entry = self._by_content[content]
+            followers, entry['followers'], entry['record'] = entry['followers'], [], record
+            if record['status'] != "ok":   # 失败的内容不做去重：重新导出后再试
+                del self._by_content[content]
+        for f_path, f_base in followers:
+            try:
+                self._write_duplicate(f_path, f_base, entry)
+            except Exception:
+                logger.exception("%s: 结果记录写入失败", f_base['file'])
+
+    # ---- 输出 ----
+
+    def _write_report(self, path, report):
+        try:
+            _write_atomic(path + REPORT_SUFFIX, report)
+            return os.path.basename(path) + REPORT_SUFFIX
+        except OSError as e:
+            logger.warning("报告写入失败 %s: %s", path, e)
+            return None
+
+    def _write_record(self, path, record):
+        try:
+            _write_atomic(path + RECORD_SUFFIX,
+                          json.dumps(record, ensure_ascii=False, indent=2, default=str).encode("utf-8"))
+        except OSError as e:
+            logger.warning("结果记录写入失败 %s: %s", path, e)
+
+    def _write_duplicate(self, path, base, entry):
+        """内容与已核对文件相同：复用其报告与结论，不重复比对"""
+        src = entry['record']
+        record = dict(src, **base, duplicate_of=src['file'])
+        if src['status'] == "ok":
+            record['status'], record['report'] = "duplicate", None
+            if src.get('report'):
+                try:
+                    with open(os.path.join(os.path.dirname(entry['path']), src['report']), "rb") as f:
+                        record['report'] = self._write_report(path, f.read())
+                except OSError as e:
+                    logger.warning("报告复用失败 %s: %s", path, e)
+        logger.info("%s: 内容与 %s 相同，复用结果", base['file'], src['file'])
+        self._write_record(path, record)
+
+    # ---- 主循环 ----
+
+    def _start_observer(self):
+        events = require("watchdog.events", "文件事件监视", "watchdog")
+        observers = require("watchdog.observers", "文件事件监视", "watchdog")
+        watcher = self
+
+        class _Handler(events.FileSystemEventHandler):
+            def on_any_event(self, event):
+                if not event.is_directory:
+                    for p in (event.src_path, getattr(event, "dest_path", "")):
+                        if p:
+                            watcher.touch(os.path.abspath(p))
+
+        observer = observers.Observer()
+        observer.schedule(_Handler(), self.root, recursive=False)
+        observer.start()
+        return observer
+
+    def run(self):
+        """阻塞运行直到 stop() 或 Ctrl+C"""
+        self._load_records()
+        observer = None
+        if self.use_events:
+            if available("watchdog"):
+                observer = self._start_observer()
+            else:
+                logger.info("watchdog 未安装，改为定时扫描（pip install watchdog）")
+        sweep = WATCH_SWEEP_INTERVAL if observer else WATCH_POLL_INTERVAL
+        tick = max(0.1, min(WATCH_POLL_INTERVAL, self.settle / 2))   # --settle 0 时不空转
+        logger.info("watching %s（%s）", self.root, f"文件事件 + 每 {sweep:g}s 扫描" if observer else f"每 {sweep:g}s 扫描")
+        last_sweep = None
+        try:
+            while not self._stop.is_set():
+                if last_sweep is None or time.monotonic() - last_sweep >= sweep:
+                    self._scan()
+                    last_sweep = time.monotonic()
+                self._retry_waiting()
+                self._settle()
+                self._stop.wait(tick)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if observer is not None:
+                observer.stop()
+                observer.join()
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stop(self):
+        self._stop.set()
+
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="SMT 首件核对目录监视：自动核对新导出的站位表")
+    parser.add_argument("directory")
+    parser.add_argument("--processes", type=int, default=WATCH_PROCESSES)
+    parser.add_argument("--settle", type=float, default=WATCH_SETTLE_SECONDS, help="文件保持不变多少秒视为写完")
+    parser.add_argument("--poll", action="store_true", help="不使用文件事件，只定时扫描")
+    parser.add_argument("--metrics-port", type=int, default=WATCH_METRICS_PORT, help="/metrics 端口，0 为不启动")
+    args = parser.parse_args()
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    metrics.start_server(args.metrics_port)
+    Watcher(args.directory, args.processes, args.settle, not args.poll).run()